@@ -0,0 +1,81 @@
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from tools.copyfiles.matcher import compile_matchers
+
+""" Micro-benchmark that compares the listing and matching of the original copy_directory implementation
+(os.listdir, re.search on the pattern string and os.path.exists per file, per handler) with the compiled
+matchers and os.scandir. Usage: python -m benchmarks.copyfiles_matcher [<No. files>]"""
+
+NO_DIRECTORIES = 10
+SOURCES_HANDLERS = [
+    {"directories": ["dir{0}".format(d) for d in range(NO_DIRECTORIES)], "file_regex": r"^event_.*\.log$"},
+    {"directories": ["dir{0}".format(d) for d in range(NO_DIRECTORIES)], "file_regex": r"^trace_\d+\.csv$"},
+    {"directories": ["dir{0}".format(d) for d in range(0, NO_DIRECTORIES, 2)], "file_regex": r"\.xml$"},
+]
+EXTENSIONS = ["event_{0}.log", "trace_{0}.csv", "config_{0}.xml", "other_{0}.bin"]
+
+
+def create_tree(root, no_files):
+    """ Creates a synthetic input tree with no_files files, spread over NO_DIRECTORIES directories.
+
+    Args:
+        root: the root of the tree
+        no_files: the total number of files
+    """
+    for d in range(NO_DIRECTORIES):
+        os.makedirs(os.path.join(root, "dir{0}".format(d)))
+    for i in range(no_files):
+        open(os.path.join(root, "dir{0}".format(i % NO_DIRECTORIES),
+                          EXTENSIONS[i % len(EXTENSIONS)].format(i)), "w").close()
+
+
+def run_original(input_root, output_root):
+    """ Lists and matches the tree the way copy_directory did before the matchers were introduced."""
+    matched = 0
+    for source_handler in SOURCES_HANDLERS:
+        for directory in source_handler["directories"]:
+            directory = str(directory).replace("/", "\\")
+            for f in [f for f in os.listdir(os.path.join(input_root, directory))
+                      if re.search(source_handler["file_regex"], f)]:
+                os.path.exists(os.path.join(output_root, directory, f))
+                matched += 1
+    return matched
+
+
+def run_matchers(input_root, matchers):
+    """ Lists and matches the tree with the compiled matchers and os.scandir (incl. the cached stat results)."""
+    matched = 0
+    for matcher in matchers:
+        for entry in os.scandir(os.path.join(input_root, matcher.path)):
+            if entry.is_file() and matcher.matches(entry.name):
+                entry.stat()
+                matched += 1
+    return matched
+
+
+def main(no_files):
+    root = tempfile.mkdtemp()
+    try:
+        input_root = os.path.join(root, "input")
+        create_tree(input_root, no_files)
+        t1 = time.time()
+        matchers = compile_matchers(SOURCES_HANDLERS)
+        matched_matchers = run_matchers(input_root, matchers)
+        t_matchers = time.time() - t1
+        t1 = time.time()
+        matched_original = run_original(input_root, os.path.join(root, "output"))
+        t_original = time.time() - t1
+        print("Files: {0}, matched: {1} (original) / {2} (matchers)".format(
+            no_files, matched_original, matched_matchers))
+        print("Original: {0:.3f}s, matchers: {1:.3f}s, speedup: {2:.1f}x".format(
+            t_original, t_matchers, t_original / t_matchers))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,47 @@
+import sys
+import time
+import pandas as pd
+from dbclients.DbClientConfig import DbClientConfig
+from dbclients.PostgresClient import PostgresClient, BINARY, CSV
+
+""" Benchmark of the extraction of a time series from a local Postgres: the cursor path (rows as Python tuples, two
+lists and a Series, as pma_db_reader does) against COPY ... TO STDOUT in CSV and binary format, decoded into
+arrays. A temporary table with <No. rows> rows is created. Usage: python -m benchmarks.postgres_copy <host> <port>
+<database> <user> <password> [<No. rows>]"""
+
+CREATE_TABLE = """
+    CREATE TEMPORARY TABLE benchmark_fact AS
+    SELECT TIMESTAMP '2018-06-01' + i * INTERVAL '1 second' AS sample_dt, random() AS value
+    FROM generate_series(1, %s) AS i"""
+QUERY = "SELECT sample_dt, CAST(value AS FLOAT) FROM benchmark_fact WHERE sample_dt > %s ORDER BY sample_dt"
+
+
+def cursor_path(client):
+    rows = client.get_all(QUERY, ["2018-01-01"])[0]
+    idx = [row[0] for row in rows]
+    data = [row[1] for row in rows]
+    return pd.Series(data=data, index=pd.to_datetime(idx))
+
+
+def copy_path(client, copy_format):
+    (times, values) = client.get_time_series(QUERY, ["2018-01-01"], copy_format=copy_format)[0]
+    return pd.Series(data=values, index=pd.DatetimeIndex(times))
+
+
+def main(host, port, database, user, password, no_rows):
+    client = PostgresClient(DbClientConfig("POSTGRES", host, port, database, user, password), None)
+    client.open_cursor()
+    client.cursor.execute(CREATE_TABLE, (no_rows,))
+    client.close_cursor()
+    for name, path in [("cursor", cursor_path), ("copy csv", lambda c: copy_path(c, CSV)),
+                       ("copy binary", lambda c: copy_path(c, BINARY))]:
+        start = time.time()
+        series = path(client)
+        elapsed = time.time() - start
+        print("{0:<12} {1:>8.2f} s {2:>12.0f} rows/s ({3} rows)".format(name, elapsed, len(series) / elapsed,
+                                                                         len(series)))
+    client.close_connection()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:6], no_rows=int(sys.argv[6]) if len(sys.argv) > 6 else 1000000)
@@ -0,0 +1,100 @@
+import sys
+import threading
+import time
+from misc.synchronize import ReadWriteLock, atomic_snapshot, syncronized_with
+
+""" Multi-threaded contention benchmark for read-mostly state: a number of reader threads continuously read the
+state while one writer reloads it every RELOAD_INTERVAL seconds. It compares the global lock of syncronized_with,
+the ReadWriteLock and the lock-free atomic snapshot. Usage: python -m benchmarks.synchronize_contention
+[<No. readers>]"""
+
+DURATION = 2.0  # seconds per variant
+RELOAD_INTERVAL = 0.05  # seconds
+RELOAD_TIME = 0.005  # seconds, simulated time needed to build the state
+STATE = {"s{0}".format(i): [{"name": "rp{0}".format(j), "default": j == 0} for j in range(3)] for i in range(100)}
+GLOBAL_LOCK = threading.Lock()
+
+
+class LockedState:
+    def __init__(self):
+        self.state = dict(STATE)
+
+    @syncronized_with(GLOBAL_LOCK)
+    def read(self, key):
+        return self.state[key]
+
+    @syncronized_with(GLOBAL_LOCK)
+    def reload(self):
+        time.sleep(RELOAD_TIME)
+        self.state = dict(STATE)
+
+
+class ReadWriteLockedState:
+    def __init__(self):
+        self.lock = ReadWriteLock()
+        self.state = dict(STATE)
+
+    def read(self, key):
+        with self.lock.read_locked():
+            return self.state[key]
+
+    def reload(self):
+        with self.lock.write_locked():
+            time.sleep(RELOAD_TIME)
+            self.state = dict(STATE)
+
+
+class SnapshotState:
+    def __init__(self):
+        self._snapshot = None
+        self.reload()
+
+    def read(self, key):
+        return self._snapshot[key]
+
+    @atomic_snapshot("_snapshot")
+    def reload(self):
+        time.sleep(RELOAD_TIME)
+        return dict(STATE)
+
+
+def run(state, no_readers):
+    """ Runs the readers and the writer for DURATION seconds.
+
+    :param state: the state object
+    :param no_readers: the number of reader threads
+    :return: the total number of reads
+    """
+    stop = threading.Event()
+    counts = [0] * no_readers
+
+    def read(i):
+        key = "s{0}".format(i % 100)
+        while not stop.is_set():
+            for _ in range(100):
+                state.read(key)
+            counts[i] += 100
+
+    def write():
+        while not stop.is_set():
+            state.reload()
+            time.sleep(RELOAD_INTERVAL)
+
+    threads = [threading.Thread(target=read, args=(i,)) for i in range(no_readers)] + [threading.Thread(target=write)]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts)
+
+
+def main(no_readers):
+    for name, state in [("global lock", LockedState()), ("read/write lock", ReadWriteLockedState()),
+                        ("atomic snapshot", SnapshotState())]:
+        print("{0:<16} {1:>12.0f} reads/s ({2} readers)".format(name, run(state, no_readers) / DURATION, no_readers))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8)
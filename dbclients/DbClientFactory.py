@@ -1,6 +1,7 @@
 from misc.singleton_metaclass import Singleton
 from PostgresClient import PostgresClient
 from MySQLClient import MySQLClient
+from InfluxClient import InfluxClient
 from enum import Enum, unique
 
 
@@ -20,7 +21,8 @@ class DbClientFactory:
     """
     __metaclass__ = Singleton
 
-    db_clients = {DbType.POSTGRES: PostgresClient,
+    db_clients = {DbType.INFLUX: InfluxClient,
+                  DbType.POSTGRES: PostgresClient,
                   DbType.MYSQL: MySQLClient}
 
     def __init__(self):
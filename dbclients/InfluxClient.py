@@ -0,0 +1,375 @@
+import base64
+import gzip
+import json
+import http.client
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from urllib.parse import urlencode, urlparse
+
+
+DEFAULT_PORT = 8086
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_TIMEOUT = 60
+TIME = "time"
+VALUE = "value"
+WRITE_PATH = "/write"
+QUERY_PATH = "/query"
+
+
+class InfluxClientError(Exception):
+    """
+    Exception that is raised when InfluxDB answers a request with an error
+    """
+
+    def __init__(self, message, status):
+        """
+        Constructor
+        :param message: the error message of InfluxDB
+        :param status: the HTTP status code
+        """
+        super(InfluxClientError, self).__init__(message)
+        self.status = status
+
+
+class InfluxClient:
+    """
+    Class that represents an InfluxDB client. It keeps one HTTP connection open for all requests, writes points as
+    gzip compressed line protocol in batches and decodes chunked query responses into NumPy arrays
+    """
+
+    def __init__(self, db_client_config, logger, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+                 timeout=DEFAULT_TIMEOUT):
+        """
+        Constructor for creating an instance of the InfluxClient
+        :param db_client_config: the configuration for the client to use, the database is the default database
+        :param logger: an instance of logger
+        :param batch_size: the maximum number of points per write request
+        :param chunk_size: the number of points per chunk of a query response
+        :param timeout: the timeout of a request in seconds
+        """
+        url = urlparse(db_client_config.host if "//" in db_client_config.host else "//" + db_client_config.host)
+        self.secure = url.scheme == "https"
+        self.host = url.hostname
+        self.port = int(db_client_config.port or url.port or DEFAULT_PORT)
+        self.database = db_client_config.database
+        self.headers = {}
+        if db_client_config.user:
+            password = db_client_config.password
+            if isinstance(password, bytes):
+                password = password.decode("utf-8")
+            credentials = "{0}:{1}".format(db_client_config.user, password or "").encode("utf-8")
+            self.headers["Authorization"] = "Basic " + base64.b64encode(credentials).decode("ascii")
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.logger = logger
+        self.connection = None
+        self.open_connection()
+
+    def write_points(self, points, database=None, retention_policy=None, retry_count=3):
+        """
+        Writes points, in batches of batch_size points
+        :param points: list of dictionaries with a measurement, fields, (optional) tags and (optional) time. The
+               time is in nanoseconds or a datetime
+        :param database: the database, None for the default database
+        :param retention_policy: (optional) the retention policy
+        :param retry_count: the number of times a batch should be retried in case of a connection error
+        :return: the number of points written
+        """
+        return self.write_lines([to_line(point) for point in points], database, retention_policy, retry_count)
+
+    def write_series(self, data, database=None, retention_policy=None, field=VALUE, retry_count=3):
+        """
+        Writes series without creating a point per value. Missing values are left out
+        :param data: dictionary of measurement to series with a datetime index
+        :param database: the database, None for the default database
+        :param retention_policy: (optional) the retention policy
+        :param field: the field of the values
+        :param retry_count: the number of times a batch should be retried in case of a connection error
+        :return: the number of points written
+        """
+        lines = []
+        for measurement, series in data.items():
+            if series is None or series.empty:
+                continue
+            series = series.dropna()
+            times = pd.DatetimeIndex(series.index).values.astype("datetime64[ns]").astype(np.int64)
+            prefix = escape_key(measurement, ", ") + " " + escape_key(field, ",= ") + "="
+            lines.extend("{0}{1} {2}".format(prefix, format_value(value), time)
+                         for value, time in zip(series.values.tolist(), times.tolist()))
+        return self.write_lines(lines, database, retention_policy, retry_count)
+
+    def write_lines(self, lines, database=None, retention_policy=None, retry_count=3):
+        """
+        Writes lines of line protocol, in batches of batch_size lines
+        :param lines: the lines
+        :param database: the database, None for the default database
+        :param retention_policy: (optional) the retention policy
+        :param retry_count: the number of times a batch should be retried in case of a connection error
+        :return: the number of lines written
+        """
+        params = {"db": database or self.database, "precision": "n"}
+        if retention_policy:
+            params["rp"] = retention_policy
+        headers = {"Content-Type": "text/plain; charset=utf-8", "Content-Encoding": "gzip"}
+        for i in range(0, len(lines), self.batch_size):
+            body = gzip.compress("\n".join(lines[i:i + self.batch_size]).encode("utf-8"))
+            self.request("POST", WRITE_PATH, params, body, headers, retry_count=retry_count).read()
+        return len(lines)
+
+    def query(self, query_string, database=None, retry_count=3):
+        """
+        Executes a query. The response is streamed in chunks, the values of each chunk are decoded into arrays
+        :param query_string: the InfluxQL query
+        :param database: the database, None for the default database
+        :param retry_count: the number of times the query should be retried in case of a connection error
+        :return: dictionary of series to a dictionary of column to NumPy array. A series is identified by its name
+                 or, when the query groups by tags, by a tuple of the name and the sorted (tag, value) tuples. Times
+                 are int64 nanoseconds, numeric columns are float64 and other columns have dtype object
+        """
+        chunks = {}
+        for key, columns, values in self.query_rows(query_string, database, retry_count):
+            chunks.setdefault(key, []).append((columns, to_arrays(columns, values)))
+        result = {}
+        for key, series_chunks in chunks.items():
+            columns = series_chunks[0][0]
+            result[key] = dict((column, np.concatenate([arrays[i] for _, arrays in series_chunks]))
+                               for i, column in enumerate(columns))
+        return result
+
+    def query_regex(self, measurement_regex, from_time, to_time, database=None, field=VALUE, retry_count=3):
+        """
+        Reads a field of all measurements that match a regular expression in one query, e.g. the regex of a
+        SignalPattern
+        :param measurement_regex: the regular expression (string) of the measurements
+        :param from_time: start of the time range (inclusive)
+        :param to_time: end of the time range (exclusive)
+        :param database: the database, None for the default database
+        :param field: the field that is read
+        :param retry_count: the number of times the query should be retried in case of a connection error
+        :return: dictionary of measurement to series
+        """
+        query_string = "SELECT {0} FROM /{1}/ WHERE time >= {2} AND time < {3}".format(
+            quote_identifier(field), measurement_regex.replace("/", "\\/"), to_nanoseconds(from_time),
+            to_nanoseconds(to_time))
+        return dict((key, pd.Series(arrays[field], index=pd.to_datetime(arrays[TIME], utc=True), name=key))
+                    for key, arrays in self.query(query_string, database, retry_count).items())
+
+    def query_aggregates(self, measurement, aggregates, from_time, to_time, interval=None, database=None, field=VALUE,
+                         retry_count=3):
+        """
+        Calculates aggregates of a field of a measurement in the database, so that only the aggregates are read
+        instead of the raw points
+        :param measurement: the measurement
+        :param aggregates: the InfluxQL functions, e.g. ["count", "max"]
+        :param from_time: start of the time range (inclusive)
+        :param to_time: end of the time range (exclusive)
+        :param interval: (optional) the InfluxQL duration of the intervals, e.g. "1h". Intervals without points are
+               left out. Without intervals the range is aggregated as a whole: the time of a selector (e.g. last) is
+               the time of its point
+        :param database: the database, None for the default database
+        :param field: the field that is aggregated
+        :param retry_count: the number of times the query should be retried in case of a connection error
+        :return: dataframe with a column per aggregate and the (start) times (UTC) as index
+        """
+        query_string = "SELECT {0} FROM {1} WHERE time >= {2} AND time < {3}".format(
+            ", ".join("{0}({1}) AS {2}".format(aggregate, quote_identifier(field), quote_identifier(aggregate))
+                      for aggregate in aggregates),
+            quote_identifier(measurement), to_nanoseconds(from_time), to_nanoseconds(to_time))
+        if interval:
+            query_string += " GROUP BY time({0}) fill(none)".format(interval)
+        arrays = self.query(query_string, database, retry_count).get(measurement)
+        if arrays is None:
+            return pd.DataFrame(columns=aggregates, index=pd.DatetimeIndex([], tz="UTC"), dtype=np.float64)
+        return pd.DataFrame(dict((aggregate, arrays[aggregate]) for aggregate in aggregates), columns=aggregates,
+                            index=pd.to_datetime(arrays[TIME], utc=True))
+
+    def get_list_retention_policies(self, database=None):
+        """
+        Gets the retention policies of a database
+        :param database: the database, None for the default database
+        :return: list of dictionaries with the properties of the retention policies (name, duration,
+                 shardGroupDuration, replicaN and default)
+        """
+        query_string = "SHOW RETENTION POLICIES ON {0}".format(quote_identifier(database or self.database))
+        return [dict(zip(columns, row)) for _, columns, values in self.query_rows(query_string, database)
+                for row in values]
+
+    def query_rows(self, query_string, database=None, retry_count=3):
+        """
+        Executes a query and yields the rows of each chunk of the response
+        :param query_string: the InfluxQL query
+        :param database: the database, None for the default database
+        :param retry_count: the number of times the query should be retried in case of a connection error
+        :return: generator of (series key, columns, rows) tuples
+        """
+        params = {"q": query_string, "db": database or self.database, "epoch": "ns", "chunked": "true",
+                  "chunk_size": self.chunk_size}
+        method = "GET" if query_string.lstrip().upper().startswith(("SELECT", "SHOW")) else "POST"
+        response = self.request(method, QUERY_PATH, params, retry_count=retry_count)
+        # Each chunk is a line with a JSON document, the response is read completely to reuse the connection
+        for line in iter(response.readline, b""):
+            if not line.strip():
+                continue
+            for result in json.loads(line.decode("utf-8")).get("results", []):
+                if "error" in result:
+                    raise InfluxClientError(result["error"], response.status)
+                for series in result.get("series", []):
+                    key = series.get("name")
+                    if series.get("tags"):
+                        key = (key, tuple(sorted(series["tags"].items())))
+                    yield key, series["columns"], series.get("values", [])
+
+    def request(self, method, path, params, body=None, headers=None, retry_count=3):
+        """
+        Sends a request over the persistent connection. It contains a retry mechanism that reopens the connection
+        in case of connection errors
+        :param method: the HTTP method
+        :param path: the path of the endpoint
+        :param params: dictionary with the query parameters
+        :param body: (optional) the body
+        :param headers: (optional) dictionary with headers
+        :param retry_count: the number of times the request should be retried in case of a connection error
+        :return: the response, which must be read before the next request
+        """
+        url = path + "?" + urlencode(params)
+        last_exception = None
+        for i in range(retry_count):
+            try:
+                self.connection.request(method, url, body, dict(self.headers, **(headers or {})))
+                response = self.connection.getresponse()
+            except (http.client.HTTPException, OSError) as e:
+                last_exception = e
+                self.log(method, path, e, i)
+                self.close_connection()
+                self.open_connection()
+                continue
+            if response.status >= 300:
+                raise InfluxClientError(get_error_message(response.read()), response.status)
+            return response
+
+        raise last_exception
+
+    def close_connection(self):
+        self.connection.close()
+
+    def open_connection(self):
+        connection_class = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+        self.connection = connection_class(self.host, self.port, timeout=self.timeout)
+
+    def log(self, method, path, exception, i):
+        """
+        Logs the error in case something goes wrong
+        :param method: the HTTP method
+        :param path: the path of the endpoint
+        :param exception: the exception
+        :param i: index of i in the total of retries
+        :return: -
+        """
+        if self.logger:
+            self.logger.error(
+                "Retry: {0}, Error when sending a request to InfluxDB. "
+                "Error: {1}, request: {2} {3}".format(str(i + 1), str(exception), method, path))
+
+
+def to_line(point):
+    """
+    Converts a point to a line of line protocol
+    :param point: dictionary with a measurement, fields, (optional) tags and (optional) time
+    :return: the line
+    """
+    line = escape_key(point["measurement"], ", ")
+    for tag, value in sorted((point.get("tags") or {}).items()):
+        line += "," + escape_key(tag, ",= ") + "=" + escape_key(value, ",= ")
+    line += " " + ",".join(escape_key(field, ",= ") + "=" + format_value(value)
+                           for field, value in sorted(point["fields"].items()))
+    if point.get("time") is not None:
+        line += " " + str(to_nanoseconds(point["time"]))
+    return line
+
+
+def escape_key(key, characters):
+    """
+    Escapes a measurement, tag or field key (or tag value) for line protocol
+    :param key: the key
+    :param characters: the characters that must be escaped
+    :return: the escaped key
+    """
+    key = str(key)
+    for character in characters:
+        key = key.replace(character, "\\" + character)
+    return key
+
+
+def format_value(value):
+    """
+    Formats a field value for line protocol
+    :param value: the value, a float, integer, boolean or string
+    :return: the formatted value
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return "true" if value else "false"
+    if isinstance(value, (int, np.integer)):
+        return "{0}i".format(int(value))
+    if isinstance(value, (float, np.floating)):
+        return repr(float(value))
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def quote_identifier(identifier):
+    """
+    Quotes an identifier for InfluxQL
+    :param identifier: the identifier, e.g. a database or field
+    :return: the quoted identifier
+    """
+    return '"' + str(identifier).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def to_nanoseconds(time):
+    """
+    Converts a time to nanoseconds since the epoch
+    :param time: nanoseconds, a datetime or a timestamp. Times without timezone are UTC
+    :return: the time in nanoseconds
+    """
+    if isinstance(time, (int, np.integer)):
+        return int(time)
+    if isinstance(time, (datetime, np.datetime64)):
+        time = pd.Timestamp(time)
+        if time.tzinfo is None:
+            time = time.tz_localize("UTC")
+        return int(time.value)
+    raise TypeError("Unsupported time {0}".format(repr(time)))
+
+
+def to_arrays(columns, values):
+    """
+    Decodes the rows of a chunk into an array per column
+    :param columns: the columns
+    :param values: the rows
+    :return: list of arrays, in the order of the columns
+    """
+    rows = np.array(values, dtype=object).reshape(len(values), len(columns))
+    arrays = []
+    for i, column in enumerate(columns):
+        if column == TIME:
+            arrays.append(rows[:, i].astype(np.int64))
+            continue
+        if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in rows[:, i]):
+            arrays.append(np.array([np.nan if v is None else v for v in rows[:, i]], dtype=np.float64))
+        else:
+            arrays.append(rows[:, i])
+    return arrays
+
+
+def get_error_message(body):
+    """
+    Gets the error message from the body of an error response
+    :param body: the body
+    :return: the error message
+    """
+    try:
+        return json.loads(body.decode("utf-8"))["error"]
+    except (ValueError, KeyError, TypeError):
+        return body.decode("utf-8", "replace")
@@ -1,5 +1,12 @@
+import io
 import psycopg2
+import psycopg2.extensions
 from datetime import datetime
+from dbclients.PostgresCopy import parse_binary_time_series, parse_csv_time_series, to_numbered_parameters
+
+CSV = "csv"
+BINARY = "binary"
+COPY_QUERY = "COPY ({0}) TO STDOUT WITH (FORMAT {1})"
 
 
 class PostgresClient:
@@ -20,6 +27,8 @@ class PostgresClient:
                 db_client_config.host,
                 db_client_config.port)
         self.connection = None
+        self.statements = {}
+        self.prepared = set()
         self.open_connection()
         self.cursor = None
         self.logger = logger
@@ -35,18 +44,74 @@ class PostgresClient:
         :return: the retrieved rows from the database as the first element in the tuple,
         followed by the number of errors (retry_count) and then the elapsed time in minutes
         """
+        return self.run(self.fetch_all, query_string, params, retry_count)
+
+    def prepare(self, name, query_string):
+        """
+        Registers a named prepared statement. The statement is prepared once per connection, when it is executed
+        for the first time, and prepared again after the connection has been reopened
+        :param name: the name of the statement
+        :param query_string: the string that contains the SQL, with %s parameters like get_all
+        :return:-
+        """
+        self.statements[name] = query_string
+        self.prepared.discard(name)
+
+    def get_all_prepared(self, name, params, retry_count=3):
+        """
+        Get all rows of a prepared statement, see prepare(). The server doesn't parse and plan the query again for
+        every execution. It contains a retry mechanism that allows for fault recovery
+        :param name: the name of the statement
+        :param params: parameters of the statement
+        :param retry_count: the number of times query should be retried in case
+               of error
+        :return: the retrieved rows from the database as the first element in the tuple,
+        followed by the number of errors (retry_count) and then the elapsed time in minutes
+        """
+        return self.run(lambda query_string, params: self.fetch_prepared(name, params), self.statements[name],
+                        params, retry_count)
+
+    def get_time_series(self, query_string, params, copy_format=BINARY, retry_count=3):
+        """
+        Gets the result of a query with a timestamp and a float column in bulk, with COPY ... TO STDOUT into an
+        in-memory buffer that is decoded into arrays, without creating Python objects per row. A binary COPY that
+        contains NULL's is read again in CSV format. It contains a retry mechanism that allows for fault recovery
+        :param query_string: the string that contains the SQL, a SELECT of a timestamp (without time zone) and a
+               float column
+        :param params: parameters that should be replaced in the query_string
+        :param copy_format: the format of the COPY, BINARY or CSV
+        :param retry_count: the number of times query should be retried in case
+               of error
+        :return: a tuple of the timestamps (datetime64) and values (float64) arrays as the first element in the
+        tuple, followed by the number of errors (retry_count) and then the elapsed time in minutes
+        """
+        return self.run(lambda query_string, params: self.fetch_time_series(query_string, params, copy_format),
+                        query_string, params, retry_count)
+
+    def run(self, fetch, query_string, params, retry_count):
+        """
+        Fetches the result of a query with a new cursor. In case of an error, the connection is reopened and the
+        query is retried
+        :param fetch: the function that fetches the result, with the query_string and params as arguments
+        :param query_string: the string that contains the SQL
+        :param params: parameters that should be replaced in the query_string
+        :param retry_count: the number of times query should be retried in case
+               of error
+        :return: the result as the first element in the tuple, followed by the number of errors (retry_count) and
+        then the elapsed time in minutes
+        """
         last_exception = None
         for i in range(retry_count):
             try:
                 self.open_cursor()
                 t1 = datetime.utcnow()
-                self.cursor.execute(query_string, tuple(params))
-                results = self.cursor.fetchall()
+                results = fetch(query_string, params)
                 return results, i, (datetime.utcnow() - t1).seconds/60.0
             except Exception as e:
                 last_exception = e
                 self.log(query_string, params, e, i)
-                self.logger.warning("Closing and opening again new connection to get around resource problems")
+                if self.logger:
+                    self.logger.warning("Closing and opening again new connection to get around resource problems")
                 self.close_connection()
                 self.open_connection()
             finally:
@@ -54,11 +119,51 @@ class PostgresClient:
 
         raise last_exception
 
+    def fetch_all(self, query_string, params):
+        self.cursor.execute(query_string, tuple(params))
+        return self.cursor.fetchall()
+
+    def fetch_prepared(self, name, params):
+        if name not in self.prepared:
+            self.cursor.execute("PREPARE {0} AS {1}".format(name, to_numbered_parameters(self.statements[name])))
+            self.prepared.add(name)
+        if params:
+            self.cursor.execute("EXECUTE {0} ({1})".format(name, ", ".join(["%s"] * len(params))), tuple(params))
+        else:
+            self.cursor.execute("EXECUTE {0}".format(name))
+        return self.cursor.fetchall()
+
+    def fetch_time_series(self, query_string, params, copy_format):
+        query = self.cursor.mogrify(query_string, tuple(params))
+        if isinstance(query, bytes):
+            query = query.decode(psycopg2.extensions.encodings[self.connection.encoding])
+        buf = self.copy(query, copy_format)
+        try:
+            return parse_binary_time_series(buf) if copy_format == BINARY else parse_csv_time_series(buf)
+        except ValueError as e:
+            if self.logger:
+                self.logger.warning("Binary COPY can't be decoded ({0}), reading in CSV format".format(str(e)))
+            return parse_csv_time_series(self.copy(query, CSV))
+
+    def copy(self, query, copy_format):
+        """
+        Copies the result of a query into an in-memory buffer
+        :param query: the query, with the parameters replaced
+        :param copy_format: the format of the COPY, BINARY or CSV
+        :return: the buffer
+        """
+        buf = io.BytesIO()
+        self.cursor.copy_expert(COPY_QUERY.format(query, copy_format), buf)
+        buf.seek(0)
+        return buf
+
     def close_connection(self):
         self.connection.close()
 
     def open_connection(self):
         self.connection = psycopg2.connect(self.connect_string)
+        # Prepared statements only exist in the session that prepared them
+        self.prepared = set()
 
     def open_cursor(self):
         self.cursor = self.connection.cursor()
@@ -81,6 +186,3 @@ class PostgresClient:
                 "Error: {1}, query: {2}, params: {3}".format(
                     str(i + 1), str(exception), query_string,
                     ','.join(str(p) for p in params)))
-
-
-
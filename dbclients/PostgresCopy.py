@@ -0,0 +1,65 @@
+import struct
+import numpy as np
+import pandas as pd
+
+""" Decoding of the output of COPY ... TO STDOUT of the PostgresClient, and conversion of queries to prepared
+statements. It doesn't depend on psycopg2, so that it can be used (and tested) without a Postgres driver.
+"""
+
+BINARY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# Rows of a binary COPY of (timestamp, float8) without NULL's: field count, then length and value per field
+BINARY_TIME_SERIES_ROW = np.dtype([("fields", ">i2"), ("time_length", ">i4"), ("time", ">i8"),
+                                   ("value_length", ">i4"), ("value", ">f8")])
+POSTGRES_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+
+def to_numbered_parameters(query_string):
+    """
+    Converts the %s parameters of a query to the $1, $2, ... parameters of a prepared statement
+    :param query_string: the string that contains the SQL
+    :return: the converted string
+    """
+    parts = query_string.split("%%")
+    number = 0
+    for i, part in enumerate(parts):
+        pieces = part.split("%s")
+        parts[i] = pieces[0]
+        for piece in pieces[1:]:
+            number += 1
+            parts[i] += "${0}{1}".format(number, piece)
+    return "%".join(parts)
+
+
+def parse_csv_time_series(buf):
+    """
+    Decodes the CSV output of a COPY of a timestamp and a float column
+    :param buf: the buffer
+    :return: tuple of the timestamps (datetime64) and values (float64) arrays
+    """
+    if not buf.getvalue():
+        return np.array([], dtype="datetime64[ns]"), np.array([], dtype=np.float64)
+    # The fractional seconds vary per row, so the timestamps are converted by NumPy instead of by format
+    df = pd.read_csv(buf, header=None, names=["time", "value"], dtype={"time": str, "value": np.float64})
+    return np.asarray(df["time"].values, dtype="datetime64[ns]"), df["value"].values
+
+
+def parse_binary_time_series(buf):
+    """
+    Decodes the binary output of a COPY of a timestamp and a float column. The rows are decoded at once with a
+    structured dtype, which requires that the rows have a fixed length, i.e. that there are no NULL's
+    :param buf: the buffer
+    :return: tuple of the timestamps (datetime64) and values (float64) arrays
+    """
+    data = buf.getvalue()
+    if data[:len(BINARY_SIGNATURE)] != BINARY_SIGNATURE:
+        raise ValueError("no binary COPY signature")
+    # Header: signature, flags and the length of the header extension
+    extension_length = struct.unpack(">i", data[len(BINARY_SIGNATURE) + 4:len(BINARY_SIGNATURE) + 8])[0]
+    body = data[len(BINARY_SIGNATURE) + 8 + extension_length:-2]
+    if len(body) % BINARY_TIME_SERIES_ROW.itemsize:
+        raise ValueError("rows of variable length")
+    rows = np.frombuffer(body, dtype=BINARY_TIME_SERIES_ROW)
+    if not ((rows["fields"] == 2).all() and (rows["time_length"] == 8).all() and (rows["value_length"] == 8).all()):
+        raise ValueError("rows of variable length")
+    times = POSTGRES_EPOCH + rows["time"].astype(np.int64).astype("timedelta64[us]")
+    return times.astype("datetime64[ns]"), rows["value"].astype(np.float64)
@@ -0,0 +1,122 @@
+import threading
+import time
+from queue import Queue
+
+""" Background writer, so that a task can continue its calculations while its data is written to the database. The
+writes are done in order by one thread. The queue is bounded: when the database can't keep up, the task waits
+(backpressure) instead of piling up data in memory.
+"""
+
+DEFAULT_MAX_QUEUE = 8
+
+
+class AsyncWriter:
+    """
+    Class that represents the background writer. An error of a write is raised in the task by the next call to
+    submit(), flush() or join(). The writes that are queued after a failed write are discarded, so that callbacks
+    that mark data as written (e.g. watermarks) are not executed
+    """
+
+    def __init__(self, max_queue=DEFAULT_MAX_QUEUE, logger=None):
+        """
+        Constructor
+        :param max_queue: the maximum number of queued writes, submit() blocks when the queue is full
+        :param logger: the logger object
+        """
+        self.logger = logger
+        self._queue = Queue(maxsize=max_queue)
+        self._thread = None
+        self._error = None
+        self._discarded = 0
+        self.reset_statistics()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Queues a write, it blocks while the queue is full
+        :param function: the function that writes, e.g. shared.save_to_db
+        :param args: the arguments of the function
+        :param kwargs: the keyword arguments of the function
+        :return:-
+        """
+        self.check()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="AsyncWriter")
+            self._thread.daemon = True
+            self._thread.start()
+        start = time.time()
+        self._queue.put((function, args, kwargs, start))
+        self.wait_time += time.time() - start
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+    def flush(self):
+        """
+        Waits until all queued writes are done
+        :return:-
+        """
+        if self._thread is not None:
+            self._queue.join()
+        self.check()
+
+    def join(self):
+        """
+        Waits until all queued writes are done and stops the thread, e.g. at the end of a task. The thread is started
+        again by the next submit()
+        :return:-
+        """
+        try:
+            self.flush()
+        finally:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+    def check(self):
+        """
+        Raises the error of a failed write, if any. The writes that were queued before the error is raised are
+        discarded first, so that none of them is executed once the error has been cleared
+        :return:-
+        """
+        if self._error is not None:
+            self._queue.join()
+            error, discarded = self._error, self._discarded
+            self._error, self._discarded = None, 0
+            if self.logger and discarded:
+                self.logger.error("Async writer: {0} queued writes discarded after a failed write".format(discarded))
+            raise error
+
+    def reset_statistics(self):
+        self.writes = 0
+        self.write_time = 0.0
+        self.wait_time = 0.0
+        self.max_latency = 0.0
+        self.max_queue_depth = 0
+
+    def log_statistics(self):
+        if self.logger and self.writes:
+            self.logger.info("Async writer: {0} writes, {1:.1f} s writing, {2:.1f} s waiting for a full queue, max "
+                             "queue depth {3}, max latency {4:.1f} s".format(
+                                 self.writes, self.write_time, self.wait_time, self.max_queue_depth,
+                                 self.max_latency))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                function, args, kwargs, submitted = item
+                if self._error is not None:
+                    self._discarded += 1
+                    continue
+                start = time.time()
+                function(*args, **kwargs)
+                self.writes += 1
+                self.write_time += time.time() - start
+                self.max_latency = max(self.max_latency, time.time() - submitted)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error("Async writer: write failed. {0}".format(str(e)))
+                self._error = e
+            finally:
+                self._queue.task_done()
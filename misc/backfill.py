@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from misc.signal_store import to_ranges
+
+""" Backfill of gaps in loaded signals. The number of points per day in the source database is compared with the
+number of points per day that has been loaded, and only the days that are missing points are read again. The
+slices of the plan are read in parallel, with a bounded number of database clients.
+"""
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def find_missing_days(source_counts, loaded_counts):
+    """
+    Finds the days for which fewer points have been loaded than the source contains
+    :param source_counts: series with the number of points per day in the source
+    :param loaded_counts: series with the number of points per day that has been loaded, days without points may be
+           left out
+    :return: the missing days, sorted
+    """
+    loaded_counts = loaded_counts.reindex(source_counts.index, fill_value=0)
+    return source_counts.index[loaded_counts.values < source_counts.values].sort_values()
+
+
+def plan_backfill(key, source_counts, loaded_counts):
+    """
+    Creates the backfill plan of a signal
+    :param key: the signal, passed on to the read function of execute_plan
+    :param source_counts: series with the number of points per day in the source
+    :param loaded_counts: series with the number of points per day that has been loaded
+    :return: list of (key, start, stop) slices that should be read again
+    """
+    return [(key, start, stop) for start, stop in to_ranges(find_missing_days(source_counts, loaded_counts))]
+
+
+def execute_plan(plan, read, create_client, on_result, max_workers=DEFAULT_MAX_WORKERS, logger=None):
+    """
+    Reads the slices of a backfill plan in parallel. Every worker thread creates its own database client, so at most
+    max_workers clients are used. The results are handled by on_result in the calling thread, e.g. to write them, and
+    at most 2 * max_workers results are read ahead. A slice that fails is logged and skipped, the other slices are
+    still read
+    :param plan: list of (key, start, stop) slices
+    :param read: function that reads a slice, with the signature read(client, key, start, stop)
+    :param create_client: function without arguments that creates a database client
+    :param on_result: function that is called with the slice and the result of read
+    :param max_workers: the number of worker threads
+    :param logger: the logger object
+    :return: the slices that failed
+    """
+    local = threading.local()
+    clients = []
+    lock = threading.Lock()
+
+    def run(plan_slice):
+        if not hasattr(local, "client"):
+            local.client = create_client()
+            with lock:
+                clients.append(local.client)
+        return read(local.client, *plan_slice)
+
+    failed = []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            slices = iter(plan)
+            while True:
+                for plan_slice in slices:
+                    pending[executor.submit(run, plan_slice)] = plan_slice
+                    if len(pending) >= 2 * max_workers:
+                        break
+                if not pending:
+                    break
+                done = wait(pending, return_when=FIRST_COMPLETED)[0]
+                for future in done:
+                    plan_slice = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        if logger:
+                            logger.error("Backfill: reading {0} from {1} to {2} failed. {3}".format(
+                                plan_slice[0], plan_slice[1], plan_slice[2], str(e)))
+                        failed.append(plan_slice)
+                        continue
+                    on_result(plan_slice, result)
+    finally:
+        for client in clients:
+            client.close_connection()
+    return failed
@@ -1,18 +1,34 @@
 import time
 import re
+import hashlib
 import datetime
+import os
+import tempfile
+import numpy as np
+from collections import namedtuple
 from misc.singleton_metaclass import Singleton
+from misc.shared_cache import SharedFileCache
+from misc.synchronize import atomic_snapshot
 
 # Constants used in this class
 DEFAULT_TAG = "default"
 RP_NAME_TAG = "name"
 SHARD_GROUP_DURATION_TAG = "shardGroupDuration"
 SPLIT_PATTERN = "h|m|s"
+SPLIT_REGEX = re.compile(SPLIT_PATTERN)
 UNDEFINED_RP_SHARD_DURATION = -1
 TIME = "time"
 MEASUREMENT = "measurement"
 SOURCE_NR = "source_nr"
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Shared cross-process cache of the retention policies, one file per cache version (i.e. set of machines)
+RP_CACHE_PATH = os.path.join(tempfile.gettempdir(), "retention_policies_{0}.json")
+RP_CACHE_TTL = 60 * 60  # 1 hour
+RP_CACHE_VERSION = "1"
+
+# Immutable snapshot of the retention policies and the lookup tables that are derived from them
+RetentionPolicySnapshot = namedtuple("RetentionPolicySnapshot",
+                                     ["rp_mapping", "default_rp_names", "shard_group_durations"])
 
 
 class RetentionPolicyConfig:
@@ -26,40 +42,133 @@ class RetentionPolicyConfig:
     have their own instance of RetentionPolicyConfi and thus execute (redudant) queries to retrieve retention
     policty information from the database. This pattern can be seen in more constructs in the application,
     like with the Mount or Translate 'Singleton' classes. This must be addressed in a future redesign of the
-    application. """
+    application.
+
+    To prevent all these processes from querying the database, a shared cache can be passed (see
+    create_shared_cache). The first process populates it, the other processes read the cached retention policies
+    until the cache expires or is invalidated by refresh().
+
+    The retention policies are read far more often than they are (re)loaded. Therefore they are kept in an
+    immutable snapshot that is swapped atomically by load(), so readers never need to lock. """
 
     __metaclass__ = Singleton
 
-    def __init__(self, dbclient, machines, logger):
+    def __init__(self, dbclient, machines, logger, cache=None):
         """
         Default constructor
         :param dbclient: the dbclient
         :param machines: the list of machines (i.e. databases [source])
         :param logger: the logger object
+        :param cache: (optional) the SharedFileCache that is shared with other processes
         """
-        self.db_to_rp_mapping = {}
+        self._snapshot = RetentionPolicySnapshot({}, {}, {})
         self.logger = logger
         self.machines = machines
         self.dbclient = dbclient
+        self.cache = cache
         self.load()
 
+    @staticmethod
+    def create_shared_cache(logger, machines, path=RP_CACHE_PATH, ttl=RP_CACHE_TTL):
+        """
+        Creates the cache that is shared by all processes on the host with the same set of machines. Processes
+        with another set of machines use another file, so that they don't invalidate each other's cache
+        :param logger: the logger object
+        :param machines: the list of machines of the process
+        :param path: the path of the cache file, {0} is replaced by a hash of the cache version
+        :param ttl: the time to live of the cached retention policies in seconds
+        :return: the cache
+        """
+        version = RetentionPolicyConfig.get_cache_version(machines)
+        return SharedFileCache(path.format(hashlib.sha1(version.encode("utf-8")).hexdigest()[:16]), ttl,
+                               logger=logger)
+
+    @atomic_snapshot("_snapshot")
     def load(self):
         """
-        Method that loads the retention policies for all databases. When this method is being executed, any other
-        method that is decorated with the indicated synchronization lock, will block
+        Method that loads the retention policies for all databases, from the shared cache if available. The new
+        snapshot replaces the current one atomically, so methods that read the retention policies don't block
+        while this method is being executed (concurrent loads are serialized)
+        :return: the new snapshot
+        """
+
+        if self.cache:
+            db_to_rp_mapping = self.cache.populate(self.get_cache_version(self.machines),
+                                                   self.query_retention_policies)
+        else:
+            db_to_rp_mapping = self.query_retention_policies()
+        return self.build_snapshot(db_to_rp_mapping)
+
+    def build_snapshot(self, db_to_rp_mapping):
+        """
+        Precomputes, per database, the name of the default retention policy and the shard group durations (in
+        seconds) per retention policy name, so that check_data_age, which is called on every write, doesn't need
+        to scan and parse the retention policies
+        :param db_to_rp_mapping: dictionary of database to list of retention policies
+        :return: the RetentionPolicySnapshot
+        """
+
+        default_rp_names = {}
+        shard_group_durations = {}
+        for database, retention_policies in db_to_rp_mapping.items():
+            default_rp_names[database] = next((retention_policy[RP_NAME_TAG] for retention_policy
+                                               in retention_policies if retention_policy[DEFAULT_TAG]), None)
+            shard_group_durations[database] = \
+                {retention_policy[RP_NAME_TAG]: self.get_shard_group_duration_in_seconds(database, retention_policy)
+                 for retention_policy in retention_policies}
+        return RetentionPolicySnapshot(db_to_rp_mapping, default_rp_names, shard_group_durations)
+
+    @property
+    def db_to_rp_mapping(self):
+        return self._snapshot.rp_mapping
+
+    @property
+    def db_to_default_rp_name(self):
+        return self._snapshot.default_rp_names
+
+    @property
+    def db_to_shard_group_durations(self):
+        return self._snapshot.shard_group_durations
+
+    def refresh(self):
+        """
+        Invalidates the shared cache (if any) and loads the retention policies from the database again. Other
+        processes will pick up the refreshed retention policies when they (re)load
         :return:-
         """
 
-        self.db_to_rp_mapping = {}
+        if self.cache:
+            self.cache.invalidate()
+        self.load()
+
+    def query_retention_policies(self):
+        """
+        Queries the retention policies of all databases
+        :return: dictionary of database to list of retention policies
+        """
+
+        db_to_rp_mapping = {}
         for machine in self.machines:
             database = "s" + machine[SOURCE_NR]
             try:
-                self.db_to_rp_mapping[database] = self.dbclient.get_list_retention_policies(database)
+                db_to_rp_mapping[database] = self.dbclient.get_list_retention_policies(database)
             except Exception as e:
-                if "database not found" in e.message:
+                if "database not found" in str(e):
                     continue
                 else:
                     raise e
+        return db_to_rp_mapping
+
+    @staticmethod
+    def get_cache_version(machines):
+        """
+        The version stamp of the cached retention policies. It contains the databases, so that processes with
+        another set of machines don't use each other's cached data
+        :param machines: the list of machines
+        :return: the version stamp
+        """
+
+        return RP_CACHE_VERSION + ":" + ",".join(sorted("s" + machine[SOURCE_NR] for machine in machines))
 
     def check_data_age(self, database, retention_policy_name, job_name, data):
         """
@@ -74,14 +183,10 @@ class RetentionPolicyConfig:
 
         if not data:
             return
-        rp_name = retention_policy_name
-        if not rp_name:
-            # Get the default retention policy
-            rp_name = self.get_default_retention_policy_name(database)
-        rp_shard_group_duration = self.get_rp_shard_group_duration(database, rp_name)
+        rp_name, rp_shard_group_duration = self.get_rp_name_and_shard_group_duration(database, retention_policy_name)
         if rp_shard_group_duration == UNDEFINED_RP_SHARD_DURATION:
             return
-        oldest_data_point = sorted(data, key=lambda k: k[TIME], reverse=False)[0]
+        oldest_data_point = min(data, key=lambda k: k[TIME])
         if oldest_data_point[TIME]/1000000000 + rp_shard_group_duration < time.time():
             self.logger.info("Possible compaction issue: Job {0}, is inserting a datapoint with timestamp {1}. "
                              "Signal is {2}, retention policy is {3} and shard group duration is {4} hours".
@@ -91,6 +196,102 @@ class RetentionPolicyConfig:
                                     rp_shard_group_duration / 3600))
             return
 
+    def check_frame_data_age(self, database, retention_policy_name, job_name, data):
+        """
+        Vectorized variant of check_data_age for data that is not (yet) materialized as a list of points. The
+        oldest timestamp of every measurement is determined in one pass and all measurements that contain old
+        data are reported in one log record
+        :param database: the database (source number)
+        :param retention_policy_name: the name of the retention policy
+        :param job_name the name of the job
+        :param data: a DataFrame (columns are measurements), a Series (name is the measurement) or a dictionary of
+               measurement to Series, DataFrame or NumPy array of int64 timestamps in nanoseconds
+        :return:-
+        """
+
+        oldest_times = self.get_oldest_times(data)
+        if not oldest_times:
+            return
+        rp_name, rp_shard_group_duration = self.get_rp_name_and_shard_group_duration(database, retention_policy_name)
+        if rp_shard_group_duration == UNDEFINED_RP_SHARD_DURATION:
+            return
+        now = time.time()
+        old_measurements = sorted((oldest_time, measurement) for measurement, oldest_time in oldest_times.items()
+                                  if oldest_time / 1000000000 + rp_shard_group_duration < now)
+        if old_measurements:
+            self.logger.info("Possible compaction issue: Job {0}, is inserting datapoints older than the shard group "
+                             "duration. Retention policy is {1} and shard group duration is {2} hours. Signals "
+                             "(oldest timestamp): {3}".
+                             format(job_name, rp_name, rp_shard_group_duration / 3600,
+                                    ", ".join("{0} ({1})".format(
+                                        measurement, datetime.datetime.fromtimestamp(oldest_time / 1000000000).
+                                        strftime(DATETIME_FORMAT)) for oldest_time, measurement in old_measurements)))
+
+    @staticmethod
+    def get_oldest_times(data):
+        """
+        Determines the oldest timestamp of the (non-null) values per measurement
+        :param data: see check_frame_data_age
+        :return: dictionary of measurement to the oldest timestamp in nanoseconds
+        """
+
+        if hasattr(data, "columns"):
+            # DataFrame: per column, the first index of the (sorted) frame where the column has a value
+            if not data.index.is_monotonic_increasing:
+                data = data.sort_index()
+            has_values = data.notnull()
+            has_values = has_values.loc[:, has_values.any().values]
+            if has_values.empty:
+                return {}
+            return {measurement: int(oldest_time.value) for measurement, oldest_time in has_values.idxmax().items()}
+        if hasattr(data, "index"):
+            data = {data.name: data}
+        oldest_times = {}
+        for measurement, values in data.items():
+            if values is None:
+                continue
+            elif hasattr(values, "columns"):
+                oldest_times.update(RetentionPolicyConfig.get_oldest_times(values))
+                continue
+            elif hasattr(values, "index"):
+                times = RetentionPolicyConfig.get_index_times(values)[values.notnull().values]
+            else:
+                times = np.asarray(values, dtype=np.int64)
+            if times.size:
+                oldest_times[measurement] = int(times.min())
+        return oldest_times
+
+    @staticmethod
+    def get_index_times(data):
+        """
+        Converts the (datetime) index of a Series or DataFrame to int64 timestamps in nanoseconds
+        :param data: the Series or DataFrame
+        :return: NumPy array with the timestamps
+        """
+
+        return data.index.values.astype("datetime64[ns]").astype(np.int64)
+
+    def get_rp_name_and_shard_group_duration(self, database, retention_policy_name):
+        """
+        Looks up the retention policy name (the default one if no name is passed) and its shard group duration in
+        the precomputed lookup tables. For names that are not known, the shard group duration is determined
+        (and logged) as before
+        :param database: the database
+        :param retention_policy_name: the name of the retention policy, or None for the default retention policy
+        :return: tuple of the retention policy name and the shard group duration in seconds
+        """
+
+        snapshot = self._snapshot
+        if database not in snapshot.default_rp_names:
+            # Unknown database, behave as without lookup tables
+            rp_name = retention_policy_name or self.get_default_retention_policy_name(database)
+            return rp_name, self.get_rp_shard_group_duration(database, rp_name)
+        rp_name = retention_policy_name or snapshot.default_rp_names[database]
+        rp_shard_group_duration = snapshot.shard_group_durations[database].get(rp_name)
+        if rp_shard_group_duration is None:
+            rp_shard_group_duration = self.get_rp_shard_group_duration(database, rp_name)
+        return rp_name, rp_shard_group_duration
+
     def get_retention_policies(self, database):
         """
         This method retrieves the retention policies for the database
@@ -161,7 +362,7 @@ class RetentionPolicyConfig:
                              "be determined, setting to max".format(retention_policy[RP_NAME_TAG], database))
             return UNDEFINED_RP_SHARD_DURATION
         # format returned by influxdb: <int>h<int>m<int>s: needs to be splitted
-        splitted = re.split(SPLIT_PATTERN, rp_shard_group_duration)
+        splitted = SPLIT_REGEX.split(rp_shard_group_duration)
         if len(splitted) != 4:
             self.logger.info("Shard group duration {0} for retention policy {1} for database {1} has "
                              "incorrect format, setting to max".
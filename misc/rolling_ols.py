@@ -0,0 +1,81 @@
+import numpy as np
+
+""" Ordinary least squares regression over windows of rows that move forward, e.g. 24 hour windows that advance 6
+hours at a time. Instead of refitting every window, the sufficient statistics (X'X, X'y, y'y and the number of
+observations) are updated with the rows that enter and leave the window.
+"""
+
+
+class RollingOLS:
+    """
+    Class that represents a regression of y on x without intercept, like statsmodels' OLS(y, x, missing="drop").
+    Rows in which y or one of the x columns is missing are left out. The R squared is uncentered, as statsmodels
+    reports it for a model without constant
+    """
+
+    def __init__(self, y, x):
+        """
+        Constructor
+        :param y: array (or series) with the dependent variable
+        :param x: 2-dimensional array (or dataframe) with the regressors, with the same rows as y. Arrays are not
+               copied, so the same x can be shared by the regressions of several y's
+        """
+        self._y = np.asarray(y, dtype=np.float64)
+        self._x = np.asarray(x, dtype=np.float64)
+        if self._x.ndim == 1:
+            self._x = self._x.reshape(-1, 1)
+        self._valid = ~np.isnan(self._y) & ~np.isnan(self._x).any(axis=1)
+        self.reset()
+
+    def reset(self):
+        """
+        Empties the window
+        :return:-
+        """
+        k = self._x.shape[1]
+        self.xtx = np.zeros((k, k))
+        self.xty = np.zeros(k)
+        self.yty = 0.0
+        self.nobs = 0
+        self.start = self.stop = 0
+
+    def move(self, start, stop):
+        """
+        Moves the window to the rows [start, stop). The rows that enter the window are added to the statistics and
+        the rows that leave it are subtracted. A window that doesn't overlap the previous one is computed anew
+        :param start: the first row of the window, not before the first row of the previous window
+        :param stop: the end of the window (exclusive), not before the end of the previous window
+        :return:-
+        """
+        if start < self.start or stop < self.stop:
+            raise ValueError("The window can only move forward")
+        if start >= self.stop:
+            self.reset()
+            self.__update(start, stop, 1)
+        else:
+            self.__update(self.stop, stop, 1)
+            self.__update(self.start, start, -1)
+        self.start, self.stop = start, stop
+
+    def fit(self):
+        """
+        Fits the regression of the current window
+        :return: tuple of the parameters (array) and the R squared, NaN's if there are not enough observations
+        """
+        k = self._x.shape[1]
+        if self.nobs < max(k, 1) or self.yty <= 0:
+            return np.full(k, np.nan), np.nan
+        params = np.linalg.pinv(self.xtx).dot(self.xty)
+        ssr = self.yty - params.dot(self.xty)
+        return params, 1 - ssr / self.yty
+
+    def __update(self, start, stop, sign):
+        if stop <= start:
+            return
+        valid = self._valid[start:stop]
+        x = self._x[start:stop][valid]
+        y = self._y[start:stop][valid]
+        self.xtx += sign * x.T.dot(x)
+        self.xty += sign * x.T.dot(y)
+        self.yty += sign * y.dot(y)
+        self.nobs += sign * len(y)
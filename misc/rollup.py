@@ -0,0 +1,270 @@
+import threading
+import numpy as np
+import pandas as pd
+from misc.synchronize import synchronized_with_attr
+
+""" Hourly rollups of signals: per signal and per hour the number of points, the minimum, maximum and sum, and the
+first and last value. Questions like "which hours contain data" are answered from the rollups, instead of scanning the
+raw points. The rollups are maintained as data is written (see WriteBuffer) and can be seeded from raw data or from
+hourly aggregates that are calculated by the database. The rollups are kept in memory per process and aren't
+persisted: data that is written by other processes is only seen after it has been loaded, and a new process seeds its
+rollups from the database again. The rollups are locked, as they are updated by the thread of an AsyncWriter while
+the task reads them.
+"""
+
+COUNT = "count"
+MIN = "min"
+MAX = "max"
+SUM = "sum"
+FIRST = "first"
+LAST = "last"
+AGGREGATES = [COUNT, MIN, MAX, SUM, FIRST, LAST]
+ONE_HOUR = pd.Timedelta(hours=1)
+DEFAULT_RETENTION = pd.Timedelta(days=31)
+
+
+class HourlyRollup:
+    """
+    Class that contains the hourly rollups of signals. A rollup is complete from a certain hour onwards: the hours
+    before it may have points that were written before the rollup was maintained. Points are rolled up once: points
+    that are written again, at or before the last rolled up point of the signal, are skipped, as the time series
+    database does for writes of new data only. Late points, which fall in hours of the complete range that have no
+    points yet, are merged into these hours
+    """
+
+    def __init__(self, retention=DEFAULT_RETENTION, logger=None):
+        """
+        Constructor
+        :param retention: the hours that are kept before the last rolled up point of a signal, None to keep all
+        :param logger: the logger object
+        """
+        self.retention = retention
+        self.logger = logger
+        self._rollups = {}
+        self._complete_from = {}
+        self._last_time = {}
+        self._lock = threading.RLock()
+
+    @synchronized_with_attr("_lock")
+    def update(self, data, prefix=None):
+        """
+        Rolls up data that has been written by shared.save_to_db(data, prefix), can be used as on_write callback
+        :param data: a dictionary of signal to series or a dataframe with a column per signal
+        :param prefix: the prefix of the signal names, if any
+        :return:-
+        """
+        for name, series in data.items():
+            if series is None or len(series) == 0:
+                continue
+            signal = prefix + "." + name if prefix else name
+            series = to_utc(series.dropna())
+            last_time = self._last_time.get(signal)
+            if last_time is not None:
+                self.merge_late(signal, series[series.index <= last_time])
+                series = series[series.index > last_time]
+            if series.empty:
+                continue
+            rollup = aggregate(series)
+            if signal not in self._rollups:
+                # The points before the first rolled up point of its hour are unknown
+                self._complete_from[signal] = ceil_hour(series.index.min())
+                self._rollups[signal] = rollup
+            else:
+                self._rollups[signal] = merge(self._rollups[signal], rollup)
+            self._last_time[signal] = series.index.max()
+            self.trim(signal)
+
+    @synchronized_with_attr("_lock")
+    def merge_late(self, signal, series):
+        """
+        Merges late points of a signal into the hours without points, the points in hours that have been rolled up
+        already are written again and are skipped
+        :param signal: the signal
+        :param series: the points at or before the last rolled up point of the signal, with a UTC index
+        :return:-
+        """
+        rollup = self._rollups.get(signal)
+        if rollup is None or series.empty:
+            return
+        late = aggregate(series[series.index >= self._complete_from[signal]])
+        late = late[~late.index.isin(rollup.index)]
+        if not late.empty:
+            self._rollups[signal] = merge(rollup, late)
+
+    @synchronized_with_attr("_lock")
+    def load(self, signal, series, from_time, to_time):
+        """
+        Seeds the rollup of a signal with raw data that has been read from the database. The raw data replaces the
+        rollup of the hours that it covers
+        :param signal: the signal
+        :param series: the raw data of the signal between from_time and to_time
+        :param from_time: the start of the range that has been read
+        :param to_time: the end of the range that has been read
+        :return:-
+        """
+        series = to_utc(series.dropna()) if series is not None else pd.Series(dtype="float64")
+        from_hour = ceil_hour(to_utc_timestamp(from_time))
+        loaded = aggregate(series[(series.index >= from_hour) & (series.index <= to_utc_timestamp(to_time))])
+        self.load_aggregates(signal, loaded, series.index.max() if not series.empty else None, from_time, to_time)
+
+    @synchronized_with_attr("_lock")
+    def load_aggregates(self, signal, loaded, last_loaded, from_time, to_time):
+        """
+        Seeds the rollup of a signal with hourly aggregates that have been calculated by the database (see
+        InfluxClient.query_aggregates), instead of reading the raw data. The aggregates replace the rollup of the
+        hours that they cover
+        :param signal: the signal
+        :param loaded: dataframe with a row per hour with points (UTC) and a column per aggregate
+        :param last_loaded: the time of the last point between from_time and to_time, None if there are no points
+        :param from_time: the start of the range that has been aggregated
+        :param to_time: the end of the range that has been aggregated
+        :return:-
+        """
+        from_hour = ceil_hour(to_utc_timestamp(from_time))
+        to_time = to_utc_timestamp(to_time)
+        loaded = loaded.loc[(loaded.index >= from_hour) & (loaded.index <= to_time), AGGREGATES].astype(np.float64)
+        # Points after the last loaded point may still be written, these are rolled up by update
+        last_loaded = to_utc_timestamp(last_loaded) if last_loaded is not None else None
+        current = self._rollups.get(signal)
+        if current is None:
+            self._rollups[signal] = loaded
+            self._complete_from[signal] = from_hour
+            self._last_time[signal] = last_loaded
+            self.trim(signal)
+            return
+        complete_from = min(self._complete_from[signal], from_hour)
+        last_time = self._last_time.get(signal)
+        if last_time is None or last_time <= to_time:
+            self._rollups[signal] = pd.concat([current[current.index < from_hour], loaded])
+            if last_loaded is None and last_time is not None and last_time < from_hour:
+                last_loaded = last_time
+            self._last_time[signal] = last_loaded
+        else:
+            # The hour of to_time also contains rolled up points after to_time, the rollup is kept from that hour
+            to_hour = to_time.floor(ONE_HOUR)
+            self._rollups[signal] = pd.concat([current[current.index < from_hour], loaded[loaded.index < to_hour],
+                                               current[current.index >= max(to_hour, from_hour)]])
+            if self._complete_from[signal] > to_hour:
+                complete_from = self._complete_from[signal]
+        self._complete_from[signal] = complete_from
+        self.trim(signal)
+
+    @synchronized_with_attr("_lock")
+    def trim(self, signal):
+        """
+        Removes the hours of a signal that are older than the retention
+        :param signal: the signal
+        :return:-
+        """
+        last_time = self._last_time.get(signal)
+        if self.retention is None or last_time is None:
+            return
+        oldest = (last_time - self.retention).floor(ONE_HOUR)
+        if self._complete_from[signal] < oldest:
+            self._rollups[signal] = self._rollups[signal][self._rollups[signal].index >= oldest]
+            self._complete_from[signal] = oldest
+
+    @synchronized_with_attr("_lock")
+    def is_complete(self, signal, from_time):
+        """
+        Checks whether the rollup of a signal contains all hours from a certain time
+        :param signal: the signal
+        :param from_time: the time
+        :return: True if the rollup is complete from from_time, False otherwise
+        """
+        complete_from = self._complete_from.get(signal)
+        return complete_from is not None and complete_from <= to_utc_timestamp(from_time)
+
+    @synchronized_with_attr("_lock")
+    def get(self, signal, from_time=None, to_time=None):
+        """
+        Gets the rollup of a signal
+        :param signal: the signal
+        :param from_time: (optional) the first hour
+        :param to_time: (optional) the last hour
+        :return: dataframe with a row per hour with points (UTC) and a column per aggregate, None if the signal has
+                 no rollup
+        """
+        rollup = self._rollups.get(signal)
+        if rollup is None:
+            return None
+        if from_time is not None:
+            rollup = rollup[rollup.index >= to_utc_timestamp(from_time).floor(ONE_HOUR)]
+        if to_time is not None:
+            rollup = rollup[rollup.index <= to_utc_timestamp(to_time)]
+        return rollup
+
+    @synchronized_with_attr("_lock")
+    def invalidate(self, signals):
+        """
+        Removes the rollups of signals, e.g. when data has been written without rolling it up
+        :param signals: the signals
+        :return:-
+        """
+        for signal in signals:
+            self._rollups.pop(signal, None)
+            self._complete_from.pop(signal, None)
+            self._last_time.pop(signal, None)
+
+
+def aggregate(series):
+    """
+    Rolls up the points of a series per hour
+    :param series: the series, with a datetime index
+    :return: dataframe with a row per hour with points (UTC) and a column per aggregate
+    """
+    series = to_utc(series.dropna()).sort_index()
+    if series.empty:
+        return pd.DataFrame(columns=AGGREGATES, index=pd.DatetimeIndex([], tz="UTC"), dtype=np.float64)
+    rollup = series.astype(np.float64).groupby(series.index.floor(ONE_HOUR)).agg(AGGREGATES)
+    rollup[COUNT] = rollup[COUNT].astype(np.float64)
+    return rollup[AGGREGATES]
+
+
+def merge(rollup, other):
+    """
+    Merges two rollups of a signal, the points of other are later than (or in the same hour as) the points of rollup
+    :param rollup: the rollup
+    :param other: the rollup of the later points
+    :return: the merged rollup
+    """
+    both = rollup.index.intersection(other.index)
+    if both.empty:
+        return pd.concat([rollup, other]).sort_index()
+    merged = pd.concat([rollup, other[~other.index.isin(both)]]).sort_index()
+    merged.loc[both, COUNT] = rollup.loc[both, COUNT] + other.loc[both, COUNT]
+    merged.loc[both, SUM] = rollup.loc[both, SUM] + other.loc[both, SUM]
+    merged.loc[both, MIN] = np.minimum(rollup.loc[both, MIN], other.loc[both, MIN])
+    merged.loc[both, MAX] = np.maximum(rollup.loc[both, MAX], other.loc[both, MAX])
+    merged.loc[both, LAST] = other.loc[both, LAST]
+    return merged
+
+
+def ceil_hour(time):
+    """
+    Rounds a time up to the hour
+    :param time: the time
+    :return: the first hour at or after time
+    """
+    return time if time == time.floor(ONE_HOUR) else time.floor(ONE_HOUR) + ONE_HOUR
+
+
+def to_utc(series):
+    """
+    Converts the index of a series to UTC, an index without time zone is UTC
+    :param series: the series
+    :return: the series with a UTC index
+    """
+    index = pd.DatetimeIndex(series.index)
+    index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    return pd.Series(series.values, index=index, name=series.name)
+
+
+def to_utc_timestamp(time):
+    """
+    Converts a time to a UTC timestamp, a time without time zone is UTC
+    :param time: the time
+    :return: the timestamp
+    """
+    time = pd.Timestamp(time)
+    return time.tz_localize("UTC") if time.tzinfo is None else time.tz_convert("UTC")
@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+import time
+
+""" Cache that is shared between processes on the same host by means of a file. Workers and taskworkers are
+started as separate Python programs, so a (Singleton) cache in memory is not shared. One process populates the
+cache file, the other processes read it. The file is replaced atomically, so readers never see a partially written
+cache.
+"""
+
+VERSION = "version"
+CREATED = "created"
+DATA = "data"
+LOCK_EXTENSION = ".lock"
+LOCK_POLL_INTERVAL = 0.1  # seconds
+
+
+class SharedFileCache:
+    """
+    Class that represents a cache entry in a file, with a time to live and a version stamp. An entry is only
+    returned if it is not expired and has been written with the same version stamp as the one that is requested,
+    so that a change in e.g. the configuration invalidates the entry
+    """
+
+    def __init__(self, path, ttl, lock_timeout=30, logger=None):
+        """
+        Constructor
+        :param path: the path of the cache file
+        :param ttl: the time to live of the cached data in seconds
+        :param lock_timeout: the number of seconds a process waits for another process to populate the cache,
+               before it populates the cache itself
+        :param logger: the logger object
+        """
+        self.path = path
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.logger = logger
+
+    def get(self, version):
+        """
+        Gets the cached data
+        :param version: the version stamp that the cached data should have
+        :return: the cached data, or None if there is no (valid) cached data
+        """
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get(VERSION) != version or entry.get(CREATED, 0) + self.ttl < time.time():
+            return None
+        return entry.get(DATA)
+
+    def put(self, data, version):
+        """
+        Writes the data to the cache, by writing a temporary file that replaces the cache file atomically
+        :param data: the data, which should be serializable to json
+        :param version: the version stamp of the data
+        :return:-
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path))
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({VERSION: version, CREATED: time.time(), DATA: data}, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def invalidate(self):
+        """
+        Removes the cached data, so that the next process that needs it will populate the cache again
+        :return:-
+        """
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def populate(self, version, loader):
+        """
+        Gets the cached data and populates the cache if there is no valid cached data. Only one process populates
+        the cache at the same time, the other processes wait (at most lock_timeout seconds) for it to finish
+        :param version: the version stamp that the cached data should have
+        :param loader: function without arguments that loads the data
+        :return: the (cached or loaded) data
+        """
+        data = self.get(version)
+        if data is not None:
+            return data
+        deadline = time.time() + self.lock_timeout
+        while not self.__acquire_lock():
+            data = self.get(version)
+            if data is not None:
+                return data
+            if time.time() > deadline:
+                self.log("Timeout while waiting for cache {0} to be populated, loading data".format(self.path))
+                return loader()
+            time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            data = loader()
+            self.put(data, version)
+            return data
+        finally:
+            self.__release_lock()
+
+    def __acquire_lock(self):
+        """
+        Acquires the populate lock by creating the lock file exclusively. A lock that is older than lock_timeout
+        is considered to be left behind by a crashed process and is removed
+        :return: True if the lock was acquired, False otherwise
+        """
+        lock_path = self.path + LOCK_EXTENSION
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except OSError:
+            try:
+                if os.path.getmtime(lock_path) + self.lock_timeout < time.time():
+                    os.remove(lock_path)
+            except OSError:
+                pass
+            return False
+
+    def __release_lock(self):
+        try:
+            os.remove(self.path + LOCK_EXTENSION)
+        except OSError:
+            pass
+
+    def log(self, message):
+        if self.logger:
+            self.logger.warning(message)
@@ -0,0 +1,258 @@
+import re
+import threading
+from collections import OrderedDict
+import pandas as pd
+from misc.synchronize import synchronized_with_attr
+
+""" Read-through cache of time series that are fetched from the database. The cache knows which time ranges of a
+signal it holds, so a request for a sub-range is served locally and a request that partially overlaps only fetches
+the missing edges from the database.
+"""
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+DEFAULT_SETTLE_TIME = pd.Timedelta(hours=1)
+# Data that is ingested later than the settle time is picked up once the cached signal has expired
+DEFAULT_TTL = pd.Timedelta(hours=6)
+# Tags as they are written by shared.save_to_db ({{key:value}}) and as they are read ({key=value})
+WRITTEN_TAG_REGEX = re.compile(r"\{\{(.*?)\}\}")
+
+
+class CachedSignal:
+    """
+    Class that contains the fetched data of one signal and the (closed) time intervals that have been fetched
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.series = pd.Series(dtype="float64")
+        self.intervals = []
+        self.created = pd.Timestamp.now(tz="UTC")
+
+    def get_missing_intervals(self, from_time, to_time):
+        """
+        Determines the parts of the requested time range that haven't been fetched
+        :param from_time: start of the requested range
+        :param to_time: end of the requested range
+        :return: list of (from_time, to_time) tuples
+        """
+        missing = []
+        start = from_time
+        for interval_start, interval_end in self.intervals:
+            if interval_end < start:
+                continue
+            if interval_start > to_time:
+                break
+            if interval_start > start:
+                missing.append((start, interval_start))
+            start = interval_end
+            if start >= to_time:
+                return missing
+        missing.append((start, to_time))
+        return missing
+
+    def add(self, series, from_time, to_time):
+        """
+        Adds fetched data to the cache
+        :param series: the fetched data
+        :param from_time: start of the fetched range
+        :param to_time: end of the fetched range, the range is not registered if to_time is before from_time
+        :return:-
+        """
+        if not series.empty:
+            series = pd.concat([self.series, series]) if not self.series.empty else series
+            self.series = series[~series.index.duplicated(keep="last")].sort_index()
+        if to_time < from_time:
+            return
+        intervals = sorted(self.intervals + [(from_time, to_time)])
+        self.intervals = [intervals[0]]
+        for interval_start, interval_end in intervals[1:]:
+            if interval_start <= self.intervals[-1][1]:
+                self.intervals[-1] = (self.intervals[-1][0], max(self.intervals[-1][1], interval_end))
+            else:
+                self.intervals.append((interval_start, interval_end))
+
+    def get(self, from_time, to_time):
+        """
+        Gets the cached data of the requested range
+        :param from_time: start of the requested range
+        :param to_time: end of the requested range
+        :return: the series
+        """
+        return self.series.loc[from_time:to_time]
+
+    @property
+    def nbytes(self):
+        return int(self.series.memory_usage(index=True))
+
+
+class SignalCache:
+    """
+    Class that represents a time range aware cache of signals, keyed by signal (and user). It sits in front of a
+    fetch function with the signature of shared.get_signals, which returns a DataFrame with one column per
+    signal. The least recently used signals are evicted when the cache exceeds max_bytes. Signals that are
+    written must be invalidated (see invalidate_data), otherwise stale data would be served. Data that is younger
+    than settle_time may still be incomplete, so that part of a range is fetched again by the next request, and a
+    signal that has been cached for longer than ttl is fetched again completely. An optional
+    SignalStore persists the fetched days on local disk, in which case the signals are fetched through the store.
+    Signals may be invalidated from another thread, e.g. by the AsyncWriter of a WriteBuffer
+    """
+
+    def __init__(self, fetch, max_bytes=DEFAULT_MAX_BYTES, settle_time=DEFAULT_SETTLE_TIME, logger=None, store=None,
+                 ttl=DEFAULT_TTL):
+        """
+        Constructor
+        :param fetch: the function that fetches signals from the database, e.g. shared.get_signals
+        :param max_bytes: the maximum memory usage of the cached data
+        :param settle_time: the age (timedelta) after which data is considered to be complete
+        :param logger: the logger object
+        :param store: the (optional) SignalStore
+        :param ttl: the time (timedelta) after which a cached signal expires, None to keep it until it is evicted or
+               invalidated
+        """
+        self.fetch = fetch
+        self.store = store
+        self.max_bytes = max_bytes
+        self.settle_time = settle_time
+        self.ttl = ttl
+        self.logger = logger
+        self._signals = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.fetches = 0
+
+    @synchronized_with_attr("_lock")
+    def get_signals(self, signals, user, from_time=None, to_time=None):
+        """
+        Gets the signals for the time range, from the cache where possible. Only the missing parts are fetched;
+        signals that miss the same parts are fetched together. Requests without a time range are not cached
+        :param signals: a signal or a list of signals
+        :param user: the user to access the database
+        :param from_time: start of the time range (inclusive)
+        :param to_time: end of the time range (inclusive)
+        :return: dataframe with one column per signal that has data in the time range
+        """
+
+        fetch = self.store.get_signals if self.store else self.fetch
+        if from_time is None or to_time is None:
+            return fetch(signals, user, from_time=from_time, to_time=to_time)
+        signals = [signals] if isinstance(signals, str) else list(signals)
+        from_time, to_time = pd.Timestamp(from_time), pd.Timestamp(to_time)
+
+        settled_time = self.get_settled_time(to_time)
+        expired = pd.Timestamp.now(tz="UTC") - self.ttl if self.ttl is not None else None
+        missing = OrderedDict()
+        for signal in signals:
+            cached = self._signals.get((signal, user))
+            if cached and expired is not None and cached.created < expired:
+                del self._signals[(signal, user)]
+                cached = None
+            intervals = cached.get_missing_intervals(from_time, to_time) if cached else [(from_time, to_time)]
+            if not intervals:
+                self.hits += 1
+            for interval in intervals:
+                missing.setdefault(interval, []).append(signal)
+        for (interval_start, interval_end), missing_signals in missing.items():
+            self.fetches += 1
+            df = fetch(missing_signals, user, from_time=interval_start, to_time=interval_end)
+            for signal in missing_signals:
+                series = df[signal].dropna() if signal in df.columns else pd.Series(dtype="float64")
+                self.__get_or_create(signal, user).add(series, interval_start, min(interval_end, settled_time))
+
+        columns = []
+        for signal in signals:
+            key = (signal, user)
+            self._signals.move_to_end(key)
+            series = self._signals[key].get(from_time, to_time)
+            if not series.empty:
+                columns.append(series.rename(signal))
+        self.__evict()
+        return pd.concat(columns, axis=1) if columns else pd.DataFrame()
+
+    @synchronized_with_attr("_lock")
+    def invalidate(self, signals):
+        """
+        Removes signals from the cache
+        :param signals: the names of the signals
+        :return:-
+        """
+        signals = set(signals)
+        if self.store:
+            self.store.invalidate(signals)
+        for key in [key for key in self._signals if key[0] in signals]:
+            del self._signals[key]
+
+    def invalidate_data(self, data, prefix=None):
+        """
+        Removes the signals that are written by shared.save_to_db(data, prefix) from the cache, both under the
+        written names and under the names they are read with
+        :param data: the data, a dictionary of signal to series or a dataframe with a column per signal
+        :param prefix: the prefix of the signal names, if any
+        :return:-
+        """
+        names = get_signal_names(data, prefix)
+        self.invalidate(names + [to_read_name(name) for name in names])
+
+    @synchronized_with_attr("_lock")
+    def clear(self):
+        """
+        Removes all signals from the cache
+        :return:-
+        """
+        self._signals.clear()
+
+    def get_settled_time(self, reference):
+        """
+        Gets the time up to which data is considered to be complete
+        :param reference: a timestamp that determines whether the result should be timezone aware
+        :return: the timestamp
+        """
+        now = pd.Timestamp.now(tz="UTC")
+        now = now.tz_convert(reference.tz) if reference.tz else now.tz_localize(None)
+        return now - self.settle_time
+
+    @property
+    def nbytes(self):
+        return sum(cached.nbytes for cached in self._signals.values())
+
+    def __get_or_create(self, signal, user):
+        key = (signal, user)
+        if key not in self._signals:
+            self._signals[key] = CachedSignal()
+        return self._signals[key]
+
+    def __evict(self):
+        """
+        Evicts the least recently used signals until the cache fits in max_bytes
+        :return:-
+        """
+        nbytes = self.nbytes
+        while nbytes > self.max_bytes and len(self._signals) > 1:
+            key, cached = self._signals.popitem(last=False)
+            nbytes -= cached.nbytes
+            if self.logger:
+                self.logger.debug("Signal cache: evicted " + key[0])
+
+
+def get_signal_names(data, prefix=None):
+    """
+    Gets the names of the signals in data, as they are written by shared.save_to_db
+    :param data: a dictionary of signal to series or a dataframe with a column per signal
+    :param prefix: the prefix of the signal names, if any
+    :return: list of signal names
+    """
+    if data is None:
+        return []
+    names = list(data.columns) if hasattr(data, "columns") else list(data.keys())
+    return [prefix + "." + name for name in names] if prefix else names
+
+
+def to_read_name(name):
+    """
+    Converts the name of a signal as it is written by shared.save_to_db, with escaped tags like {{module:1A}},
+    to the name the signal is read with, e.g. {module=1A}
+    :param name: the written name
+    :return: the read name
+    """
+    return WRITTEN_TAG_REGEX.sub(lambda match: "{" + match.group(1).replace(":", "=") + "}", name)
@@ -0,0 +1,81 @@
+import itertools
+import re
+from string import Formatter
+import pandas as pd
+
+""" Structured signal name patterns, e.g. the raw reflected power signal of every DLPA, generator, module and side of a
+machine. A pattern is a format string with named fields and the values that each field can take. The signal names
+of a pattern are expanded once, and signal names can be parsed back into the values of their fields.
+"""
+
+
+class SignalPattern:
+    """
+    Class that represents a signal name pattern, e.g.
+    SignalPattern("s{source}.DLPA{dlpa}_RFGEN{gen}", [("dlpa", range(0, 4)), ("gen", range(1, 3))])
+    """
+
+    def __init__(self, template, fields):
+        """
+        Constructor
+        :param template: format string with named fields, literal braces are doubled
+        :param fields: list of (field, values) tuples of the fields that are expanded, in the order of expansion.
+               Fields of the template that aren't in the list must be given when the names are expanded
+        """
+        self.template = template
+        self.fields = [(field, [str(value) for value in values]) for field, values in fields]
+        self._names = {}
+        self._regex = None
+
+    def names(self, **values):
+        """
+        Expands the pattern into signal names. The expansion is kept, so that it is done once per set of values
+        :param values: the values of the fields that aren't expanded, e.g. source="62442"
+        :return: list of signal names
+        """
+        key = tuple(sorted(values.items()))
+        if key not in self._names:
+            fields = [field for field, _ in self.fields]
+            self._names[key] = [self.template.format(**dict(values, **dict(zip(fields, combination))))
+                                for combination in itertools.product(*[v for _, v in self.fields])]
+        return self._names[key]
+
+    def regex(self):
+        """
+        Converts the pattern into a regular expression with a named group per field, which is used to parse signal
+        names. Expanded fields match any of their values, the other fields match any value
+        :return: the compiled regular expression, matching complete signal names
+        """
+        if self._regex is None:
+            expanded = dict(self.fields)
+            parts = []
+            for literal, field, _, _ in Formatter().parse(self.template):
+                parts.append(re.escape(literal))
+                if field is None:
+                    continue
+                if field in expanded:
+                    parts.append("(?P<{0}>{1})".format(field, "|".join(re.escape(v) for v in expanded[field])))
+                else:
+                    parts.append("(?P<{0}>.+?)".format(field))
+            self._regex = re.compile("^" + "".join(parts) + "$")
+        return self._regex
+
+    def parse(self, name):
+        """
+        Parses a signal name into the values of the fields
+        :param name: the signal name
+        :return: dictionary of field to value, None if the name doesn't match the pattern
+        """
+        match = self.regex().match(name)
+        return match.groupdict() if match else None
+
+    def parse_columns(self, columns):
+        """
+        Parses the column names of a dataframe, e.g. the result of a query
+        :param columns: the column names
+        :return: dataframe with a row per matching column name and a column per field
+        """
+        parsed = [(column, self.parse(column)) for column in columns]
+        parsed = [(column, fields) for column, fields in parsed if fields is not None]
+        return pd.DataFrame([fields for _, fields in parsed], index=[column for column, _ in parsed],
+                            columns=[field for _, field, _, _ in Formatter().parse(self.template) if field])
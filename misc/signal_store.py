@@ -0,0 +1,228 @@
+import os
+import shutil
+import tempfile
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+
+""" Local on-disk store of signals, partitioned by signal and by day. Every day of a signal is stored as two NumPy
+files (the timestamps in ns since the epoch and the values), which are memory mapped when they are read. Only days
+that are complete are stored; the rest of a requested time range is fetched from the database.
+"""
+
+TIMES_FILE = "{0}.times.npy"
+VALUES_FILE = "{0}.values.npy"
+DAY_FORMAT = "%Y-%m-%d"
+DEFAULT_SETTLE_TIME = pd.Timedelta(hours=1)
+# Days that were stored shortly after they ended are fetched again, to pick up data that arrived late
+DEFAULT_REVALIDATE_TIME = pd.Timedelta(days=1)
+ONE_DAY = pd.Timedelta(days=1)
+
+
+class SignalStore:
+    """
+    Class that represents the on-disk store. It sits in front of a fetch function with the signature of
+    shared.get_signals, and has the same signature itself, so that it can be used as the fetch function of a
+    SignalCache. A day is stored once it ended at least settle_time ago; days without data are stored as
+    well, so that they are not fetched again. A day that was stored less than revalidate_time after it ended is
+    fetched (and stored) again by the next request, until it has been stored after revalidate_time
+    """
+
+    def __init__(self, directory, fetch, settle_time=DEFAULT_SETTLE_TIME, logger=None,
+                 revalidate_time=DEFAULT_REVALIDATE_TIME):
+        """
+        Constructor
+        :param directory: the directory of the store
+        :param fetch: the function that fetches signals from the database, e.g. shared.get_signals
+        :param settle_time: the time after the end of a day after which the data of the day is considered complete
+        :param logger: the logger object
+        :param revalidate_time: the time after the end of a day after which a stored day is final
+        """
+        self.directory = directory
+        self.fetch = fetch
+        self.settle_time = settle_time
+        self.revalidate_time = revalidate_time
+        self.logger = logger
+
+    def get_signals(self, signals, user, from_time=None, to_time=None):
+        """
+        Gets the signals for the time range. Stored days are read from disk, days that are complete but not stored
+        yet are fetched per day and stored, the remaining (recent) part is fetched from the database
+        :param signals: a signal or a list of signals
+        :param user: the user to access the database
+        :param from_time: start of the time range (inclusive)
+        :param to_time: end of the time range (inclusive)
+        :return: dataframe with one column per signal that has data in the time range
+        """
+
+        if from_time is None or to_time is None:
+            return self.fetch(signals, user, from_time=from_time, to_time=to_time)
+        signals = [signals] if isinstance(signals, str) else list(signals)
+        from_time, to_time = pd.Timestamp(from_time), pd.Timestamp(to_time)
+
+        settled_day = self.get_settled_day(to_time)
+        days = list(pd.date_range(from_time.floor("D"), min(to_time.floor("D"), settled_day - ONE_DAY), freq="D"))
+        self.store_missing_days(signals, user, days)
+
+        recent_df = pd.DataFrame()
+        if to_time >= settled_day:
+            recent_df = self.fetch(signals, user, from_time=max(from_time, settled_day), to_time=to_time)
+
+        columns = []
+        for signal in signals:
+            series = self.read(signal, days, from_time.tz)
+            if signal in recent_df.columns:
+                recent = recent_df[signal].dropna()
+                series = pd.concat([series, recent]) if not series.empty else recent
+            if not series.empty:
+                series = series.loc[from_time:to_time]
+            if not series.empty:
+                columns.append(series.rename(signal))
+        return pd.concat(columns, axis=1) if columns else pd.DataFrame()
+
+    def store_missing_days(self, signals, user, days):
+        """
+        Fetches and stores the days that are not stored yet, or not final. Signals that miss the same days are
+        fetched together, in one request per run of consecutive missing days
+        :param signals: the signals
+        :param user: the user to access the database
+        :param days: the (complete) days that are requested
+        :return:-
+        """
+        missing = {}
+        for signal in signals:
+            missing_days = tuple(day for day in days if not self.is_final(signal, day))
+            if missing_days:
+                missing.setdefault(missing_days, []).append(signal)
+        for missing_days, missing_signals in missing.items():
+            for start, stop in to_ranges(missing_days):
+                df = self.fetch(missing_signals, user, from_time=start, to_time=stop)
+                for signal in missing_signals:
+                    series = df[signal].dropna() if signal in df.columns else None
+                    for day in pd.date_range(start, stop - ONE_DAY, freq="D"):
+                        self.write(signal, day, series[(series.index >= day) & (series.index < day + ONE_DAY)]
+                                   if series is not None else None)
+
+    def read(self, signal, days, tz):
+        """
+        Reads the stored days of a signal
+        :param signal: the signal
+        :param days: the days
+        :param tz: the time zone of the index, None for a naive index in UTC
+        :return: the series
+        """
+        times, values = [], []
+        for day in days:
+            if self.is_stored(signal, day):
+                times.append(np.load(self.get_file(signal, day, TIMES_FILE), mmap_mode="r"))
+                values.append(np.load(self.get_file(signal, day, VALUES_FILE), mmap_mode="r"))
+        times = [t for t in times if len(t)]
+        values = [v for v in values if len(v)]
+        if not times:
+            return pd.Series(dtype="float64")
+        index = pd.DatetimeIndex(np.concatenate(times).view("datetime64[ns]"))
+        index = index.tz_localize("UTC").tz_convert(tz) if tz else index
+        return pd.Series(np.concatenate(values), index=index)
+
+    def write(self, signal, day, series):
+        """
+        Stores the data of a signal for a day. The values are written before the timestamps, as the presence of the
+        timestamps file marks the day as stored. Both files are replaced atomically
+        :param signal: the signal
+        :param day: the day
+        :param series: the data of the day, None if there is no data
+        :return:-
+        """
+        if series is None or series.empty:
+            values, times = np.empty(0, dtype="float64"), np.empty(0, dtype="int64")
+        else:
+            values = np.asarray(series.values)
+            if values.dtype.kind not in "biuf":
+                self.log("Signal store: {0} is not numeric, {1} is not stored".format(
+                    signal, day.strftime(DAY_FORMAT)))
+                return
+            index = series.index
+            if index.tz is not None:
+                index = index.tz_convert("UTC").tz_localize(None)
+            times = index.values.astype("datetime64[ns]").view("int64")
+        path = os.path.dirname(self.get_file(signal, day, TIMES_FILE))
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.__save(self.get_file(signal, day, VALUES_FILE), values)
+        self.__save(self.get_file(signal, day, TIMES_FILE), times)
+
+    def is_stored(self, signal, day):
+        return os.path.exists(self.get_file(signal, day, TIMES_FILE))
+
+    def is_final(self, signal, day):
+        """
+        Checks whether a day of a signal has been stored after revalidate_time, so that late data is included
+        :param signal: the signal
+        :param day: the day
+        :return: True if the stored day is final, False if it should be fetched (again)
+        """
+        try:
+            stored = os.path.getmtime(self.get_file(signal, day, TIMES_FILE))
+        except OSError:
+            return False
+        return stored >= (day + ONE_DAY + self.revalidate_time).timestamp()
+
+    def invalidate(self, signals):
+        """
+        Removes signals from the store, e.g. because they have been (re)written
+        :param signals: the names of the signals
+        :return:-
+        """
+        for signal in signals:
+            shutil.rmtree(os.path.join(self.directory, quote(signal, safe="")), ignore_errors=True)
+
+    def get_settled_day(self, reference):
+        """
+        Gets the first day that is not complete yet
+        :param reference: a timestamp that determines whether the result should be timezone aware
+        :return: the timestamp of the start of the day
+        """
+        now = pd.Timestamp.now(tz="UTC")
+        now = now.tz_convert(reference.tz) if reference.tz else now.tz_localize(None)
+        return (now - self.settle_time).floor("D")
+
+    def get_file(self, signal, day, file_format):
+        """
+        Gets the path of a file of a day of a signal: <directory>/<quoted signal>/<month>/<day>.<times|values>.npy
+        :param signal: the signal
+        :param day: the day
+        :param file_format: TIMES_FILE or VALUES_FILE
+        :return: the path
+        """
+        return os.path.join(self.directory, quote(signal, safe=""), day.strftime("%Y-%m"),
+                            file_format.format(day.strftime(DAY_FORMAT)))
+
+    def log(self, message):
+        if self.logger:
+            self.logger.warning(message)
+
+    @staticmethod
+    def __save(path, array):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+
+def to_ranges(days):
+    """
+    Combines consecutive days into ranges
+    :param days: the days, sorted
+    :return: list of (start, stop) tuples, stop is the day after the last day of the range
+    """
+    ranges = []
+    for day in days:
+        if ranges and ranges[-1][1] == day:
+            ranges[-1] = (ranges[-1][0], day + ONE_DAY)
+        else:
+            ranges.append((day, day + ONE_DAY))
+    return ranges
@@ -1,9 +1,13 @@
 import threading
 import types
+from contextlib import contextmanager
 
 """ Set of functions that implement synchronized access to shared resources. This class was based on the 
 implementation in the following link: http://theorangeduck.com/page/synchronized-python. Some changes were
 made to remove PEP-violations 
+
+For read-mostly state (e.g. configuration that is reloaded now and then), a ReadWriteLock allows readers to run
+concurrently, and the atomic_snapshot decorator allows readers to access the state without any locking at all.
 """
 
 
@@ -36,7 +40,7 @@ def syncronized_with(lock):
 
             def func(*args, **kws):
                 with lock:
-                    obj(*args, **kws)
+                    return obj(*args, **kws)
 
             return func
 
@@ -73,3 +77,137 @@ def synchronized(item):
         new_lock = threading.Lock()
         decorator = syncronized_with(new_lock)
         return decorator(item)
+
+
+class ReadWriteLock:
+    """
+    Lock that can be held by multiple readers at the same time, or by one writer. Writers are preferred: as soon as
+    a writer is waiting, new readers wait until the writer is done, so that a reload is not starved by readers
+    """
+
+    def __init__(self):
+        """
+        Default constructor
+        """
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        """
+        Context manager that holds the lock as a reader
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        """
+        Context manager that holds the lock as the writer
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+def synchronized_read_with_attr(lock_name):
+    """
+    Method that holds the ReadWriteLock in the lock_name attribute as a reader, while the method is executed
+    :param lock_name: the name of the attribute that contains the ReadWriteLock
+    :return: the decorator function
+    """
+    def decorator(method):
+        def synced_method(self, *args, **kws):
+            with getattr(self, lock_name).read_locked():
+                return method(self, *args, **kws)
+
+        return synced_method
+
+    return decorator
+
+
+def synchronized_write_with_attr(lock_name):
+    """
+    Method that holds the ReadWriteLock in the lock_name attribute as the writer, while the method is executed
+    :param lock_name: the name of the attribute that contains the ReadWriteLock
+    :return: the decorator function
+    """
+    def decorator(method):
+        def synced_method(self, *args, **kws):
+            with getattr(self, lock_name).write_locked():
+                return method(self, *args, **kws)
+
+        return synced_method
+
+    return decorator
+
+
+def atomic_snapshot(snapshot_name):
+    """
+    Copy-on-write decorator for methods that (re)build read-mostly state. The decorated method builds the new
+    state and returns it. The state is frozen (dictionaries become read-only mappings, lists become tuples) and
+    assigned to the snapshot_name attribute in one step. Readers grab the attribute once (e.g.
+    `snapshot = self._snapshot`) and use that immutable snapshot without any locking; a reload never changes a
+    snapshot that is in use, it swaps in a new one. Concurrent reloads are serialized
+    :param snapshot_name: the name of the attribute that holds the snapshot
+    :return: the decorator function
+    """
+    def decorator(method):
+        lock = threading.Lock()
+
+        def snapshot_method(self, *args, **kws):
+            with lock:
+                snapshot = freeze(method(self, *args, **kws))
+                setattr(self, snapshot_name, snapshot)
+                return snapshot
+
+        return snapshot_method
+
+    return decorator
+
+
+def freeze(obj):
+    """
+    Makes an immutable copy of (nested) dictionaries, lists and named tuples
+    :param obj: the object to freeze
+    :return: the frozen object
+    """
+    if isinstance(obj, (dict, types.MappingProxyType)):
+        return types.MappingProxyType({key: freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze(value) for value in obj)
+    if isinstance(obj, tuple) and hasattr(obj, "_fields"):
+        return type(obj)(*(freeze(value) for value in obj))
+    return obj
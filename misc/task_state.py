@@ -0,0 +1,84 @@
+import os
+import pickle
+import tempfile
+
+""" State of a task that is kept between runs, e.g. the last processed timestamps of an incremental calculation. The
+state is pickled to a file, that is replaced atomically when the state is saved. A missing or unreadable file
+results in an empty state, so that the task falls back to a full calculation.
+"""
+
+
+class TaskState:
+    """
+    Class that represents the state of a task, as a dictionary of key (e.g. machine and collector) to a dictionary
+    with the state of that key
+    """
+
+    def __init__(self, path, logger=None):
+        """
+        Constructor, which loads the persisted state
+        :param path: the path of the state file
+        :param logger: the logger object
+        """
+        self.path = path
+        self.logger = logger
+        self._state = self.load()
+
+    def load(self):
+        """
+        Loads the persisted state
+        :return: the state, or an empty dictionary if there is no (readable) state
+        """
+        try:
+            with open(self.path, "rb") as f:
+                return pickle.load(f)
+        except (IOError, OSError):
+            return {}
+        except Exception as e:
+            if self.logger:
+                self.logger.warning("Task state {0} can't be read, starting without state: {1}".format(
+                    self.path, str(e)))
+            return {}
+
+    def get(self, key):
+        """
+        Gets a copy of the state of a key, so that changes only take effect when they are set
+        :param key: the key
+        :return: dictionary with the state of the key
+        """
+        return dict(self._state.get(key, {}))
+
+    def set(self, key, value):
+        """
+        Sets the state of a key. The change becomes persistent after calling save()
+        :param key: the key
+        :param value: dictionary with the state of the key
+        :return:-
+        """
+        self._state[key] = value
+
+    def reset(self, key=None):
+        """
+        Removes the state of a key, or the state of all keys
+        :param key: the key, None for all keys
+        :return:-
+        """
+        if key is None:
+            self._state.clear()
+        else:
+            self._state.pop(key, None)
+
+    def save(self):
+        """
+        Persists the state, by writing a temporary file that replaces the state file atomically
+        :return:-
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(self._state, f, protocol=2)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
@@ -0,0 +1,201 @@
+import time
+from collections import OrderedDict
+import pandas as pd
+
+""" Buffer in front of shared.save_to_db. Every save_to_db call is a separate request to the time series database,
+so writes are collected and coalesced per prefix and write options, and written in a few large requests.
+"""
+
+DEFAULT_MAX_POINTS = 100000
+
+
+class WriteBuffer:
+    """
+    Class that represents the write buffer. It is used as a context manager: the buffered data is written when the
+    context is exited, or earlier when the number of buffered points reaches max_points. Code that reads back
+    signals that have been written through the buffer should call flush() first.
+
+    With an AsyncWriter, the writes are done in the background: only flush() waits until the data has been written,
+    the other flushes return as soon as the data has been queued. join() should be called at the end of the task
+    """
+
+    def __init__(self, save, max_points=DEFAULT_MAX_POINTS, logger=None, on_write=None, rollup=None, writer=None,
+                 check_age=None):
+        """
+        Constructor
+        :param save: the function that writes the data, with the signature of shared.save_to_db
+        :param max_points: the number of buffered points at which the buffer is flushed
+        :param logger: the logger object
+        :param on_write: (optional) function that is called with (data, prefix) after data has been written, e.g.
+               SignalCache.invalidate_data
+        :param rollup: (optional) the HourlyRollup that rolls up the written data
+        :param writer: (optional) the AsyncWriter that writes the data in the background. The callbacks, on_write
+               and the rollup are executed by the writer as well, once the data has been written
+        :param check_age: (optional) function that checks the age of the data before it is written, with the
+               signature of RetentionPolicyConfig.check_frame_data_age
+        """
+        self.save = save
+        self.max_points = max_points
+        self.logger = logger
+        self.on_write = on_write
+        self.rollup = rollup
+        self.writer = writer
+        self.check_age = check_age
+        self._batches = OrderedDict()
+        self._callbacks = []
+        self.points = 0
+        self.reset_statistics()
+
+    def __enter__(self):
+        self.reset_statistics()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush(wait=False)
+        self.log_statistics()
+        return False
+
+    def save_to_db(self, data, prefix=None, callback=None, **kwargs):
+        """
+        Buffers data that should be written by shared.save_to_db(data, prefix, **kwargs)
+        :param data: a dictionary of signal to series or a dataframe with a column per signal. Signals with None
+               as data are skipped
+        :param prefix: the prefix of the signal names, if any
+        :param callback: (optional) function without arguments that is called once the data has been written
+        :param kwargs: the keyword arguments of shared.save_to_db, e.g. existing_data_option and job_name
+        :return:-
+        """
+        batch = self._batches.setdefault((prefix, tuple(sorted(kwargs.items()))), OrderedDict())
+        for signal, series in data.items():
+            if series is None or len(series) == 0:
+                continue
+            batch.setdefault(signal, []).append(series)
+            self.points += len(series)
+        if callback:
+            self._callbacks.append(callback)
+        if self.points >= self.max_points:
+            self.flush(wait=False)
+
+    def flush(self, wait=True):
+        """
+        Writes the buffered data, one save_to_db call per prefix and write options, and calls the callbacks of the
+        written data
+        :param wait: whether to wait until the data has been written, only applies to a buffer with an AsyncWriter
+        :return:-
+        """
+        batches, callbacks, points = list(self._batches.items()), self._callbacks, self.points
+        self._batches, self._callbacks, self.points = OrderedDict(), [], 0
+        start = time.time()
+        for i, ((prefix, kwargs), batch) in enumerate(batches):
+            if not batch:
+                continue
+            data = OrderedDict((signal, self.coalesce(series_list)) for signal, series_list in batch.items())
+            if self.check_age:
+                self.check_age(get_database(prefix, data), None, dict(kwargs).get("job_name"), data)
+            if self.writer:
+                try:
+                    self.writer.submit(self.write, data, prefix, dict(kwargs))
+                except Exception:
+                    # The writer raises the error of an earlier write, the data that hasn't been queued is kept
+                    self.restore(batches[i:], callbacks)
+                    raise
+            else:
+                self.write(data, prefix, dict(kwargs))
+            self.writes += 1
+        self.written_points += points
+        self.write_time += time.time() - start
+        if self.writer:
+            if callbacks:
+                self.writer.submit(run_callbacks, callbacks)
+            if wait:
+                self.writer.flush()
+        else:
+            run_callbacks(callbacks)
+
+    def write(self, data, prefix, kwargs):
+        """
+        Writes data and rolls it up and calls on_write once it has been written
+        :param data: the data
+        :param prefix: the prefix of the signal names, if any
+        :param kwargs: the keyword arguments of shared.save_to_db
+        :return:-
+        """
+        self.save(data, prefix, **kwargs)
+        if self.rollup:
+            self.rollup.update(data, prefix)
+        if self.on_write:
+            self.on_write(data, prefix)
+
+    def restore(self, batches, callbacks):
+        """
+        Puts data that hasn't been written back in the buffer, in front of the data that has been buffered since
+        :param batches: list of ((prefix, kwargs), batch) items
+        :param callbacks: the callbacks of the data
+        :return:-
+        """
+        restored = OrderedDict(batches)
+        for key, batch in self._batches.items():
+            restored_batch = restored.setdefault(key, OrderedDict())
+            for signal, series_list in batch.items():
+                restored_batch.setdefault(signal, []).extend(series_list)
+        self._batches = restored
+        self._callbacks = callbacks + self._callbacks
+        self.points = sum(len(series) for batch in restored.values() for series_list in batch.values()
+                          for series in series_list)
+
+    def join(self):
+        """
+        Writes the buffered data and waits until it has been written, e.g. at the end of a task
+        :return:-
+        """
+        try:
+            self.flush()
+        finally:
+            if self.writer:
+                self.writer.join()
+                self.writer.log_statistics()
+                self.writer.reset_statistics()
+
+    def reset_statistics(self):
+        self.writes = 0
+        self.written_points = 0
+        self.write_time = 0.0
+
+    def log_statistics(self):
+        if self.logger and self.writes:
+            self.logger.info("Write buffer: {0} points in {1} writes, {2:.1f} s ({3:.0f} points/s)".format(
+                self.written_points, self.writes, self.write_time,
+                self.written_points / self.write_time if self.write_time > 0 else 0))
+
+    @staticmethod
+    def coalesce(series_list):
+        """
+        Combines the series that are buffered for a signal. For duplicate timestamps the last written value wins,
+        as it would with separate writes
+        :param series_list: the series
+        :return: the combined series
+        """
+        if len(series_list) == 1:
+            return series_list[0]
+        series = pd.concat(series_list)
+        return series[~series.index.duplicated(keep="last")].sort_index()
+
+
+def get_database(prefix, data):
+    """
+    Gets the database (source) of written data, the first part of the prefix or of the signal names
+    :param prefix: the prefix of the signal names, if any
+    :param data: the data
+    :return: the database, e.g. s1234
+    """
+    return (prefix or next(iter(data))).split(".")[0]
+
+
+def run_callbacks(callbacks):
+    """
+    Calls the callbacks of written data
+    :param callbacks: the callbacks, functions without arguments
+    :return:-
+    """
+    for callback in callbacks:
+        callback()
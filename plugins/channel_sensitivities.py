@@ -2,26 +2,48 @@ __author__ = "Martijn Heuzinkveld (MHFC), Ivo Willemsen (IWIO)"
 __date__ = "2018-06-06"
 
 import datetime
+import os
+import tempfile
 import pandas as pd
 import numpy as np
 import statsmodels.formula.api as sm
 import shared as sh
 from shared import Singleton
+from misc.signal_cache import SignalCache
+from misc.signal_store import SignalStore
+from misc.write_buffer import WriteBuffer
+from misc.task_state import TaskState
+from misc.rolling_ols import RollingOLS
+from misc.signal_pattern import SignalPattern
 
 USER = 'admin'
 LOGGER = sh.get_logger(sh.TASK_LOG)
+SIGNAL_CACHE = SignalCache(sh.get_signals, logger=LOGGER)
+WRITE_BUFFER = WriteBuffer(sh.save_to_db, logger=LOGGER, on_write=SIGNAL_CACHE.invalidate_data)
 
 AVG_SIGNAL_SUB_PATTERN = "_REFLECT_PWR_AVERAGE"
 RAW_SIGNAL_SUB_PATTERN = "_RFGEN"
-AVG_SIGNALS = ["DL_RF_SENSORS.DLPA{0}_REFLECT_PWR_AVERAGE".format(s) for s in range(0, 3)]
 ALL_AVG_SIGNAL = "DL_RF_SENSORS.DLPA0123" + AVG_SIGNAL_SUB_PATTERN
-RAW_SIGNAL_PATTERN = "DL_RF_SENSORS.DLPA{0}" + RAW_SIGNAL_SUB_PATTERN + "{1}_MODX_REFLECT_PWR{2}"
-SENSITIVITY_SIGNAL_PATTERN = "DL_RF_SENSORS.DLPA{0}" + RAW_SIGNAL_SUB_PATTERN + \
-                      "{1}_MODX_REFLECT_PWR_Sens{2}"
+MODULE_FIELDS = [("dlpa", range(0, 4)), ("gen", range(1, 3)), ("module", range(1, 9)), ("side", ["A", "B"])]
+RAW_SIGNAL_PATTERN = SignalPattern("s{source}.DL_RF_SENSORS.DLPA{dlpa}" + RAW_SIGNAL_SUB_PATTERN +
+                                   "{gen}_MODX_REFLECT_PWR{{module={module}{side}}}", MODULE_FIELDS)
+AVG_SIGNAL_PATTERN = SignalPattern("s{source}.DL_RF_SENSORS.DLPA{dlpa}" + AVG_SIGNAL_SUB_PATTERN,
+                                   [("dlpa", range(0, 3))])
+SENSITIVITY_SIGNAL_PATTERN = SignalPattern("s{source}.DL_RF_SENSORS.DLPA{dlpa}" + RAW_SIGNAL_SUB_PATTERN +
+                                           "{gen}_MODX_REFLECT_PWR_Sens{{module={module}{side}}}", MODULE_FIELDS)
 MODULE_LEVEL_NAME = "REFLECT_PWR"
+SANITY_THRESHOLD = 1
+SANITY_MIN_COUNT = 100
 UTC_TZ = 'UTC'
 TIMES_PER_DAY = 4
 EXTRA_SAFETY_DAYS_SENSITIVITY = 5
+# State of the incremental mode, per machine
+STATE_PATH = os.path.join(tempfile.gettempdir(), "channel_sensitivities.state")
+WATERMARK = "watermark"
+SENSITIVITIES = "sensitivities"
+# Windows that end within this margin before now may be based on data that has partly arrived, they are calculated
+# again by the next incremental run
+SETTLE_TIME = pd.Timedelta(hours=6)
 
 LINEAR_FIT = 1
 
@@ -178,36 +200,81 @@ class CachedSensitivityData:
         self._dt_safety_start = dt_safety_start_
 
 
-def calculate_channel_sensitivities(name, machines=None, days_back=5):
+def calculate_channel_sensitivities(name, machines=None, days_back=5, signal_store_dir=None, incremental=False,
+                                    recompute_from=None, recompute_to=None, state_path=STATE_PATH):
     """
     Calculates the channel sensitivities and variations
     :param machines: a list of machines
     :param days_back: the number of days back that should be crawled
+    :param signal_store_dir: the (optional) directory of a local signal store, so that historical days are read
+        from local disk instead of the database
+    :param incremental: if True, only the time windows after the last window of the previous (incremental) run are
+        calculated. The last window and the sensitivity history are kept per machine in state_path
+    :param recompute_from: (optional) recalculates the time windows from this time on, e.g. for backfills. The
+        incremental state of the machines is reset, also when incremental is False
+    :param recompute_to: the end of the time windows that are recalculated, by default now
+    :param state_path: the file with the state of the incremental mode, by default STATE_PATH. Deployments that
+        share a host should use their own file
     :return:-
     """
 
     if not machines:
         machines = sh.Config().get_machines()
 
+    dt_start = None
     dt_stop = calc_stop_time_at_day_interval(get_now(), TIMES_PER_DAY)
+    if recompute_from is not None:
+        dt_start = calc_stop_time_at_day_interval(pd.Timestamp(recompute_from), TIMES_PER_DAY) - pd.Timedelta(hours=24)
+        if recompute_to is not None:
+            dt_stop = calc_stop_time_at_day_interval(pd.Timestamp(recompute_to), TIMES_PER_DAY)
+    SIGNAL_CACHE.store = SignalStore(signal_store_dir, sh.get_signals, logger=LOGGER) if signal_store_dir else None
+    state = TaskState(state_path, logger=LOGGER) if incremental or recompute_from is not None else None
     CachedSensitivityData()
-    CachedSensitivityData().set_dt_safety_start(
-        dt_stop - pd.Timedelta(days=days_back + EXTRA_SAFETY_DAYS_SENSITIVITY))
 
-    for machine in machines:
-        calculate_machine_channel_sensitivities(days_back, machine, dt_stop)
-
-
-def calculate_machine_channel_sensitivities(days_back, machine, dt_stop):
+    with WRITE_BUFFER:
+        for machine in machines:
+            key = "s" + str(machine['source_nr'])
+            try:
+                if recompute_from is not None:
+                    # A recomputation resets the state, so that the next incremental run reads the recomputed
+                    # sensitivities from the database
+                    state.reset(key)
+                    state.save()
+                progress = state.get(key) if incremental and recompute_from is None else None
+                calculate_machine_channel_sensitivities(days_back, machine, dt_stop, dt_start=dt_start,
+                                                        progress=progress)
+                # The data of the machine is written here, so that a failed write is handled per machine. The state
+                # is only saved once the data has been written
+                WRITE_BUFFER.flush()
+                if progress is not None:
+                    state.set(key, progress)
+                    state.save()
+            except Exception as e:
+                LOGGER.error("Calculate Channel Sensitivities: error for machine {0}. {1}".format(key, str(e)))
+
+
+def calculate_machine_channel_sensitivities(days_back, machine, dt_stop, dt_start=None, progress=None):
     """
     Calculates channel sensitivities and variations for all days for a certain machine
     :param days_back: the number of days back that should be crawled
     :param machine: the machine
     :param dt_stop: stop datetime, closest 6 hour moment
+    :param dt_start: (optional) start datetime of the first window, by default days_back before dt_stop
+    :param progress: the state of the machine in incremental mode, None otherwise. It contains the stop of the last
+        settled window that has been calculated and the sensitivity history, so that only the newer windows are
+        calculated and the history isn't fetched again
     :return: -
     """
 
-    dt_start = dt_stop - pd.Timedelta(days=days_back)
+    dt_start = dt_start if dt_start is not None else dt_stop - pd.Timedelta(days=days_back)
+    dt_safety_start = dt_start - pd.Timedelta(days=EXTRA_SAFETY_DAYS_SENSITIVITY)
+    CachedSensitivityData().set_dt_safety_start(dt_safety_start)
+    history = progress.get(SENSITIVITIES) if progress else None
+    if history is not None and progress.get(WATERMARK) is not None:
+        dt_start = max(dt_start, progress[WATERMARK] - pd.Timedelta(hours=24 - 24 / TIMES_PER_DAY))
+        if dt_start > dt_stop - pd.Timedelta(hours=24):
+            LOGGER.info("Calculate Channel Sensitivities: s{0} is up to date".format(machine['source_nr']))
+            return
     df_raw_signals = get_signals(machine, RAW_SIGNAL_PATTERN, dt_start, dt_stop)
     df_avg_signals = get_averages_signals(machine, dt_start, dt_stop)
     df_avg_all_signals = get_all_averages_signal(machine, dt_start, dt_stop)
@@ -220,56 +287,159 @@ def calculate_machine_channel_sensitivities(days_back, machine, dt_stop):
     # Store the result in a singleton.
     CachedSensitivityData().reset_sensitivities()
     CachedSensitivityData().add_extra_safety_sensitivities(
-        get_signals(
-            machine, SENSITIVITY_SIGNAL_PATTERN,
-            dt_stop - pd.Timedelta(days=days_back + EXTRA_SAFETY_DAYS_SENSITIVITY), dt_stop))
+        history.loc[history.index >= dt_safety_start] if history is not None else
+        get_signals(machine, SENSITIVITY_SIGNAL_PATTERN, dt_safety_start, dt_stop))
+    # The window positions and the columns of the DLPA's are determined once, the windows are positional slices
+    df_raw_signals, raw_columns = group_dlpa_columns(df_raw_signals.sort_index(), RAW_SIGNAL_PATTERN)
+    df_avg_signals, avg_columns = group_dlpa_columns(df_avg_signals.sort_index(), AVG_SIGNAL_PATTERN)
+    df_avg_all_signals = df_avg_all_signals.sort_index()
+    window_starts = pd.date_range(start=dt_start, end=dt_stop - pd.Timedelta(hours=24), freq="6H")
+    window_stops = window_starts + pd.Timedelta(hours=24)
+    raw_bounds = get_window_bounds(df_raw_signals, window_starts, window_stops)
+    avg_bounds = get_window_bounds(df_avg_signals, window_starts, window_stops)
+    avg_all_bounds = get_window_bounds(df_avg_all_signals, window_starts, window_stops)
+    sanity_masks = get_sanity_masks(df_raw_signals, raw_bounds)
+    regressions = create_regressions(df_raw_signals, df_avg_signals, df_avg_all_signals, raw_columns, avg_columns)
     df_final_results = pd.DataFrame()
-    for dt_start in pd.date_range(start=dt_start,
-                                  end=dt_stop - pd.Timedelta(hours=24),
-                                  freq="6H"):
-        dt_stop = dt_start + pd.Timedelta(hours=24)
+    dt_settled = get_now() - SETTLE_TIME
+    watermark = None
+    for i, dt_window_stop in enumerate(window_stops):
+        if not sanity_masks[i].any():
+            continue
+        if dt_window_stop <= dt_settled:
+            watermark = dt_window_stop
         df_final_results = process_time_window(
-            df_final_results=df_final_results, df_avg_all_signals=df_avg_all_signals,
-            df_avg_signals=df_avg_signals, df_raw_signals=df_raw_signals,
-            dt_start=dt_start, dt_stop=dt_stop)
+            df_final_results=df_final_results, df_avg_all_signals=df_avg_all_signals.iloc[avg_all_bounds[i]],
+            df_avg_signals=df_avg_signals.iloc[avg_bounds[i]], df_raw_signals=df_raw_signals.iloc[raw_bounds[i]],
+            dt_stop=dt_window_stop, raw_columns=raw_columns, avg_columns=avg_columns,
+            regressions=regressions, window=raw_bounds[i], sanity_mask=sanity_masks[i])
 
-    sh.save_to_db(df_final_results, None)
+    WRITE_BUFFER.save_to_db(df_final_results, None)
+    if progress is not None and watermark is not None:
+        # The windows after the last settled window that has been produced are calculated again by the next run,
+        # the sensitivities of these windows are added to the history again
+        sensitivities = CachedSensitivityData().df_sensitivities
+        progress[WATERMARK] = watermark
+        progress[SENSITIVITIES] = sensitivities.loc[sensitivities.index <= watermark] if not sensitivities.empty \
+            else sensitivities
 
 
 def process_time_window(df_final_results, df_avg_all_signals, df_avg_signals, df_raw_signals,
-                        dt_start, dt_stop):
+                        dt_stop, raw_columns, avg_columns, regressions=None, window=None, sanity_mask=None):
     """
     Calculates sensitivities and variations for one machine for one day
     :param df_final_results: the dataframe that will contain final results
-    :param df_avg_all_signals: dataframe that contains the overall averages
-    :param df_avg_signals: dataframe that contains the averages per DLPA
-    :param df_raw_signals: dataframe that contains the raw signals
-    :param dt_start: start date
+    :param df_avg_all_signals: dataframe that contains the overall averages of the day
+    :param df_avg_signals: dataframe that contains the averages per DLPA of the day
+    :param df_raw_signals: dataframe that contains the raw signals of the day
     :param dt_stop: end date
+    :param raw_columns: the column slice of each DLPA in df_raw_signals
+    :param avg_columns: the column slice of each DLPA in df_avg_signals
+    :param regressions: (optional) the rolling regressions of the modules, see create_regressions
+    :param window: the row slice of the day in the raw signals of the machine, used by the rolling regressions
+    :param sanity_mask: (optional) boolean array with the raw signals that pass the sanity check, see
+           get_sanity_masks. Without it, the sanity check is done per module
     :return: df_final_results
     """
 
-    df_day_avg_all_signals = df_avg_all_signals[dt_start:dt_stop]
-    df_day_avg_signals = df_avg_signals[dt_start:dt_stop]
-    df_day_raw_signals = df_raw_signals[dt_start:dt_stop]
-
-    if df_day_raw_signals.empty:
+    if df_raw_signals.empty:
         return df_final_results
 
     for dlpa in range(0, 4):
-        df_dlpa_avg_signals = \
-            df_day_avg_signals.filter(regex="DLPA" + str(dlpa) + AVG_SIGNAL_SUB_PATTERN)
-        df_dlpa_raw_signals = \
-            df_day_raw_signals.filter(regex="DLPA" + str(dlpa) + RAW_SIGNAL_SUB_PATTERN)
+        modules = None
+        if sanity_mask is not None:
+            modules = df_raw_signals.columns[raw_columns[dlpa]][sanity_mask[raw_columns[dlpa]]]
+            if modules.empty:
+                continue
         df_final_results = process_dlpa(
-            df_final_results=df_final_results, df_avg_all_signals=df_day_avg_all_signals,
-            df_avg_signals=df_dlpa_avg_signals, df_raw_signals=df_dlpa_raw_signals,
-            datapoint_dt=dt_stop)
+            df_final_results=df_final_results, df_avg_all_signals=df_avg_all_signals,
+            df_avg_signals=df_avg_signals.iloc[:, avg_columns[dlpa]],
+            df_raw_signals=df_raw_signals.iloc[:, raw_columns[dlpa]],
+            datapoint_dt=dt_stop, regressions=regressions, window=window, modules=modules)
     return df_final_results
 
 
+def group_dlpa_columns(df, pattern):
+    """
+    Orders the columns of a dataframe per DLPA, so that the columns of a DLPA can be selected with a slice.
+    Columns that don't match the pattern are left out
+    :param df: the dataframe
+    :param pattern: the SignalPattern of the columns, with a dlpa field
+    :return: the ordered dataframe and a list with the column slice of each DLPA
+    """
+
+    dlpas = pattern.parse_columns(df.columns)["dlpa"]
+    columns = []
+    slices = []
+    for dlpa in range(0, 4):
+        dlpa_columns = list(dlpas.index[dlpas.values == str(dlpa)])
+        slices.append(slice(len(columns), len(columns) + len(dlpa_columns)))
+        columns.extend(dlpa_columns)
+    return df[columns], slices
+
+
+def create_regressions(df_raw_signals, df_avg_signals, df_avg_all_signals, raw_columns, avg_columns):
+    """
+    Creates the rolling regressions of each module, of the raw signal on the averages of its DLPA and on the overall
+    average. The regressions are updated from window to window, instead of refitting each window. Modules of a DLPA
+    without averages are left out, these are fitted with statsmodels
+    :param df_raw_signals: dataframe that contains the raw signals of the machine
+    :param df_avg_signals: dataframe that contains the averages per DLPA of the machine
+    :param df_avg_all_signals: dataframe that contains the overall averages of the machine
+    :param raw_columns: the column slice of each DLPA in df_raw_signals
+    :param avg_columns: the column slice of each DLPA in df_avg_signals
+    :return: dictionary of module to a tuple of the rolling regressions on the DLPA and on the overall averages
+    """
+
+    regressions = {}
+    if df_raw_signals.empty or df_avg_all_signals.empty:
+        return regressions
+    x_avg_all = df_avg_all_signals.reindex(df_raw_signals.index).values
+    for dlpa in range(0, 4):
+        x_avg = df_avg_signals.iloc[:, avg_columns[dlpa]].reindex(df_raw_signals.index).values
+        if x_avg.shape[1] == 0:
+            continue
+        for module in df_raw_signals.columns[raw_columns[dlpa]]:
+            regressions[module] = (RollingOLS(df_raw_signals[module], x_avg),
+                                   RollingOLS(df_raw_signals[module], x_avg_all))
+    return regressions
+
+
+def get_sanity_masks(df_raw_signals, raw_bounds):
+    """
+    Determines for all time windows at once which raw signals pass the sanity check, i.e. have at least
+    SANITY_MIN_COUNT values above SANITY_THRESHOLD in the window. The counts follow from the cumulative sum of the
+    values above the threshold
+    :param df_raw_signals: dataframe that contains the raw signals of the machine, with a sorted index
+    :param raw_bounds: the row slice of each time window
+    :return: 2-dimensional boolean array, with a row per window and a column per raw signal
+    """
+
+    above = np.zeros((len(df_raw_signals) + 1, len(df_raw_signals.columns)), dtype=np.int64)
+    np.cumsum(df_raw_signals.values > SANITY_THRESHOLD, axis=0, out=above[1:])
+    starts = np.array([bounds.start for bounds in raw_bounds], dtype=np.int64)
+    stops = np.array([bounds.stop for bounds in raw_bounds], dtype=np.int64)
+    return (above[stops] - above[starts]) >= SANITY_MIN_COUNT
+
+
+def get_window_bounds(df, window_starts, window_stops):
+    """
+    Determines the rows of each time window, including the start and stop time
+    :param df: the dataframe, with a sorted index
+    :param window_starts: the start times of the windows
+    :param window_stops: the stop times of the windows
+    :return: list with the row slice of each window
+    """
+
+    if df.empty:
+        return [slice(0, 0)] * len(window_starts)
+    starts = df.index.searchsorted(window_starts, side="left")
+    stops = df.index.searchsorted(window_stops, side="right")
+    return [slice(start, stop) for start, stop in zip(starts, stops)]
+
+
 def process_dlpa(df_final_results, df_avg_all_signals, df_avg_signals, df_raw_signals,
-                 datapoint_dt):
+                 datapoint_dt, regressions=None, window=None, modules=None):
     """
     Does the processing for a certain DLPA
     :param df_final_results: the dataframe that will contain final results
@@ -277,19 +447,23 @@ def process_dlpa(df_final_results, df_avg_all_signals, df_avg_signals, df_raw_si
     :param df_avg_signals: dataframe that contains the averages per DLPA
     :param df_raw_signals: dataframe that contains the raw signals
     :param datapoint_dt: datetime of the datapoint to be generated
+    :param regressions: (optional) the rolling regressions of the modules, see create_regressions
+    :param window: the row slice of the day in the raw signals of the machine, used by the rolling regressions
+    :param modules: (optional) the modules that passed the sanity check, None to check all modules
     :return: df_final_results
     """
 
-    for module in df_raw_signals:
+    for module in df_raw_signals if modules is None else modules:
         df_final_results = process_module(
             df_final_results=df_final_results, df_avg_all_signals=df_avg_all_signals,
             df_avg_signals=df_avg_signals, df_raw_signals=df_raw_signals,
-            module=module, datapoint_dt=datapoint_dt)
+            module=module, datapoint_dt=datapoint_dt, regressions=regressions, window=window,
+            sanity_checked=modules is not None)
     return df_final_results
 
 
 def process_module(df_final_results, df_avg_all_signals, df_avg_signals, df_raw_signals,
-                   module, datapoint_dt):
+                   module, datapoint_dt, regressions=None, window=None, sanity_checked=False):
     """
     Fits the data
     :param df_final_results: the dataframe that will contain final results
@@ -298,27 +472,38 @@ def process_module(df_final_results, df_avg_all_signals, df_avg_signals, df_raw_
     :param df_raw_signals: dataframe that contains the raw signals
     :param module: the module
     :param datapoint_dt: stop date
+    :param regressions: (optional) the rolling regressions of the modules, see create_regressions
+    :param window: the row slice of the day in the raw signals of the machine, used by the rolling regressions
+    :param sanity_checked: True if the module already passed the sanity check
     :return:
     """
 
-    sanity_check = sum(x > 1 for x in df_raw_signals[module])
-    if sanity_check < 100:
+    if not sanity_checked and (df_raw_signals[module].values > SANITY_THRESHOLD).sum() < SANITY_MIN_COUNT:
         return df_final_results
 
     # Perform the linear regression
-    model_single = sm.OLS(df_raw_signals[module], df_avg_signals, missing='drop').fit()
-    model_avg_all = sm.OLS(df_raw_signals[module], df_avg_all_signals, missing='drop').fit()
+    regression = regressions.get(module) if regressions else None
+    if regression is not None:
+        regression[0].move(window.start, window.stop)
+        regression[1].move(window.start, window.stop)
+        params_single, rsquared_single = regression[0].fit()
+        params_avg_all, rsquared_avg_all = regression[1].fit()
+    else:
+        model_single = sm.OLS(df_raw_signals[module], df_avg_signals, missing='drop').fit()
+        model_avg_all = sm.OLS(df_raw_signals[module], df_avg_all_signals, missing='drop').fit()
+        params_single, rsquared_single = model_single.params, model_single.rsquared
+        params_avg_all, rsquared_avg_all = model_avg_all.params, model_avg_all.rsquared
     module = module.replace("{", "{{").replace("}", "}}").replace("=", ":")
 
     CachedSensitivityData().add_sensitivity_signal(
-        module=module, signal=model_single.params[-1], datapoint_dt=datapoint_dt)
+        module=module, signal=params_single[-1], datapoint_dt=datapoint_dt)
 
     df_final_results = df_final_results.append(
         pd.DataFrame(
-            [[model_single.params[-1],
-              model_avg_all.params[-1],
-              model_single.rsquared,
-              model_avg_all.rsquared,
+            [[params_single[-1],
+              params_avg_all[-1],
+              rsquared_single,
+              rsquared_avg_all,
               CachedSensitivityData().calculate_variation(datapoint_dt, module)]],
             index=[pd.Timestamp(datetime.datetime(
                 datapoint_dt.year, datapoint_dt.month, datapoint_dt.day, datapoint_dt.hour))
@@ -368,18 +553,14 @@ def get_signals(machine, pattern, dt_start, dt_stop):
     """
     Get raw signals from the database
     :param machine: the machine
-    :param pattern: the pattern that will be used to retrieve the signals
+    :param pattern: the SignalPattern of the signals, which is expanded once per machine
     :param dt_start: start date
     :param dt_stop: end date
     :return: dataframe with the results
     """
 
-    signals = ["s" + str(machine['source_nr']) + '.' +
-               r for r in [pattern
-                           .format(str(pa), str(gen), "{module=" + str(mod) + ab + "}")
-               for pa in range(0, 4) for gen in range(1, 3) for mod in range(1, 9)
-               for ab in ["A", "B"]]]
-    return sh.get_signals(signals, USER, from_time=dt_start, to_time=dt_stop)
+    return SIGNAL_CACHE.get_signals(pattern.names(source=machine['source_nr']), USER,
+                                    from_time=dt_start, to_time=dt_stop)
 
 
 def get_all_averages_signal(machine, dt_start, dt_stop):
@@ -391,8 +572,8 @@ def get_all_averages_signal(machine, dt_start, dt_stop):
     :return: dataframe with the results
     """
 
-    return sh.get_signals(["s" + str(machine['source_nr']) + '.' + ALL_AVG_SIGNAL], USER,
-                          from_time=dt_start, to_time=dt_stop)
+    return SIGNAL_CACHE.get_signals(["s" + str(machine['source_nr']) + '.' + ALL_AVG_SIGNAL], USER,
+                                    from_time=dt_start, to_time=dt_stop)
 
 
 def get_averages_signals(machine, dt_start, dt_stop):
@@ -404,9 +585,7 @@ def get_averages_signals(machine, dt_start, dt_stop):
     :return: dataframe with the results
     """
 
-    signals = ["s" + str(machine['source_nr']) + '.' +
-               a for a in AVG_SIGNALS]
-    return sh.get_signals(signals, USER, from_time=dt_start, to_time=dt_stop)
+    return get_signals(machine, AVG_SIGNAL_PATTERN, dt_start, dt_stop)
 
 
 def get_now():
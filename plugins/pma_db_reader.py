@@ -1,19 +1,36 @@
 from shared import Config, get_logger, TASK_LOG, get_redis_client, save_to_db
+from functools import partial
 import arrow
+import numpy as np
 import pandas as pd
 from dbclients.DbClientFactory import DbClientFactory
 from dbclients.DbClientConfig import DbClientConfig
 from datetime import datetime, timedelta
 import shared as sh
+from misc.write_buffer import WriteBuffer
+from misc.rollup import HourlyRollup, AGGREGATES, COUNT, LAST, ONE_HOUR
+from misc.async_writer import AsyncWriter
+from misc.backfill import plan_backfill, execute_plan
+from misc.retention_policy_config import RetentionPolicyConfig
 
 NAME = "name"
 MACHINE_NR = "machine_nr"
 SOURCE_NR = "source_nr"
+TIMEZONE = "timezone"
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 CHUNKSIZE = 10000
+# Catch-up runs (days_back) read large chunks in bulk with COPY
+COPY_CHUNKSIZE = 1000000
+# The number of PMA connections that read the slices of a backfill plan in parallel
+BACKFILL_WORKERS = 4
 LOGGER = get_logger(TASK_LOG)
 REDIS_CLIENT = get_redis_client()
+# Hourly rollups of the loaded signals, maintained as the data is written
+ROLLUP = HourlyRollup(logger=LOGGER)
+# The data is written in the background, while the next chunks are read from PMA
+WRITE_BUFFER = WriteBuffer(save_to_db, logger=LOGGER, rollup=ROLLUP, writer=AsyncWriter(logger=LOGGER))
 PMA_CONFIG_ID = "pma"
+INFLUX_CONFIG_ID = "influx"
 PMA_FLAG = "use_pma_new"
 PMA_QUERY = """
     SELECT
@@ -28,6 +45,35 @@ PMA_QUERY = """
     ORDER BY
           fact.SAMPLE_DT
     LIMIT %s"""
+PMA_RANGE_QUERY = """
+    SELECT
+        fact.SAMPLE_DT AS "Timestamp",
+        CAST(fact.VALUE AS FLOAT) AS "Value"
+    FROM
+          "PARAMETER_DIM" t, "PARAMETER_FACT" fact
+    WHERE
+          t.NAME = %s AND
+          fact.PARAMETER_DIM_ID = t.PARAMETER_DIM_ID AND
+          fact.EQUIPMENT_NR = %s AND fact.SAMPLE_DT >= PARSETIMESTAMP(%s, 'yyyy-MM-dd hh:mm:ss') AND
+          fact.SAMPLE_DT < PARSETIMESTAMP(%s, 'yyyy-MM-dd hh:mm:ss')
+    ORDER BY
+          fact.SAMPLE_DT
+    LIMIT %s"""
+PMA_DAILY_COUNT_QUERY = """
+    SELECT
+        CAST(fact.SAMPLE_DT AS DATE) AS "Day",
+        COUNT(fact.VALUE) AS "Count"
+    FROM
+          "PARAMETER_DIM" t, "PARAMETER_FACT" fact
+    WHERE
+          t.NAME = %s AND
+          fact.PARAMETER_DIM_ID = t.PARAMETER_DIM_ID AND
+          fact.EQUIPMENT_NR = %s AND fact.SAMPLE_DT >= PARSETIMESTAMP(%s, 'yyyy-MM-dd hh:mm:ss') AND
+          fact.SAMPLE_DT < PARSETIMESTAMP(%s, 'yyyy-MM-dd hh:mm:ss')
+    GROUP BY
+          CAST(fact.SAMPLE_DT AS DATE)"""
+# The PMA query is executed as a prepared statement, the server parses and plans it once per connection
+PMA_STATEMENT = "pma_signal_chunk"
 
 TODAY = datetime(datetime.utcnow().year, datetime.utcnow().month, datetime.utcnow().day, 0)
 
@@ -35,18 +81,20 @@ total_no_errors = 0
 total_time_spent = 0.0
 
 
-def task_pma_db_reader(name, machines=None, handler=None, days_back=None):
+def task_pma_db_reader(name, machines=None, handler=None, days_back=None, backfill_days=None):
     """
     Function that encapsulates the reading of pma new data.
     :param name: the name of the job
     :param machines: the list of machines that should be processed
     :param handler: the handler
-    :param days_back:
+    :param days_back: days_back that should be reloaded for all signals
+    :param backfill_days: (optional) the number of days in which gaps are detected and backfilled, before the new
+           data is read
     :return:
     """
 
-    LOGGER.info("Start: PMA DB reader, days_back = " + str(days_back))
-    db_client = DbClientFactory.get_client(DbClientConfig.get(PMA_CONFIG_ID), LOGGER)
+    LOGGER.info("Start: PMA DB reader, days_back = {0}, backfill_days = {1}".format(days_back, backfill_days))
+    db_client = create_db_client()
 
     signals, signal_type = get_signals_info(handler)
     if signals is None:
@@ -55,19 +103,76 @@ def task_pma_db_reader(name, machines=None, handler=None, days_back=None):
     for signal in signals:
         print(signal["name"])
 
-    for machine in get_machines(machines):
+    machines = get_machines(machines)
+    # Catch-up and backfill runs write old data, which is reported when it might cause compactions
+    WRITE_BUFFER.check_age = create_data_age_check(machines)
+    for machine in machines:
         LOGGER.info("PMA DB reader - Processing machine m" + machine[MACHINE_NR])
-        for signal in signals:
-            process_signal(
-                db_client=db_client, handler=handler, machine=machine,
-                signal=signal, signal_type=signal_type, job_name=name,
-                days_back=days_back)
+        # A failed write is raised by a later write, which may be one of the next machine
+        try:
+            with WRITE_BUFFER:
+                if backfill_days and not days_back:
+                    backfill(db_client, handler, machine, signals, signal_type, name, backfill_days)
+                for signal in signals:
+                    process_signal(
+                        db_client=db_client, handler=handler, machine=machine,
+                        signal=signal, signal_type=signal_type, job_name=name,
+                        days_back=days_back)
+        except Exception as e:
+            LOGGER.error("PMA DB reader - Error processing machine m{0}. {1}".format(machine[MACHINE_NR], str(e)))
 
+    try:
+        WRITE_BUFFER.join()
+    except Exception as e:
+        LOGGER.error("PMA DB reader - Error writing the data. {0}".format(str(e)))
     db_client.close_connection()
     write_monitor_data()
     LOGGER.info("Finished: PMA DB reader")
 
 
+def create_db_client():
+    """
+    Creates a client of the PMA database
+    :return: the database client
+    """
+    db_client = DbClientFactory.get_client(DbClientConfig.get(PMA_CONFIG_ID), LOGGER)
+    db_client.prepare(PMA_STATEMENT, PMA_QUERY)
+    return db_client
+
+
+def create_influx_client():
+    """
+    Creates a client of the time series database
+    :return: the database client
+    """
+    return DbClientFactory.get_client(DbClientConfig.get(INFLUX_CONFIG_ID), LOGGER)
+
+
+def create_data_age_check(machines):
+    """
+    Creates the check of the age of written data against the retention policies of the databases of the machines
+    :param machines: the machines
+    :return: the check, see RetentionPolicyConfig.check_frame_data_age, None if the retention policies can't be
+             loaded
+    """
+
+    try:
+        influx_client = create_influx_client()
+    except Exception as e:
+        LOGGER.warning("The age of the written data is not checked. {0}".format(str(e)))
+        return None
+    try:
+        return RetentionPolicyConfig(influx_client, machines, LOGGER,
+                                     cache=RetentionPolicyConfig.create_shared_cache(LOGGER, machines)
+                                     ).check_frame_data_age
+    except Exception as e:
+        LOGGER.warning("The age of the written data is not checked. {0}".format(str(e)))
+        return None
+    finally:
+        # The retention policies are loaded by the constructor
+        influx_client.close_connection()
+
+
 def get_machines(machines):
     """
     Get all the machines that should be processed with pma new
@@ -90,39 +195,242 @@ def process_signal(db_client, handler, machine,
     :param signal: the signal to look for
     :param signal_type: the signal type
     :param job_name: the name of the job
-    :param days_back: days_back that should be loaded as an overwrite for redis
+    :param days_back: days_back that should be loaded as an overwrite for redis. These catch-up runs read the data
+           in bulk with COPY
     :return:-
     """
 
     full_signal = "m{0}.{1}.{2}".format(machine[MACHINE_NR], signal_type, signal[NAME])
     signal_id = "SIGNAL:" + ".".join([handler, full_signal])
     last_updated = get_last_updated(signal_id, days_back)
+    chunksize = COPY_CHUNKSIZE if days_back else CHUNKSIZE
     while True:
-        (rows, no_errors, time_spent) = db_client.get_all(
-            PMA_QUERY, [signal[NAME], machine[MACHINE_NR],
-                        last_updated.strftime(DATETIME_FORMAT), CHUNKSIZE])
+        params = [signal[NAME], machine[MACHINE_NR], last_updated.strftime(DATETIME_FORMAT), chunksize]
+        if days_back:
+            ((idx, data), no_errors, time_spent) = db_client.get_time_series(PMA_QUERY, params)
+        else:
+            (rows, no_errors, time_spent) = db_client.get_all_prepared(PMA_STATEMENT, params)
+            idx = [row[0] for row in rows]
+            data = [row[1] for row in rows]
         global total_no_errors
         total_no_errors += no_errors
         global total_time_spent
         total_time_spent += time_spent
 
-        if len(rows) > 0:
-            idx = [row[0] for row in rows]
-            data = [row[1] for row in rows]
-            idx = pd.to_datetime(idx).tz_localize(machine["timezone"], ambiguous="NaT")
+        if len(idx) > 0:
+            idx = pd.to_datetime(idx).tz_localize(machine[TIMEZONE], ambiguous="NaT")
             out = dict()
             out[signal[NAME]] = pd.Series(data=data, index=idx)
-            save_to_db(
+            last_updated = arrow.get(idx[-1])
+            # The last updated time is only stored in redis once the data has been written
+            WRITE_BUFFER.save_to_db(
                 data=out,
                 prefix="s{0}.{1}".format(machine[SOURCE_NR], signal_type),
+                callback=partial(REDIS_CLIENT.set, signal_id, last_updated.timestamp),
                 job_name=job_name)
-            last_updated = arrow.get(idx[-1])
-            REDIS_CLIENT.set(signal_id, last_updated.timestamp)
 
-        if len(rows) < CHUNKSIZE:
+        if len(idx) < chunksize:
             break
 
 
+def backfill(db_client, handler, machine, signals, signal_type, job_name, backfill_days):
+    """
+    Detects the days before the last updated day of the signals of a machine for which fewer points have been
+    loaded than PMA contains, and reads these days again. The slices are read in parallel, with BACKFILL_WORKERS
+    database clients. The last updated times in redis are not changed
+    :param db_client: the database client that is used for the gap detection
+    :param handler: the handler
+    :param machine: the machine
+    :param signals: the signals
+    :param signal_type: the signal type
+    :param job_name: the name of the job
+    :param backfill_days: the number of days in which gaps are detected
+    :return:-
+    """
+
+    plan = []
+    influx_client = create_influx_client()
+    try:
+        for signal in signals:
+            plan += detect_gaps(db_client, influx_client, handler, machine, signal, signal_type, backfill_days)
+    finally:
+        influx_client.close_connection()
+    if not plan:
+        return
+    LOGGER.info("PMA DB reader - Backfilling {0} slices of machine m{1}".format(len(plan), machine[MACHINE_NR]))
+    failed = execute_plan(plan, partial(read_slice, machine=machine), create_db_client,
+                          partial(write_slice, machine=machine, signal_type=signal_type, job_name=job_name),
+                          max_workers=BACKFILL_WORKERS, logger=LOGGER)
+    if failed:
+        LOGGER.warning("PMA DB reader - {0} backfill slices of machine m{1} failed, these are detected again by the "
+                       "next run".format(len(failed), machine[MACHINE_NR]))
+
+
+def detect_gaps(db_client, influx_client, handler, machine, signal, signal_type, backfill_days):
+    """
+    Compares the number of points per day of a signal in PMA with the number of points that has been loaded. Only
+    complete days before the day of the last updated time are compared, the rest is read by process_signal
+    :param db_client: the database client
+    :param influx_client: the client of the time series database
+    :param handler: the handler
+    :param machine: the machine
+    :param signal: the signal
+    :param signal_type: the signal type
+    :param backfill_days: the number of days in which gaps are detected
+    :return: the backfill plan of the signal, list of (signal, start, stop) slices in the local time of the machine
+    """
+
+    full_signal = "m{0}.{1}.{2}".format(machine[MACHINE_NR], signal_type, signal[NAME])
+    last_update = REDIS_CLIENT.get("SIGNAL:" + ".".join([handler, full_signal]))
+    if not last_update:
+        return []
+    timezone = machine[TIMEZONE]
+    stop = pd.Timestamp(int(last_update), unit="s", tz="UTC").tz_convert(timezone).normalize().tz_localize(None)
+    # The loaded data is counted with the rollup, which only keeps the hours within its retention
+    now = pd.Timestamp.now(tz=timezone)
+    start = max(now - pd.Timedelta(days=backfill_days), now - ROLLUP.retention + pd.Timedelta(days=1))
+    start = start.normalize().tz_localize(None)
+    if start >= stop:
+        return []
+
+    source_counts = get_source_daily_counts(db_client, machine, signal, start, stop)
+    # The points in the hour that occurs twice when the clocks are set back can't be localized, so they aren't
+    # loaded and aren't counted in PMA either
+    for hour in get_ambiguous_hours(start, stop, timezone):
+        source_counts = source_counts.sub(
+            get_source_daily_counts(db_client, machine, signal, hour, hour + ONE_HOUR), fill_value=0)
+    loaded_counts = get_loaded_daily_counts(
+        influx_client, "s{0}.{1}.{2}".format(machine[SOURCE_NR], signal_type, signal[NAME]), start, stop, timezone)
+    return plan_backfill(signal, source_counts, loaded_counts)
+
+
+def get_source_daily_counts(db_client, machine, signal, start, stop):
+    """
+    Gets the number of points with a value per day of a signal in PMA
+    :param db_client: the database client
+    :param machine: the machine
+    :param signal: the signal
+    :param start: the start of the range, in local time
+    :param stop: the end (exclusive) of the range, in local time
+    :return: series with the number of points per local day, days without points are left out
+    """
+
+    params = [signal[NAME], machine[MACHINE_NR], start.strftime(DATETIME_FORMAT), stop.strftime(DATETIME_FORMAT)]
+    (rows, no_errors, time_spent) = db_client.get_all(PMA_DAILY_COUNT_QUERY, params)
+    global total_no_errors
+    total_no_errors += no_errors
+    global total_time_spent
+    total_time_spent += time_spent
+    return pd.Series([row[1] for row in rows], index=pd.DatetimeIndex([row[0] for row in rows]), dtype="float64")
+
+
+def get_ambiguous_hours(start, stop, timezone):
+    """
+    Gets the local hours that occur twice, because the clocks are set back
+    :param start: the start of the range, in local time
+    :param stop: the end (exclusive) of the range, in local time
+    :param timezone: the timezone of the machine
+    :return: the ambiguous hours, in local time
+    """
+
+    hours = pd.date_range(start.tz_localize(timezone).tz_convert("UTC"), stop.tz_localize(timezone).tz_convert("UTC"),
+                          freq=ONE_HOUR)
+    hours = hours.tz_convert(timezone).tz_localize(None).floor(ONE_HOUR)
+    return hours[hours.duplicated()].unique()
+
+
+def get_loaded_daily_counts(influx_client, signal, start, stop, timezone):
+    """
+    Gets the number of points per day of a signal that has been loaded, from its rollup. The rollup is seeded with
+    hourly aggregates that are calculated by the time series database, if it doesn't cover the range yet
+    :param influx_client: the client of the time series database
+    :param signal: the name of the signal in the time series database, the database followed by the measurement
+    :param start: the first day, in local time
+    :param stop: the day after the last day, in local time
+    :param timezone: the timezone of the machine
+    :return: series with the number of points per local day, days without points are left out
+    """
+
+    from_time, to_time = start.tz_localize(timezone), stop.tz_localize(timezone)
+    if not ROLLUP.is_complete(signal, from_time):
+        database, measurement = signal.split(".", 1)
+        hourly = influx_client.query_aggregates(measurement, AGGREGATES, from_time, to_time, interval="1h",
+                                                database=database)
+        # The time of the last point, later points are rolled up as they are written
+        last = influx_client.query_aggregates(measurement, [LAST], from_time, to_time, database=database)
+        ROLLUP.load_aggregates(signal, hourly, last.index[0] if not last.empty else None, from_time, to_time)
+    counts = ROLLUP.get(signal, from_time, to_time)[COUNT]
+    counts = counts[counts.index < to_time]
+    return counts.groupby(counts.index.tz_convert(timezone).tz_localize(None).normalize()).sum()
+
+
+def read_slice(db_client, signal, start, stop, machine):
+    """
+    Reads a slice of a backfill plan from PMA, in bulk with COPY
+    :param db_client: the database client of the worker
+    :param signal: the signal
+    :param start: the start of the slice, in local time
+    :param stop: the end (exclusive) of the slice, in local time
+    :param machine: the machine
+    :return: tuple of the timestamps and values arrays, the number of errors and the time spent
+    """
+
+    times, values = [], []
+    total_errors, total_time = 0, 0.0
+    from_time = start
+    while True:
+        params = [signal[NAME], machine[MACHINE_NR], from_time.strftime(DATETIME_FORMAT),
+                  stop.strftime(DATETIME_FORMAT), COPY_CHUNKSIZE]
+        ((idx, data), no_errors, time_spent) = db_client.get_time_series(PMA_RANGE_QUERY, params)
+        total_errors += no_errors
+        total_time += time_spent
+        count = len(idx)
+        if times:
+            # The next chunk starts at the second of the last point, the points that have been read are skipped
+            new = idx > times[-1][-1]
+            idx, data = idx[new], data[new]
+        if len(idx) > 0:
+            times.append(idx)
+            values.append(data)
+            from_time = pd.Timestamp(idx[-1])
+        if count < COPY_CHUNKSIZE or len(idx) == 0:
+            break
+    if not times:
+        return np.array([], dtype="datetime64[ns]"), np.array([], dtype=np.float64), total_errors, total_time
+    return np.concatenate(times), np.concatenate(values), total_errors, total_time
+
+
+def write_slice(plan_slice, result, machine, signal_type, job_name):
+    """
+    Writes a slice of a backfill plan that has been read, and replaces the rollup of its hours once it has been
+    written
+    :param plan_slice: the (signal, start, stop) slice
+    :param result: the result of read_slice
+    :param machine: the machine
+    :param signal_type: the signal type
+    :param job_name: the name of the job
+    :return:-
+    """
+
+    signal, start, stop = plan_slice
+    idx, data, no_errors, time_spent = result
+    global total_no_errors
+    total_no_errors += no_errors
+    global total_time_spent
+    total_time_spent += time_spent
+    if len(idx) == 0:
+        return
+    timezone = machine[TIMEZONE]
+    series = pd.Series(data=data, index=pd.DatetimeIndex(idx).tz_localize(timezone, ambiguous="NaT"))
+    prefix = "s{0}.{1}".format(machine[SOURCE_NR], signal_type)
+    # Points that are older than the last rolled up point are not rolled up by the write buffer
+    WRITE_BUFFER.save_to_db(
+        data={signal[NAME]: series}, prefix=prefix,
+        callback=partial(ROLLUP.load, prefix + "." + signal[NAME], series, start.tz_localize(timezone),
+                         stop.tz_localize(timezone)),
+        job_name=job_name)
+
+
 def write_monitor_data():
     """
     Keeps track of the pma db statistics. Number of errors and total seconds spend in
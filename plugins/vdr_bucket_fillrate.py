@@ -2,6 +2,14 @@ import numpy as np
 import pandas as pd
 import shared as sh
 import datetime as dt
+import os
+import tempfile
+from misc.signal_cache import SignalCache
+from misc.signal_store import SignalStore
+from misc.write_buffer import WriteBuffer
+from misc.async_writer import AsyncWriter
+from misc.task_state import TaskState
+from misc.rollup import COUNT, aggregate, ceil_hour
 
 # Fill rates should be generated for the following GPs (first tuple value)
 # and GP conditioning sizes (second tuple value)
@@ -18,11 +26,16 @@ NEW_DATA_ONLY = "new_data_only"
 UTC_TZ = "UTC"
 # Task logger used throughout the program
 TASK_LOGGER = sh.get_logger(sh.TASK_LOG)
+# Signals are cached between runs, as every run reads the same days_back window again
+SIGNAL_CACHE = SignalCache(sh.get_signals, logger=TASK_LOGGER)
+# Writes are buffered per machine and written in the background, signals that are read back are flushed first
+WRITE_BUFFER = WriteBuffer(sh.save_to_db, logger=TASK_LOGGER, on_write=SIGNAL_CACHE.invalidate_data,
+                           writer=AsyncWriter(logger=TASK_LOGGER))
 BOTTOM = "bot"
 TOP = "top"
 SOURCE_NR = "source_nr"
-TEMP = "temp"
 HOUR = "hour"
+ONE_HOUR = pd.Timedelta(hours=1)
 MIN_TEMP = 547.15
 MAX_TEMP = 549.15
 FILL_LEVEL_2 = "VDR_BUCKET._FillLevel_2"
@@ -31,67 +44,107 @@ PULSECOUNT_HTVB_LEVEL_MEDIAN_24H = "VDR_BUCKET._PulseCount_HTVBLevel_Median_24h"
 MEDIAN_FILL_LEVEL = "median_fill_level"
 PULSECOUNT = "pulse_count"
 PULSECOUNT_INTERPOLATED = "pulsecount_interpolated"
-
-
-def task_vdr_bucket_fill_rate(name, machines=None, days_back=5):
+# Default location of the state of the incremental mode, per machine and collector
+STATE_PATH = os.path.join(tempfile.gettempdir(), "vdr_bucket_fillrate.state")
+FILL_RATE = "fill_rate"
+RATE_TAIL = "rate_tail"
+CLOSED = "closed"
+MEDIAN_WINDOW = pd.Timedelta(hours=24)
+# Extra data that is read before the median window, so that the pulse count can be interpolated
+INCREMENTAL_MARGIN = pd.Timedelta(days=1)
+# Data within this margin before the stop time may have partly arrived, the fill levels, medians and fill rates of it
+# are calculated again by the next incremental run
+SETTLE_TIME = pd.Timedelta(hours=6)
+# The collector swaps per swap signal, so that a next run only fetches the swaps since the last known swap
+COLLECTOR_SWAPS = {}
+
+
+def task_vdr_bucket_fill_rate(name, machines=None, days_back=5, signal_store_dir=None, incremental=False,
+                              state_path=STATE_PATH):
     """
     Calculates the fill rates by looking back X GP Pulsecounts
 
     :param name: The name of the task
     :param machines: a list of machines for which the calculation should be done
     :param days_back: The 'number of days' of data that should be written to the database
+    :param signal_store_dir: the (optional) directory of a local signal store, so that historical days are read
+        from local disk instead of the database
+    :param incremental: if True, only the data that is new since the previous (incremental) run is calculated.
+        The state of the previous run is kept in state_path
+    :param state_path: the file with the state of the incremental mode, by default STATE_PATH. Deployments that
+        share a host should use their own file
 
     :return:-
     """
 
     TASK_LOGGER.info("Start: Fill Rate ({0}), days_back = {1}".format(name, days_back))
+    SIGNAL_CACHE.store = SignalStore(signal_store_dir, sh.get_signals, logger=TASK_LOGGER) if signal_store_dir else None
+    state = TaskState(state_path, logger=TASK_LOGGER) if incremental else None
     # for machine in (machines if machines else sh.Config().get_machines()):
     for machine in get_machines(machines):
         machine_nr = "s" + str(machine[SOURCE_NR])
         TASK_LOGGER.info("Start: Fill Rate calculation for machine " + machine_nr)
         collector_intervals = get_collector_intervals(machine_nr, days_back)
-        if not collector_intervals.empty:
-            process_collector_swaps(
-                machine, collector_intervals, days_back)
+        if collector_intervals:
+            with WRITE_BUFFER:
+                process_collector_swaps(
+                    machine, collector_intervals, days_back, state)
         TASK_LOGGER.info("Done: Fill Rate calculation for machine " + machine_nr)
+    WRITE_BUFFER.join()
     TASK_LOGGER.info("Done: Fill Rate")
 
 
 def get_collector_intervals(machine_nr, days_back):
     """
-    Returns a list of collector names and a list swap_time interval tuples
+    Returns the collector intervals: the last swap before the start of the days_back window and all later swaps
 
     :param machine_nr: Machine number
     :param days_back: The number of days to consider for going back in swap_time
 
-    :return: list of collector intervals and a list of names of collector names
+    :return: list of (collector name, start time, end time) tuples, the last interval ends now
     """
 
     try:
-        signal = machine_nr + ".Collector.Swap"
-        data = sh.get_signals(signal, USER)
+        swaps = get_collector_swaps(machine_nr + ".Collector.Swap")
         ts_start = get_now() - dt.timedelta(days=days_back)
-        first = True
-        for swap_time in reversed(data.index):
-            if (swap_time > ts_start) or (ts_start >= swap_time and first):
-                if ts_start >= swap_time and first:
-                    first = False
-            else:
-                data.drop(swap_time, inplace=True)
-        if data.empty:
+        # The position of the last swap at or before ts_start, or of the first swap if there is none
+        first = max(swaps.index.searchsorted(ts_start, side="right") - 1, 0)
+        swaps = swaps.iloc[first:]
+        if swaps.empty:
             # If no swaps have been defined
-            data = pd.concat([data,
-                              pd.DataFrame([["None"]],
-                                           columns=[signal],
-                                           index=[pd.Timestamp(dt.datetime.fromtimestamp(0 / 1000000)).
-                                           tz_localize(UTC_TZ)])], ignore_index=False)
-        data = pd.DataFrame(pd.concat([data, pd.DataFrame([["None"]], columns=[signal], index=[get_now()])],
-                            ignore_index=False))
-        return data.sort_index()
+            start_times = [pd.Timestamp(dt.datetime.fromtimestamp(0 / 1000000)).tz_localize(UTC_TZ)]
+            collector_names = ["None"]
+        else:
+            start_times = list(swaps.index)
+            collector_names = list(swaps.values)
+        return list(zip(collector_names, start_times, start_times[1:] + [get_now()]))
     except Exception as e:
         TASK_LOGGER.error("Fill Rate: Error retrieving collectors: " + e.message + " Machine: " +
                           machine_nr)
-        return pd.DataFrame()
+        return []
+
+
+def get_collector_swaps(signal):
+    """
+    Gets the collector swaps. The full history is fetched once, after that only the swaps since the last known
+    swap are fetched; if there are none, the known swaps are returned as is
+
+    :param signal: the name of the swap signal
+
+    :return: series of collector names, indexed (and sorted) by swap time
+    """
+
+    known_swaps = COLLECTOR_SWAPS.get(signal)
+    if known_swaps is None or known_swaps.empty:
+        data = sh.get_signals(signal, USER)
+        swaps = data.iloc[:, 0].sort_index() if not data.empty else pd.Series(dtype=object)
+    else:
+        data = sh.get_signals(signal, USER, from_time=known_swaps.index[-1], to_time=get_now())
+        new_swaps = data.iloc[:, 0].sort_index() if not data.empty else pd.Series(dtype=object)
+        new_swaps = new_swaps[new_swaps.index > known_swaps.index[-1]]
+        swaps = pd.concat([known_swaps, new_swaps]) if not new_swaps.empty else known_swaps
+    COLLECTOR_SWAPS[signal] = swaps
+    return swaps
 
 
 def get_machines(machines):
@@ -108,44 +161,60 @@ def get_machines(machines):
     return result_machines
 
 
-def process_collector_swaps(machine, collector_intervals, days_back):
+def process_collector_swaps(machine, collector_intervals, days_back, state=None):
     """
     Perform the calculations for each collector/swap
 
     :param machine: the machine for which the calculations should be performed
-    :param collector_intervals: dataframe with collector intervals
+    :param collector_intervals: list of (collector name, start time, end time) tuples
     :param days_back: the number of days that should be considered for removing old data
+    :param state: the TaskState in incremental mode, None otherwise
 
     :return:-
     """
 
     source_nr = "s" + str(machine[SOURCE_NR])
-    collector_name = collector_intervals.iloc[0][0]
-    start_time = collector_intervals.index[0]
-    for i in range(1, len(collector_intervals)):
-        end_time = collector_intervals.index[i]
+    for i, (collector_name, start_time, end_time) in enumerate(collector_intervals):
         TASK_LOGGER.info("Start: Fill Rate calculation for machine {0}, collector {1}, "
                          "start time {2}, end time {3}"
                          .format(source_nr, collector_name, start_time, end_time))
 
         try:
-            if calc_vdr_bucket_fill_level2(machine=machine, days_back=days_back, ts_start=start_time, ts_stop=end_time):
-                calc_vdr_bucket_medians(machine=machine, days_back=days_back, ts_start=start_time, ts_stop=end_time)
+            key = "{0}.{1}.{2}".format(source_nr, collector_name, start_time.isoformat())
+            progress = state.get(key) if state is not None else None
+            if progress and progress.get(CLOSED):
+                TASK_LOGGER.info("Fill Rate calculation: collector {0} has been processed".format(collector_name))
+            elif calc_vdr_bucket_fill_level2(machine=machine, days_back=days_back, ts_start=start_time,
+                                             ts_stop=end_time, progress=progress):
+                # The medians are calculated from fill level 2, the fill rates from the medians, which are read
+                # back from the database once they have been written
+                WRITE_BUFFER.flush()
+                calc_vdr_bucket_medians(machine=machine, days_back=days_back, ts_start=start_time, ts_stop=end_time,
+                                        progress=progress)
+                WRITE_BUFFER.flush()
                 df = get_base_signals(machine=machine, collector_name=collector_name,
-                                      ts_start=start_time, ts_stop=end_time)
+                                      ts_start=get_incremental_start(progress, FILL_RATE, start_time),
+                                      ts_stop=end_time)
                 if not df.empty:
-                    calculate_fill_rates(machine, join_interpolate(df), start_time, days_back)
+                    calculate_fill_rates(machine, join_interpolate(df), start_time, days_back, progress)
+                if state is not None:
+                    # The state is only saved once the data has been written
+                    WRITE_BUFFER.flush()
+                    progress[CLOSED] = i < len(collector_intervals) - 1
+                    state.set(key, progress)
+                    state.save()
+            # The data of the collector is written in the background while the next collector is calculated, a
+            # failed write is raised by the next write or at the end of the task
+            WRITE_BUFFER.flush(wait=False)
         except Exception as e:
             TASK_LOGGER.error(
                 "Error during Fill Rate calculation {0} [{1}]. {2}".format(source_nr, collector_name, str(e)))
 
         TASK_LOGGER.info(
             "Done: Fill Rate calculation for machine {0}, collector {1}".format(source_nr, collector_name))
-        start_time = end_time
-        collector_name = collector_intervals.iloc[i][0]
 
 
-def calc_vdr_bucket_fill_level2(machine, ts_start, ts_stop, days_back):
+def calc_vdr_bucket_fill_level2(machine, ts_start, ts_stop, days_back, progress=None):
     """
     Calculates vdr bucket fill level 2
 
@@ -153,6 +222,7 @@ def calc_vdr_bucket_fill_level2(machine, ts_start, ts_stop, days_back):
     :param ts_start: Start time of the calculation
     :param ts_stop:  Stop time of the calculation
     :param days_back: the number of days that should be considered for retrieving and removing old data
+    :param progress: the state of the collector in incremental mode, None otherwise
 
     :return: True if data was returned in one of the data frames, False if not
     """
@@ -161,16 +231,29 @@ def calc_vdr_bucket_fill_level2(machine, ts_start, ts_stop, days_back):
 
     # Get the max: either the collector start time or the now - days_back (+ partial day)
     ts_start = max(get_now() - dt.timedelta(days=(days_back + 1)), ts_start)
+    last_processed = progress.get(FILL_LEVEL_2) if progress else None
+    if last_processed is not None:
+        ts_start = max(ts_start, last_processed)
     df1 = get_temperatures_df("VDR_HEATER.TCbot", "VDR_HEATER.TCtop", source_nr, ts_start, ts_stop)
     df2 = get_temperatures_df("KPI.HTVB_Bot_Temperature_VALUE", "KPI.HTVB_Top_Temperature_VALUE",
                               source_nr, ts_start, ts_stop)
     df = pd.DataFrame(pd.concat([df1, df2]))
+    if not df.empty and last_processed is not None:
+        df = df[df.index > last_processed]
     if df.empty or len(df.columns) < 2:
+        if last_processed is not None:
+            # No new temperatures, but the medians and fill rates may have new pulse counts
+            return True
         TASK_LOGGER.warning("Missing fill level base signals")
         return False
+    if progress is not None:
+        # The temperatures within the settle time may still be incomplete, these are read again by the next run
+        watermark = min(df.index.max(), ts_stop - SETTLE_TIME)
+        progress[FILL_LEVEL_2] = max(watermark, last_processed) if last_processed is not None else watermark
     df = df.loc[(df[BOTTOM] > MIN_TEMP) & (df[BOTTOM] < MAX_TEMP)]
-    sh.save_to_db({source_nr + "." + FILL_LEVEL_2: 100 - (0.662 * (df[BOTTOM] - df[TOP])).astype(pd.np.float64)},
-                  None, existing_data_option=NEW_DATA_ONLY)
+    WRITE_BUFFER.save_to_db(
+        {source_nr + "." + FILL_LEVEL_2: 100 - (0.662 * (df[BOTTOM] - df[TOP])).astype(pd.np.float64)},
+        None, existing_data_option=NEW_DATA_ONLY)
     return True
 
 
@@ -188,8 +271,9 @@ def get_temperatures_df(bottom_signal, top_signal, source_nr, ts_start, ts_stop)
     :return the created dataframe
     """
 
-    df = sh.get_signals(
-        [("{0}." + bottom_signal).format(source_nr), ("{0}." + top_signal).format(source_nr)], USER, ts_start, ts_stop)
+    df = SIGNAL_CACHE.get_signals(
+        [("{0}." + bottom_signal).format(source_nr), ("{0}." + top_signal).format(source_nr)], USER,
+        from_time=ts_start, to_time=ts_stop)
 
     if df.empty or len(df.columns) < 2:
         return pd.DataFrame()
@@ -197,14 +281,13 @@ def get_temperatures_df(bottom_signal, top_signal, source_nr, ts_start, ts_stop)
         raise ValueError("Get signals returned more columns than expected")
 
     df.columns = [BOTTOM, TOP]
-    df[TEMP] = df.index
-    df[HOUR] = df[TEMP].apply(
-        lambda x: pd.Timestamp(dt.datetime(
-            year=x.year, month=x.month, day=x.day, hour=x.hour)).tz_localize(UTC_TZ))
+    # The hour of the (wall clock) time, labeled as UTC
+    times = df.index.tz_localize(None) if df.index.tz is not None else df.index
+    df[HOUR] = times.floor(ONE_HOUR).tz_localize(UTC_TZ)
     return df
 
 
-def calc_vdr_bucket_medians(machine, ts_start, ts_stop, days_back):
+def calc_vdr_bucket_medians(machine, ts_start, ts_stop, days_back, progress=None):
     """
     Calculates the 24 hour median values of Collector._PulseCount and
     VDR_BUCKET._FillLevel2
@@ -215,11 +298,16 @@ def calc_vdr_bucket_medians(machine, ts_start, ts_stop, days_back):
     :param ts_start: Start time of the calculation
     :param ts_stop:  Stop time of the calculation
     :param days_back: For the save_to_db function ONLY, data is written from days_back days to ts_stop
+    :param progress: the state of the collector in incremental mode, None otherwise. Only the medians after the
+        last calculated median are calculated, which needs the 24h window (plus a margin for interpolation) before it
 
     :return: True if data is found, False otherwise
     """
 
     source_nr = "s{0}".format(machine[SOURCE_NR])
+    last_median = progress.get(FILL_LEVEL_MEDIAN_24H) if progress else None
+    if last_median is not None:
+        ts_start = max(ts_start, last_median - MEDIAN_WINDOW - INCREMENTAL_MARGIN)
 
     signal_fill_level_median_24h = ("{0}." + FILL_LEVEL_MEDIAN_24H).format(source_nr)
     signal_collector_pulsecount = "{0}.Collector._PulseCount".format(source_nr)
@@ -231,14 +319,39 @@ def calc_vdr_bucket_medians(machine, ts_start, ts_stop, days_back):
         signal_fill_level_median_24h=signal_fill_level_median_24h,
         signal_fill_level2=("{0}." + FILL_LEVEL_2).format(source_nr),
         ts_start=ts_start, ts_stop=ts_stop)
+    if last_median is not None and df_pc_median is not None:
+        df_pc_median = df_pc_median[df_pc_median.index > last_median]
+        df_fl_median = df_fl_median[df_fl_median.index > last_median]
+    if progress is not None and df_pc_median is not None:
+        progress[FILL_LEVEL_MEDIAN_24H] = get_median_watermark(last_median, ts_stop, df_pc_median, df_fl_median)
 
-    sh.save_to_db({
+    WRITE_BUFFER.save_to_db({
         signal_collector_pulsecount_median_24h: df_pc_median,
         signal_fill_level_median_24h: df_fl_median
     }, None)
     return
 
 
+def get_median_watermark(last_median, ts_stop, df_pc_median, df_fl_median):
+    """
+    Determines the time up to which the medians have been calculated: the last window that has been produced for
+    both medians, but not later than SETTLE_TIME before ts_stop. Windows after it are calculated again
+
+    :param last_median: the previous watermark, None if there is none
+    :param ts_stop: the stop time of the calculation
+    :param df_pc_median: the calculated pulse count medians
+    :param df_fl_median: the calculated fill level medians
+
+    :return: the watermark
+    """
+
+    if df_pc_median.empty or df_fl_median.empty:
+        return last_median
+    watermark = min(df_pc_median.index.max(), df_fl_median.index.max(),
+                    calc_stop_time_at_day_interval(ts_stop - SETTLE_TIME, 4))
+    return max(watermark, last_median) if last_median is not None else watermark
+
+
 def get_median_dfs(days_back, signal_collector_pulsecount, signal_collector_pulsecount_median_24h,
                    signal_fill_level_median_24h, signal_fill_level2, ts_start, ts_stop):
     """
@@ -253,8 +366,8 @@ def get_median_dfs(days_back, signal_collector_pulsecount, signal_collector_puls
     :return: the two dataframes
     """
 
-    base_signals_df = sh.get_signals([signal_fill_level2, signal_collector_pulsecount],
-                                     USER, from_time=ts_start, to_time=ts_stop)
+    base_signals_df = SIGNAL_CACHE.get_signals([signal_fill_level2, signal_collector_pulsecount],
+                                               USER, from_time=ts_start, to_time=ts_stop)
     if base_signals_df.empty or len(base_signals_df.columns) < 2:
         TASK_LOGGER.warning("Missing " + signal_fill_level2 + " or " + signal_collector_pulsecount)
         return None, None
@@ -265,9 +378,11 @@ def get_median_dfs(days_back, signal_collector_pulsecount, signal_collector_puls
         joined_df, PULSECOUNT_INTERPOLATED, signal_collector_pulsecount_median_24h,
         ts_start, ts_stop)[signal_collector_pulsecount_median_24h].astype(pd.np.float64)
 
+    # The hourly counts are determined from the data that has been read, which includes points that were written
+    # late or by other processes
     fl_median_df = create_median_df(
-        base_signals_df, signal_fill_level2, signal_fill_level_median_24h,
-        ts_start, ts_stop)[signal_fill_level_median_24h].astype(pd.np.float64)
+        base_signals_df, signal_fill_level2, signal_fill_level_median_24h, ts_start, ts_stop
+    )[signal_fill_level_median_24h].astype(pd.np.float64)
 
     # Only save data to the database that is necessary, i.e. the max of either the collector start time or
     # the now - days_back (+ partial day + 1(24h range))
@@ -309,7 +424,7 @@ def get_base_signals(machine, collector_name, ts_start, ts_stop):
     # Get the Collector._PulseCount and VDR_HEATER._Fill_level_day signals
     signal_fld = ("s{0}." + FILL_LEVEL_MEDIAN_24H).format(machine[SOURCE_NR])
     signal_pc = ("s{0}." + PULSECOUNT_HTVB_LEVEL_MEDIAN_24H).format(machine[SOURCE_NR])
-    base_signals_df = sh.get_signals([signal_fld, signal_pc], USER, from_time=ts_start, to_time=ts_stop)
+    base_signals_df = SIGNAL_CACHE.get_signals([signal_fld, signal_pc], USER, from_time=ts_start, to_time=ts_stop)
 
     if base_signals_df.empty or len(base_signals_df.columns) < 2:
         TASK_LOGGER.warning("Fill Rate calculation: Missing {0} or {1} for machine {2}, collector {3}".
@@ -320,7 +435,7 @@ def get_base_signals(machine, collector_name, ts_start, ts_stop):
     return base_signals_df
 
 
-def calculate_fill_rates(machine, rate_df, ts_start, days_back):
+def calculate_fill_rates(machine, rate_df, ts_start, days_back, progress=None):
     """
     Calculate and stores the fill rates in the database
 
@@ -328,24 +443,72 @@ def calculate_fill_rates(machine, rate_df, ts_start, days_back):
     :param rate_df: Data frame with fill levels and interpolated pulse counts
     :param ts_start: Start time of the calculation
     :param days_back: the number of days that should be considered for fitting and removing old data
+    :param progress: the state of the collector in incremental mode, None otherwise
 
     :return:-
     """
 
     # Get the max: either the collector start time or the now - days_back (+ partial day)
     ts_start = max(get_now() - dt.timedelta(days=(days_back + 1)), ts_start)
+    if progress is not None:
+        rate_df, ts_start = get_incremental_rate_df(rate_df, ts_start, progress)
 
     for gp_cond in GP_CONDITIONS:
-        rate_gp = rate_df[PULSECOUNT_INTERPOLATED][rate_df[PULSECOUNT_INTERPOLATED] > gp_cond[0]]. \
-            apply(lambda x: fit_rate_pulsecount(x, rate_df, gp_cond))
+        pulsecounts = rate_df[PULSECOUNT_INTERPOLATED][rate_df[PULSECOUNT_INTERPOLATED] > gp_cond[0]]
         # Only keep 'days_back' days of data
-        rate_gp = rate_gp[rate_gp.index > ts_start]
-        sh.save_to_db({
+        rate_gp = pulsecounts[pulsecounts.index > ts_start].apply(lambda x: fit_rate_pulsecount(x, rate_df, gp_cond))
+        WRITE_BUFFER.save_to_db({
                 "s{0}.VDR_BUCKET._FillRate_{1}Gp".format(machine[SOURCE_NR], gp_cond[0]):
                 rate_gp.astype(pd.np.float64)
             }, None)
 
 
+def get_incremental_rate_df(rate_df, ts_start, progress):
+    """
+    Combines the new fill levels and pulse counts with the tail of the previous run, which contains the pulse counts
+    that are needed for fitting the largest GP condition. The fill rates are calculated up to the median watermark,
+    the medians after it are calculated again. The tail of the combined data up to the watermark is kept in the
+    progress, the rows after it are read again by the next run
+
+    :param rate_df: Data frame with fill levels and interpolated pulse counts, which starts before the last fill rate
+    :param ts_start: Start time of the calculation
+    :param progress: the state of the collector
+
+    :return: the combined data frame and the start time of the fill rates that should be calculated
+    """
+
+    tail = progress.get(RATE_TAIL)
+    if tail is not None and not tail.empty:
+        rate_df = pd.concat([tail, rate_df[rate_df.index > tail.index.max()]])
+        rate_df = rate_df[~rate_df[PULSECOUNT_INTERPOLATED].duplicated(keep="first")]
+    if progress.get(FILL_RATE) is not None:
+        ts_start = max(ts_start, progress[FILL_RATE])
+    watermark = progress.get(FILL_LEVEL_MEDIAN_24H)
+    settled_df = rate_df[rate_df.index <= watermark] if watermark is not None else rate_df.iloc[:0]
+    if not settled_df.empty:
+        max_gp = max(gp_cond[0] for gp_cond in GP_CONDITIONS)
+        progress[FILL_RATE] = settled_df.index.max()
+        pulsecounts = settled_df[PULSECOUNT_INTERPOLATED]
+        progress[RATE_TAIL] = settled_df[pulsecounts > pulsecounts.max() - max_gp]
+    return rate_df, ts_start
+
+
+def get_incremental_start(progress, name, ts_start):
+    """
+    Gets the start time of the data that is needed to continue a calculation in incremental mode
+
+    :param progress: the state of the collector in incremental mode, None otherwise
+    :param name: the name of the calculation in the progress
+    :param ts_start: the start time of the full calculation
+
+    :return: the start time
+    """
+
+    if not progress or progress.get(name) is None:
+        return ts_start
+    return max(ts_start, progress[name] - INCREMENTAL_MARGIN)
+
+
 def fit_rate_pulsecount(x, rate_df, gp_condition):
     """
     Performs a linear fit of interpolated pulsecounts and median fill levels
@@ -427,14 +590,15 @@ def create_median_df(df, signal_input, signal_output, ts_start, ts_stop):
     days_back = (ts_stop - ts_start).days
     times_per_day = 4
     stop_time = calc_stop_time_at_day_interval(ts_stop, times_per_day)
-    df = df[signal_input]
-    df.dropna(inplace=True)
+    df = df[signal_input].dropna()
+    # The points are counted per hour once, instead of per 24 hour window
+    hourly_counts = aggregate(df)[COUNT]
     # Only days should be used of which there are datapoints in at least minimum_points
     # 1 hour buckets
     for i in range(times_per_day * days_back):
         start_time = stop_time - pd.Timedelta(hours=24)
         start_time = start_time + pd.Timedelta(seconds=1)
-        if get_number_of_hourly_buckets_with_points(df, start_time, stop_time) >= MIN_HOURLY_BUCKETS:
+        if get_number_of_hourly_buckets_with_points(df, start_time, stop_time, hourly_counts) >= MIN_HOURLY_BUCKETS:
             single_avg_df = pd.DataFrame(
                 {"time": stop_time,
                  signal_output: {"value": df.loc[start_time:stop_time].median()}})
@@ -446,20 +610,46 @@ def create_median_df(df, signal_input, signal_output, ts_start, ts_stop):
     return avg_df
 
 
-def get_number_of_hourly_buckets_with_points(df, start_time, stop_time):
+def get_number_of_hourly_buckets_with_points(df, start_time, stop_time, hourly_counts=None):
     """
     Get the number of hourly buckets with data points
     :param df: the dataframe with the data of the last 24 hour
     :param start_time: start time
     :param stop_time: stop time
+    :param hourly_counts: (optional) the number of points per hour (UTC). The hours that lie completely between
+        start_time and stop_time are counted from it, only the partial hours at the edges are looked up in df
     :return: number of hourly buckets with data points
     """
+    if hourly_counts is not None:
+        first_hour = ceil_hour(start_time)
+        last_hour = stop_time.floor(ONE_HOUR)
+        if first_hour <= last_hour:
+            full_hours = hourly_counts[(hourly_counts.index >= first_hour) & (hourly_counts.index < last_hour)]
+            number_of_buckets = int((full_hours >= 1).sum())
+            if start_time < first_hour and has_points(df, start_time, first_hour, include_stop=False):
+                number_of_buckets += 1
+            if has_points(df, last_hour, stop_time):
+                number_of_buckets += 1
+            return number_of_buckets
     df_24h = df.loc[start_time:stop_time]
     times = pd.DatetimeIndex(df_24h.index)
     grouped_cnt = df_24h.groupby([times.year, times.month, times.day, times.hour]).count()
     return len(grouped_cnt[grouped_cnt >= 1])
 
 
+def has_points(df, start_time, stop_time, include_stop=True):
+    """
+    Checks whether there are data points between two times
+    :param df: the series with the data, with a sorted index
+    :param start_time: start time (inclusive)
+    :param stop_time: stop time
+    :param include_stop: whether the stop time is inclusive
+    :return: True if there are data points, False otherwise
+    """
+    return df.index.searchsorted(stop_time, side="right" if include_stop else "left") > \
+        df.index.searchsorted(start_time, side="left")
+
+
 def get_now():
     """
     Gets time current time in UTC tz
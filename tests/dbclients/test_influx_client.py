@@ -0,0 +1,161 @@
+import gzip
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+from dbclients.DbClientConfig import DbClientConfig
+from dbclients.InfluxClient import InfluxClient, InfluxClientError, to_line
+
+
+class StubInfluxHandler(BaseHTTPRequestHandler):
+    """
+    Request handler that speaks the write and query endpoints of InfluxDB
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if url.path != "/write":
+            return self.reply(404, b'{"error":"not found"}')
+        self.server.ports.add(self.client_address[1])
+        self.server.requests.append((self.headers["Content-Encoding"], parse_qs(url.query),
+                                     gzip.decompress(body).decode("utf-8").split("\n")))
+        self.reply(204, b"")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        self.server.requests.append((None, params, None))
+        if "UNKNOWN" in params["q"][0]:
+            return self.reply(400, b'{"error":"database not found: UNKNOWN"}')
+        # The response is sent with chunked transfer encoding, as a JSON document per chunk
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in self.server.chunks:
+            data = (json.dumps(chunk) + "\n").encode("utf-8")
+            self.wfile.write("{0:x}\r\n".format(len(data)).encode("ascii") + data + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class InfluxClientTest(unittest.TestCase):
+    """
+    Class that unittests the InfluxClient against a stub InfluxDB server
+    """
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), StubInfluxHandler)
+        self.server.requests = []
+        self.server.chunks = []
+        self.server.ports = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        config = DbClientConfig("INFLUX", "http://127.0.0.1", self.server.server_address[1], "s1", "admin", b"")
+        self.client = InfluxClient(config, None, batch_size=2)
+
+    def tearDown(self):
+        self.client.close_connection()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_write(self):
+        """
+        Points are written as gzip compressed line protocol, in batches, over one connection
+        :return:
+        """
+        index = pd.date_range("2018-06-01", periods=3, freq="1s", tz="UTC")
+        self.client.write_series({"DLPA0 value": pd.Series([1.0, np.nan, 2.5, 3.0], index=index.append(
+            pd.DatetimeIndex([pd.Timestamp("2018-06-01 00:00:03", tz="UTC")])))}, retention_policy="rp")
+        self.client.write_points([{"measurement": "m", "tags": {"b": "x y", "a": "1"}, "fields": {"v": 2, "s": "a"},
+                                   "time": pd.Timestamp("2018-06-01", tz="UTC")}], database="s2")
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.server.ports), 1)
+        encoding, params, lines = self.server.requests[0]
+        self.assertEqual(encoding, "gzip")
+        self.assertEqual(params, {"db": ["s1"], "precision": ["n"], "rp": ["rp"]})
+        self.assertEqual(lines, ["DLPA0\\ value value=1.0 1527811200000000000",
+                                 "DLPA0\\ value value=2.5 1527811202000000000"])
+        self.assertEqual(self.server.requests[1][2], ["DLPA0\\ value value=3.0 1527811203000000000"])
+        self.assertEqual(self.server.requests[2][1]["db"], ["s2"])
+        self.assertEqual(self.server.requests[2][2], ['m,a=1,b=x\\ y s="a",v=2i 1527811200000000000'])
+
+    def test_query(self):
+        """
+        The chunks of a query response are decoded into arrays per series
+        :return:
+        """
+        self.server.chunks = [
+            {"results": [{"statement_id": 0, "series": [
+                {"name": "a", "columns": ["time", "value"], "values": [[1, 1.5], [2, None]]}], "partial": True}]},
+            {"results": [{"statement_id": 0, "series": [
+                {"name": "a", "columns": ["time", "value"], "values": [[3, 4]]},
+                {"name": "b", "columns": ["time", "value"], "values": [[1, 7.0]]}]}]}]
+        result = self.client.query_regex("^DLPA0_.*$", pd.Timestamp("2018-06-01", tz="UTC"), 10 ** 18)
+        params = self.server.requests[0][1]
+        self.assertEqual(params["q"], ['SELECT "value" FROM /^DLPA0_.*$/ WHERE time >= 1527811200000000000 AND '
+                                       'time < 1000000000000000000'])
+        self.assertEqual(params["chunked"], ["true"])
+        self.assertEqual(sorted(result), ["a", "b"])
+        np.testing.assert_array_equal(result["a"].values, [1.5, np.nan, 4.0])
+        self.assertEqual(list(result["a"].index), list(pd.to_datetime([1, 2, 3], utc=True)))
+        arrays = self.client.query("SELECT * FROM a")
+        self.assertEqual(arrays["a"]["time"].dtype, np.int64)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_query_aggregates(self):
+        """
+        The aggregates are calculated by the database per interval, an unknown measurement has no aggregates
+        :return:
+        """
+        self.server.chunks = [{"results": [{"statement_id": 0, "series": [
+            {"name": "DLPA0", "columns": ["time", "count", "max"], "values": [[0, 2, 1.5], [7200, 1, 3]]}]}]}]
+        result = self.client.query_aggregates("DLPA0", ["count", "max"], 0, 10 ** 4, interval="1h", database="s2")
+        _, params, _ = self.server.requests[0]
+        self.assertEqual(params["q"], ['SELECT count("value") AS "count", max("value") AS "max" FROM "DLPA0" WHERE '
+                                       'time >= 0 AND time < 10000 GROUP BY time(1h) fill(none)'])
+        self.assertEqual(params["db"], ["s2"])
+        self.assertEqual(list(result.columns), ["count", "max"])
+        self.assertEqual(list(result.index), list(pd.to_datetime([0, 7200], utc=True)))
+        self.assertEqual(list(result["max"]), [1.5, 3.0])
+        self.server.chunks = [{"results": [{"statement_id": 0}]}]
+        result = self.client.query_aggregates("DLPA1", ["last"], 0, 10 ** 4)
+        self.assertTrue(result.empty)
+        self.assertEqual(list(result.columns), ["last"])
+
+    def test_retention_policies(self):
+        """
+        The retention policies are returned like influxdb-python does, errors are raised with their message
+        :return:
+        """
+        self.server.chunks = [{"results": [{"statement_id": 0, "series": [
+            {"columns": ["name", "duration", "shardGroupDuration", "replicaN", "default"],
+             "values": [["autogen", "0s", "168h0m0s", 1, True]]}]}]}]
+        self.assertEqual(self.client.get_list_retention_policies(),
+                         [{"name": "autogen", "duration": "0s", "shardGroupDuration": "168h0m0s", "replicaN": 1,
+                           "default": True}])
+        with self.assertRaises(InfluxClientError) as context:
+            self.client.get_list_retention_policies("UNKNOWN")
+        self.assertIn("database not found", str(context.exception))
+        self.assertEqual(context.exception.status, 400)
+
+    def test_line_escaping(self):
+        """
+        Keys, tag values and string fields are escaped
+        :return:
+        """
+        self.assertEqual(to_line({"measurement": "a,b", "tags": {"t=1": "v,2"},
+                                  "fields": {"f": 'say "hi"', "ok": True, "x": 0.1}}),
+                         'a\\,b,t\\=1=v\\,2 f="say \\"hi\\"",ok=true,x=0.1')
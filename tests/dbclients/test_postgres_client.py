@@ -0,0 +1,60 @@
+import io
+import struct
+import unittest
+import numpy as np
+from dbclients.PostgresCopy import parse_binary_time_series, parse_csv_time_series, to_numbered_parameters, \
+    BINARY_SIGNATURE
+
+TIMES = np.array(["2018-06-01T00:00:00", "2018-06-01T00:00:01.5", "1999-12-31T23:59:59"], dtype="datetime64[ns]")
+VALUES = [1.5, -2.0, 3.25]
+
+
+def create_binary_copy(rows):
+    """
+    Creates the output of a binary COPY of (timestamp, float8) rows
+    :param rows: list of (microseconds since 2000-01-01, value) tuples, None for NULL values
+    :return: the buffer
+    """
+    data = BINARY_SIGNATURE + struct.pack(">ii", 0, 0)
+    for time, value in rows:
+        data += struct.pack(">hiq", 2, 8, time)
+        data += struct.pack(">id", 8, value) if value is not None else struct.pack(">i", -1)
+    return io.BytesIO(data + struct.pack(">h", -1))
+
+
+class PostgresClientTest(unittest.TestCase):
+    """
+    Class that unittests the decoding of the COPY output and the prepared statements of the PostgresClient
+    """
+
+    def test_binary(self):
+        """
+        The rows of a binary COPY are decoded into arrays, rows with NULL's can't be decoded
+        :return:
+        """
+        microseconds = (TIMES - np.datetime64("2000-01-01T00:00:00")) // np.timedelta64(1, "us")
+        times, values = parse_binary_time_series(create_binary_copy(zip(microseconds.tolist(), VALUES)))
+        np.testing.assert_array_equal(times, TIMES)
+        np.testing.assert_array_equal(values, VALUES)
+        self.assertRaises(ValueError, parse_binary_time_series, create_binary_copy([(0, 1.0), (1, None)]))
+
+    def test_csv(self):
+        """
+        The rows of a CSV COPY are decoded into arrays, with varying fractional seconds
+        :return:
+        """
+        times, values = parse_csv_time_series(io.BytesIO(
+            b"2018-06-01 00:00:00,1.5\n2018-06-01 00:00:01.5,-2\n1999-12-31 23:59:59,3.25\n"))
+        np.testing.assert_array_equal(times, TIMES)
+        np.testing.assert_array_equal(values, VALUES)
+        times, values = parse_csv_time_series(io.BytesIO(b""))
+        self.assertEqual(len(times), 0)
+
+    def test_numbered_parameters(self):
+        """
+        The %s parameters are numbered in order, escaped percent signs are unescaped
+        :return:
+        """
+        self.assertEqual(to_numbered_parameters("SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' LIMIT %s"),
+                         "SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' LIMIT $2")
+        self.assertEqual(to_numbered_parameters("SELECT 1"), "SELECT 1")
@@ -0,0 +1,150 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+import pandas as pd
+from misc.async_writer import AsyncWriter
+from misc.write_buffer import WriteBuffer
+
+INDEX = pd.date_range("2018-06-01", periods=3, freq="60min", tz="UTC")
+
+
+class AsyncWriterTest(unittest.TestCase):
+    """
+    Class that unittests the AsyncWriter class
+    """
+
+    def setUp(self):
+        self.writer = AsyncWriter(max_queue=1)
+        self.written = []
+
+    def tearDown(self):
+        self.writer.join()
+
+    def test_writes_in_order(self):
+        """
+        The writes are done in order in the background, submit blocks while the queue is full
+        :return:
+        """
+        release = threading.Event()
+
+        def write(value):
+            release.wait(5)
+            self.written.append(value)
+
+        self.writer.submit(write, 1)
+        self.writer.submit(write, 2)
+        submitted = threading.Event()
+        thread = threading.Thread(target=lambda: self.writer.submit(write, 3) or submitted.set())
+        thread.start()
+        self.assertFalse(submitted.wait(0.2))
+        release.set()
+        thread.join(5)
+        self.writer.flush()
+        self.assertEqual(self.written, [1, 2, 3])
+        self.assertEqual(self.writer.writes, 3)
+        self.assertEqual(self.writer.max_queue_depth, 1)
+
+    def test_error(self):
+        """
+        A failed write is raised in the task, the writes that were queued after it are discarded
+        :return:
+        """
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError("write failed")
+
+        self.writer.submit(fail)
+        self.writer.submit(self.written.append, 1)
+        release.set()
+        self.assertRaises(ValueError, self.writer.flush)
+        self.assertEqual(self.written, [])
+        self.writer.submit(self.written.append, 2)
+        self.writer.join()
+        self.assertEqual(self.written, [2])
+
+    def test_error_discards_queued_writes(self):
+        """
+        The writes that were queued before a failed write is raised are never executed, also not when the writer
+        continues with them while the error is raised
+        :return:
+        """
+        writer = AsyncWriter(max_queue=4)
+        release, raised = threading.Event(), threading.Event()
+        task_done = writer._queue.task_done
+
+        def delayed_task_done():
+            # The writer continues with the next write only once the error has been raised, or after a timeout
+            task_done()
+            raised.wait(0.5)
+
+        def fail():
+            release.wait(5)
+            raise ValueError("write failed")
+
+        writer._queue.task_done = delayed_task_done
+        writer.submit(fail)
+        writer.submit(self.written.append, "callback")
+        release.set()
+        while writer._error is None:
+            time.sleep(0.001)
+        self.assertRaises(ValueError, writer.submit, self.written.append, "next")
+        raised.set()
+        writer.submit(self.written.append, "next")
+        writer.join()
+        self.assertEqual(self.written, ["next"])
+
+    def test_write_buffer(self):
+        """
+        A write buffer with a writer calls the callbacks after the data has been written, flush() waits for it
+        :return:
+        """
+        save = MagicMock(side_effect=lambda data, prefix: self.written.append("save"))
+        buffer = WriteBuffer(save, writer=self.writer)
+        with buffer:
+            buffer.save_to_db({"a": pd.Series([1.0, 2.0], index=INDEX[:2])}, "s1",
+                              callback=lambda: self.written.append("callback"))
+        buffer.flush()
+        self.assertEqual(self.written, ["save", "callback"])
+        buffer.save_to_db({"a": pd.Series([3.0], index=INDEX[2:])}, "s1")
+        buffer.join()
+        self.assertEqual(save.call_count, 2)
+
+    def test_write_buffer_callbacks_after_write(self):
+        """
+        A write buffer with a writer rolls up the data and calls on_write after the data has been written
+        :return:
+        """
+        save = MagicMock(side_effect=lambda data, prefix: self.written.append("save"))
+        rollup = MagicMock()
+        rollup.update.side_effect = lambda data, prefix: self.written.append("rollup")
+        buffer = WriteBuffer(save, writer=self.writer, rollup=rollup,
+                             on_write=lambda data, prefix: self.written.append("on_write"))
+        buffer.save_to_db({"a": pd.Series([1.0, 2.0], index=INDEX[:2])}, "s1")
+        buffer.flush()
+        self.assertEqual(self.written, ["save", "rollup", "on_write"])
+
+    def test_write_buffer_error(self):
+        """
+        Data that can't be queued because of an earlier failed write is kept in the write buffer
+        :return:
+        """
+        save = MagicMock(side_effect=[ValueError("write failed"), None])
+        on_write = MagicMock()
+        callback = MagicMock()
+        buffer = WriteBuffer(save, writer=self.writer, on_write=on_write)
+        buffer.save_to_db({"a": pd.Series([1.0], index=INDEX[:1])}, "s1")
+        buffer.flush(wait=False)
+        self.writer._queue.join()
+        buffer.save_to_db({"a": pd.Series([2.0], index=INDEX[1:2])}, "s1", callback=callback)
+        self.assertRaises(ValueError, buffer.flush)
+        on_write.assert_not_called()
+        self.assertEqual(buffer.points, 1)
+        buffer.save_to_db({"a": pd.Series([3.0], index=INDEX[2:])}, "s1")
+        buffer.flush()
+        data, prefix = save.call_args[0]
+        self.assertEqual(list(data["a"].values), [2.0, 3.0])
+        on_write.assert_called_once_with(data, "s1")
+        callback.assert_called_once_with()
@@ -0,0 +1,61 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+import pandas as pd
+from misc.backfill import find_missing_days, to_ranges, plan_backfill, execute_plan
+
+DAYS = pd.date_range("2018-06-01", periods=6, freq="D")
+
+
+class BackfillTest(unittest.TestCase):
+    """
+    Class that unittests the backfill planner
+    """
+
+    def test_plan(self):
+        """
+        Only days with fewer loaded points than the source are planned, consecutive days are combined
+        :return:
+        """
+        source_counts = pd.Series([10, 10, 10, 10, 10, 10], index=DAYS)
+        loaded_counts = pd.Series([10, 9, 12, 10], index=DAYS[[0, 1, 3, 4]])
+        self.assertEqual(list(find_missing_days(source_counts, loaded_counts)), list(DAYS[[1, 2, 5]]))
+        self.assertEqual(to_ranges(DAYS[[1, 2, 5]]), [(DAYS[1], DAYS[3]), (DAYS[5], DAYS[5] + pd.Timedelta(days=1))])
+        self.assertEqual(plan_backfill("a", source_counts, loaded_counts),
+                         [("a", DAYS[1], DAYS[3]), ("a", DAYS[5], DAYS[5] + pd.Timedelta(days=1))])
+        self.assertEqual(plan_backfill("a", source_counts, source_counts), [])
+        self.assertEqual(plan_backfill("a", pd.Series([], dtype="float64"), loaded_counts), [])
+
+    def test_execute_plan(self):
+        """
+        The slices are read with a client per worker, the results are handled in the calling thread and failed slices
+        are returned
+        :return:
+        """
+        clients = []
+
+        def create_client():
+            clients.append(MagicMock())
+            return clients[-1]
+
+        def read(client, key, start, stop):
+            if key == "b":
+                raise ValueError("read failed")
+            return key, start
+
+        results = []
+        plan = [(key, day, day + pd.Timedelta(days=1)) for key in ["a", "b", "c"] for day in DAYS]
+        failed = execute_plan(plan, read, create_client,
+                              lambda plan_slice, result: results.append((threading.current_thread(), result)),
+                              max_workers=2)
+        self.assertEqual(sorted(failed), [slice_ for slice_ in plan if slice_[0] == "b"])
+        self.assertEqual(sorted(result for thread, result in results),
+                         sorted((key, start) for key, start, stop in plan if key != "b"))
+        self.assertTrue(all(thread is threading.current_thread() for thread, result in results))
+        self.assertLessEqual(len(clients), 2)
+        for client in clients:
+            client.close_connection.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
 import unittest
 from misc.retention_policy_config \
     import RetentionPolicyConfig, SHARD_GROUP_DURATION_TAG, RP_NAME_TAG, DEFAULT_TAG, TIME, MEASUREMENT
-from unittest.mock import MagicMock
+from misc.shared_cache import SharedFileCache
+from unittest.mock import MagicMock, patch
 from datetime import datetime
+import numpy as np
+import pandas as pd
+import os
+import shutil
+import tempfile
 import time
 
 
@@ -68,6 +74,16 @@ class RetentionPolicyConfigTest(unittest.TestCase):
         rp = self.rpc.get_retention_policy(self.database, "rp1")
         self.assertEquals(self.rpc.get_shard_group_duration_in_seconds(self.database, rp), 6*60*60)
 
+    def test_lookup_tables(self):
+        """
+        Checks the precomputed default retention policy names and shard group durations
+        :return:
+        """
+        self.assertEquals(self.rpc.db_to_default_rp_name, {self.database: "rp1"})
+        self.assertEquals(self.rpc.db_to_shard_group_durations, {self.database: {"rp1": 6*60*60, "rp2": 4*60*60}})
+        self.assertEquals(self.rpc.get_rp_name_and_shard_group_duration(self.database, None), ("rp1", 6*60*60))
+        self.assertEquals(self.rpc.get_rp_name_and_shard_group_duration(self.database, "rp3"), ("rp3", -1))
+
     def test_check_data_age_too_old(self):
         """
         Test that checks how the check_data_age behaves with data that is too old
@@ -75,8 +91,9 @@ class RetentionPolicyConfigTest(unittest.TestCase):
         """
         data = [{TIME: int(time.mktime(datetime(2018, 1, 21, 16, 30).timetuple())) * 1000000000, MEASUREMENT: 1.0},
                 {TIME: int(time.mktime(datetime(2018, 1, 21, 16, 30).timetuple())) * 1000000000, MEASUREMENT: 2.0}]
-        time.time = MagicMock(return_value=int(time.mktime(datetime(2018, 1, 21, 23, 30).timetuple())))
-        self.rpc.check_data_age(self.database, "rp1", None, data)
+        now = int(time.mktime(datetime(2018, 1, 21, 23, 30).timetuple()))
+        with patch("misc.retention_policy_config.time.time", return_value=now):
+            self.rpc.check_data_age(self.database, "rp1", None, data)
         self.rpc.logger.info.assert_called()
 
     def test_check_data_age_ok(self):
@@ -86,10 +103,72 @@ class RetentionPolicyConfigTest(unittest.TestCase):
         """
         data = [{TIME: int(time.mktime(datetime(2018, 1, 21, 13, 30).timetuple())) * 1000000000, MEASUREMENT: 1.0},
                 {TIME: int(time.mktime(datetime(2018, 1, 21, 12, 00).timetuple())) * 1000000000, MEASUREMENT: 2.0}]
-        time.time = MagicMock(return_value=int(time.mktime(datetime(2018, 1, 21, 14, 30).timetuple())))
-        self.rpc.check_data_age(self.database, "rp1", None, data)
+        now = int(time.mktime(datetime(2018, 1, 21, 14, 30).timetuple()))
+        with patch("misc.retention_policy_config.time.time", return_value=now):
+            self.rpc.check_data_age(self.database, "rp1", None, data)
         self.rpc.logger.info.assert_not_called()
 
+    def test_shared_cache(self):
+        """
+        Test that checks that a second process reads the retention policies from the shared cache, instead of
+        querying the database, until the cache is refreshed
+        :return:
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            cache = SharedFileCache(os.path.join(directory, "rp.json"), ttl=60)
+            RetentionPolicyConfig(self.create_dbclient_mock(), self.machines, self.create_logger_mock(), cache)
+            dbclient = self.create_dbclient_mock()
+            rpc = RetentionPolicyConfig(dbclient, self.machines, self.create_logger_mock(), cache)
+            dbclient.get_list_retention_policies.assert_not_called()
+            self.assertEquals(rpc.get_default_retention_policy_name(self.database), "rp1")
+            rpc.refresh()
+            dbclient.get_list_retention_policies.assert_called_once_with(self.database)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_shared_cache_per_machines(self):
+        """
+        Test that checks that processes with another set of machines use another cache file
+        :return:
+        """
+        path = os.path.join(tempfile.gettempdir(), "rp_{0}.json")
+        cache = RetentionPolicyConfig.create_shared_cache(None, self.machines, path=path)
+        self.assertEquals(cache.path, RetentionPolicyConfig.create_shared_cache(None, self.machines, path=path).path)
+        other_machines = self.machines + [{"source_nr": "9999"}]
+        self.assertNotEquals(cache.path, RetentionPolicyConfig.create_shared_cache(None, other_machines,
+                                                                                   path=path).path)
+
+    def test_check_frame_data_age(self):
+        """
+        Test that checks that all measurements with old data in a DataFrame, Series or array are reported in one
+        log record
+        :return:
+        """
+        old = pd.Timestamp(datetime(2018, 1, 21, 16, 30)).tz_localize("UTC")
+        recent = pd.Timestamp(datetime(2018, 1, 21, 22, 30)).tz_localize("UTC")
+        df = pd.DataFrame({"s1.old": [1.0, 2.0], "s1.recent": [np.nan, 2.0]}, index=[old, recent])
+        with patch("misc.retention_policy_config.time.time", return_value=(recent.value / 1000000000) + 60):
+            self.rpc.check_frame_data_age(self.database, "rp1", "job", {
+                "frame": df, "s1.array": np.array([old.value, recent.value]), "s1.series": df["s1.recent"]})
+        self.rpc.logger.info.assert_called_once()
+        message = self.rpc.logger.info.call_args[0][0]
+        self.assertIn("s1.old", message)
+        self.assertIn("s1.array", message)
+        self.assertNotIn("s1.recent", message)
+        self.assertNotIn("s1.series", message)
+
+    def test_get_oldest_times(self):
+        """
+        Checks that the oldest timestamp of the non-null values is determined per measurement
+        :return:
+        """
+        index = pd.to_datetime([3, 1, 2]).tz_localize("UTC")
+        df = pd.DataFrame({"a": [1.0, np.nan, 1.0], "b": [np.nan, np.nan, np.nan]}, index=index)
+        self.assertEquals(RetentionPolicyConfig.get_oldest_times(df), {"a": 2})
+        self.assertEquals(RetentionPolicyConfig.get_oldest_times(df["a"]), {"a": 2})
+        self.assertEquals(RetentionPolicyConfig.get_oldest_times({"c": np.array([5, 4])}), {"c": 4})
+
     @staticmethod
     def create_logger_mock():
         """
@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+import statsmodels.api as sm
+from misc.rolling_ols import RollingOLS
+
+
+class RollingOLSTest(unittest.TestCase):
+    """
+    Class that unittests the RollingOLS class against statsmodels
+    """
+
+    def setUp(self):
+        random = np.random.RandomState(1)
+        self.x = random.uniform(1, 10, size=(200, 2))
+        self.y = self.x.dot([0.5, 2.0]) + random.normal(0, 0.5, size=200)
+        self.x[[3, 40, 41], 1] = np.nan
+        self.y[[10, 120]] = np.nan
+
+    def assert_statsmodels(self, regression, x, start, stop):
+        expected = sm.OLS(self.y[start:stop], x[start:stop], missing="drop").fit()
+        params, rsquared = regression.fit()
+        np.testing.assert_allclose(params, expected.params)
+        self.assertAlmostEqual(rsquared, expected.rsquared)
+
+    def test_moving_window(self):
+        """
+        The statistics of a moving window give the same fit as refitting the window
+        :return:
+        """
+        regression = RollingOLS(self.y, self.x)
+        for start in range(0, 140, 20):
+            regression.move(start, start + 60)
+            self.assert_statsmodels(regression, self.x, start, start + 60)
+        regression.move(170, 200)
+        self.assert_statsmodels(regression, self.x, 170, 200)
+
+    def test_single_regressor(self):
+        """
+        A 1-dimensional x is a single regressor
+        :return:
+        """
+        regression = RollingOLS(self.y, self.x[:, 1])
+        regression.move(0, 50)
+        regression.move(25, 80)
+        self.assert_statsmodels(regression, self.x[:, 1:], 25, 80)
+
+    def test_empty_window(self):
+        """
+        An empty window has no fit, and the window can't move backwards
+        :return:
+        """
+        regression = RollingOLS(self.y, self.x)
+        regression.move(5, 5)
+        params, rsquared = regression.fit()
+        self.assertTrue(np.isnan(params).all())
+        self.assertTrue(np.isnan(rsquared))
+        self.assertRaises(ValueError, regression.move, 0, 10)
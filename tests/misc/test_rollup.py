@@ -0,0 +1,116 @@
+import threading
+import unittest
+import numpy as np
+import pandas as pd
+from misc.rollup import HourlyRollup, aggregate, COUNT, MIN, MAX, SUM, FIRST, LAST
+
+START = pd.Timestamp("2018-06-01", tz="UTC")
+
+
+def create_series(minutes, values=None):
+    index = START + pd.to_timedelta(minutes, unit="min")
+    return pd.Series(values if values is not None else np.arange(len(minutes), dtype=np.float64), index=index)
+
+
+class HourlyRollupTest(unittest.TestCase):
+    """
+    Class that unittests the HourlyRollup class
+    """
+
+    def test_aggregate(self):
+        """
+        The points are rolled up per UTC hour, missing values are left out
+        :return:
+        """
+        series = create_series([10, 20, 50, 130], [3.0, 1.0, np.nan, 5.0])
+        series.index = series.index.tz_convert("Europe/Amsterdam")
+        rollup = aggregate(series)
+        self.assertEqual(list(rollup.index), [START, START + pd.Timedelta(hours=2)])
+        self.assertEqual(list(rollup.iloc[0][[COUNT, MIN, MAX, SUM, FIRST, LAST]]), [2.0, 1.0, 3.0, 4.0, 3.0, 1.0])
+        self.assertEqual(rollup[COUNT].iloc[1], 1)
+
+    def test_update(self):
+        """
+        Written data is merged into the rollup, points that have been rolled up already are skipped
+        :return:
+        """
+        rollup = HourlyRollup()
+        rollup.update({"a": create_series([30, 50]), "b": None}, "s1")
+        rollup.update({"a": create_series([50, 70, 80], [9.0, 2.0, 4.0])}, "s1")
+        expected = aggregate(pd.concat([create_series([30, 50]), create_series([70, 80], [2.0, 4.0])]))
+        pd.testing.assert_frame_equal(rollup.get("s1.a"), expected)
+        self.assertIsNone(rollup.get("s1.b"))
+        self.assertFalse(rollup.is_complete("s1.a", START))
+        self.assertTrue(rollup.is_complete("s1.a", START + pd.Timedelta(hours=1)))
+        self.assertEqual(len(rollup.get("s1.a", START + pd.Timedelta(minutes=70))), 1)
+
+    def test_late_points(self):
+        """
+        Late points in hours without points are merged into the rollup, late points in other hours are skipped
+        :return:
+        """
+        rollup = HourlyRollup()
+        rollup.update({"s1.a": create_series([0, 120, 180])})
+        rollup.update({"s1.a": create_series([0, 60, 70, 120, 180, 240])})
+        self.assertEqual(list(rollup.get("s1.a").index), [START + pd.Timedelta(hours=hour) for hour in range(5)])
+        self.assertEqual(list(rollup.get("s1.a")[COUNT]), [1, 2, 1, 1, 1])
+
+    def test_load(self):
+        """
+        Data that is read from the database replaces the rollup of the hours it covers, later writes are merged
+        :return:
+        """
+        rollup = HourlyRollup(retention=pd.Timedelta(hours=3))
+        rollup.update({"s1.a": create_series([200, 210])})
+        rollup.load("s1.a", create_series([5, 70, 130, 200, 210]), START + pd.Timedelta(minutes=1),
+                    START + pd.Timedelta(minutes=220))
+        self.assertTrue(rollup.is_complete("s1.a", START + pd.Timedelta(hours=1)))
+        self.assertEqual(list(rollup.get("s1.a")[COUNT]), [1, 1, 2])
+        # The hours before the retention are dropped
+        rollup.update({"s1.a": create_series([210, 400])})
+        self.assertEqual(list(rollup.get("s1.a")[COUNT]), [2, 1])
+        self.assertTrue(rollup.is_complete("s1.a", START + pd.Timedelta(hours=3)))
+        self.assertFalse(rollup.is_complete("s1.a", START + pd.Timedelta(hours=2)))
+        # Data that ends in an hour with later rolled up points leaves a hole in the rollup
+        rollup = HourlyRollup(retention=None)
+        rollup.update({"s1.a": create_series([200, 210])})
+        rollup.load("s1.a", create_series([70, 130, 190]), START + pd.Timedelta(hours=1),
+                    START + pd.Timedelta(minutes=205))
+        self.assertEqual(list(rollup.get("s1.a")[COUNT]), [1, 1, 2])
+        self.assertFalse(rollup.is_complete("s1.a", START + pd.Timedelta(hours=1)))
+        rollup.invalidate(["s1.a"])
+        self.assertIsNone(rollup.get("s1.a"))
+
+    def test_load_aggregates(self):
+        """
+        Hourly aggregates that are calculated by the database seed the rollup like the raw data they cover
+        :return:
+        """
+        series = create_series([5, 70, 130, 200, 210])
+        rollup = HourlyRollup(retention=None)
+        rollup.update({"s1.a": create_series([200, 210])})
+        rollup.load_aggregates("s1.a", aggregate(series), series.index.max(), START + pd.Timedelta(minutes=1),
+                               START + pd.Timedelta(minutes=220))
+        expected = HourlyRollup(retention=None)
+        expected.update({"s1.a": create_series([200, 210])})
+        expected.load("s1.a", series, START + pd.Timedelta(minutes=1), START + pd.Timedelta(minutes=220))
+        pd.testing.assert_frame_equal(rollup.get("s1.a"), expected.get("s1.a"))
+        self.assertTrue(rollup.is_complete("s1.a", START + pd.Timedelta(hours=1)))
+        rollup.update({"s1.a": create_series([210, 230])})
+        self.assertEqual(list(rollup.get("s1.a")[COUNT]), [1, 1, 3])
+
+    def test_lock(self):
+        """
+        The rollup is read while it is locked by a write, e.g. by the thread of an AsyncWriter
+        :return:
+        """
+        rollup = HourlyRollup()
+        results = []
+        reader = threading.Thread(target=lambda: results.append(rollup.get("s1.a")))
+        with rollup._lock:
+            reader.start()
+            rollup.update({"s1.a": create_series([30])})
+            reader.join(0.1)
+            self.assertEqual(results, [])
+        reader.join()
+        self.assertEqual(list(results[0][COUNT]), [1])
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+from misc.shared_cache import SharedFileCache
+
+
+class SharedFileCacheTest(unittest.TestCase):
+    """
+    Class that unittests the SharedFileCache class
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.json")
+        self.cache = SharedFileCache(self.path, ttl=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_populate_once(self):
+        """
+        The loader is only called by the first process, other processes read the cached data
+        :return:
+        """
+        loader = MagicMock(return_value={"s1": [1, 2]})
+        self.assertEqual(self.cache.populate("v1", loader), {"s1": [1, 2]})
+        other_process_cache = SharedFileCache(self.path, ttl=60)
+        self.assertEqual(other_process_cache.populate("v1", loader), {"s1": [1, 2]})
+        self.assertEqual(loader.call_count, 1)
+        self.assertFalse(os.path.exists(self.path + ".lock"))
+
+    def test_version_and_invalidate(self):
+        """
+        Data with another version stamp or invalidated data is not returned
+        :return:
+        """
+        self.cache.put({"s1": []}, "v1")
+        self.assertEqual(self.cache.get("v1"), {"s1": []})
+        self.assertIsNone(self.cache.get("v2"))
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.get("v1"))
+
+    def test_expired(self):
+        """
+        Data that is older than the time to live is not returned
+        :return:
+        """
+        self.cache.put({"s1": []}, "v1")
+        self.assertIsNone(SharedFileCache(self.path, ttl=-1).get("v1"))
+
+    def test_stale_lock_is_removed(self):
+        """
+        A lock that is left behind by a crashed process doesn't block populating the cache
+        :return:
+        """
+        open(self.path + ".lock", "w").close()
+        os.utime(self.path + ".lock", (time.time() - 120, time.time() - 120))
+        self.assertEqual(self.cache.populate("v1", lambda: {"s1": []}), {"s1": []})
+        self.assertEqual(self.cache.get("v1"), {"s1": []})
+
+
+if __name__ == '__main__':
+    unittest.main()
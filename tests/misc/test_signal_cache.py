@@ -0,0 +1,132 @@
+import unittest
+import numpy as np
+import pandas as pd
+from misc.signal_cache import SignalCache, get_signal_names, to_read_name
+
+START = pd.Timestamp("2018-06-01", tz="UTC")
+INDEX = pd.date_range(START, periods=10 * 24, freq="60min")
+DATA = {"s1.a": pd.Series(np.arange(len(INDEX), dtype="float64"), index=INDEX),
+        "s1.b": pd.Series(np.arange(len(INDEX), dtype="float64") * 2, index=INDEX)}
+
+
+class FakeDatabase:
+    """
+    Class that mimics shared.get_signals and records the requests
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def get_signals(self, signals, user, from_time=None, to_time=None):
+        self.requests.append((list(signals), from_time, to_time))
+        columns = [DATA[s].loc[from_time:to_time].rename(s) for s in signals if s in DATA]
+        return pd.concat(columns, axis=1) if columns else pd.DataFrame()
+
+
+class SignalCacheTest(unittest.TestCase):
+    """
+    Class that unittests the SignalCache class
+    """
+
+    def setUp(self):
+        self.database = FakeDatabase()
+        self.cache = SignalCache(self.database.get_signals)
+
+    def test_sub_range_is_served_locally(self):
+        """
+        A sub-range of a fetched range doesn't hit the database
+        :return:
+        """
+        self.cache.get_signals(["s1.a", "s1.b"], "admin", START, START + pd.Timedelta(days=5))
+        df = self.cache.get_signals(["s1.a", "s1.b"], "admin", START + pd.Timedelta(days=1),
+                                    START + pd.Timedelta(days=2))
+        self.assertEqual(len(self.database.requests), 1)
+        expected = self.database.get_signals(["s1.a", "s1.b"], "admin", START + pd.Timedelta(days=1),
+                                             START + pd.Timedelta(days=2))
+        pd.testing.assert_frame_equal(df, expected)
+        self.assertEqual(list(df.columns), ["s1.a", "s1.b"])
+
+    def test_only_missing_edges_are_fetched(self):
+        """
+        A partially overlapping range only fetches the missing edges, signals with the same gaps are fetched together
+        :return:
+        """
+        self.cache.get_signals(["s1.a", "s1.b"], "admin", START + pd.Timedelta(days=2), START + pd.Timedelta(days=4))
+        df = self.cache.get_signals(["s1.a", "s1.b"], "admin", START, START + pd.Timedelta(days=6))
+        self.assertEqual(self.database.requests[1:], [
+            (["s1.a", "s1.b"], START, START + pd.Timedelta(days=2)),
+            (["s1.a", "s1.b"], START + pd.Timedelta(days=4), START + pd.Timedelta(days=6))])
+        pd.testing.assert_series_equal(df["s1.a"], DATA["s1.a"].loc[START:START + pd.Timedelta(days=6)].rename("s1.a"),
+                                       check_freq=False)
+
+    def test_unknown_signal(self):
+        """
+        A signal without data is left out of the result, and is not fetched again
+        :return:
+        """
+        df = self.cache.get_signals(["s1.a", "s1.x"], "admin", START, START + pd.Timedelta(days=1))
+        self.cache.get_signals(["s1.x"], "admin", START, START + pd.Timedelta(days=1))
+        self.assertEqual(list(df.columns), ["s1.a"])
+        self.assertEqual(len(self.database.requests), 1)
+
+    def test_invalidate(self):
+        """
+        Written signals are fetched again
+        :return:
+        """
+        self.cache.get_signals(["s1.a", "s1.b"], "admin", START, START + pd.Timedelta(days=1))
+        self.cache.invalidate_data({"a": None}, "s1")
+        self.cache.get_signals(["s1.a", "s1.b"], "admin", START, START + pd.Timedelta(days=1))
+        self.assertEqual(self.database.requests[1][0], ["s1.a"])
+
+    def test_invalidate_tagged_signals(self):
+        """
+        Signals that are written with escaped tags are invalidated under the names they are read with
+        :return:
+        """
+        self.cache.get_signals(["s1.a{module=1A}"], "admin", START, START + pd.Timedelta(days=1))
+        self.cache.invalidate_data({"a{{module:1A}}": None}, "s1")
+        self.cache.get_signals(["s1.a{module=1A}"], "admin", START, START + pd.Timedelta(days=1))
+        self.assertEqual(len(self.database.requests), 2)
+        self.assertEqual(to_read_name("s1.a_Sens{{module:1A}}"), "s1.a_Sens{module=1A}")
+
+    def test_expired_signals_are_fetched_again(self):
+        """
+        A signal that has been cached for longer than the ttl is fetched again completely
+        :return:
+        """
+        self.cache.get_signals(["s1.a"], "admin", START, START + pd.Timedelta(days=1))
+        self.cache.get_signals(["s1.a"], "admin", START, START + pd.Timedelta(days=1))
+        self.cache.ttl = pd.Timedelta(0)
+        self.cache.get_signals(["s1.a"], "admin", START, START + pd.Timedelta(days=1))
+        self.assertEqual(len(self.database.requests), 2)
+        self.assertEqual(self.database.requests[1][1:], (START, START + pd.Timedelta(days=1)))
+
+    def test_eviction(self):
+        """
+        The least recently used signal is evicted when the cache exceeds its memory bound
+        :return:
+        """
+        self.cache.max_bytes = DATA["s1.a"].memory_usage(index=True) * 1.5
+        self.cache.get_signals(["s1.a"], "admin", INDEX[0], INDEX[-1])
+        self.cache.get_signals(["s1.b"], "admin", INDEX[0], INDEX[-1])
+        self.cache.get_signals(["s1.b"], "admin", INDEX[0], INDEX[-1])
+        self.cache.get_signals(["s1.a"], "admin", INDEX[0], INDEX[-1])
+        self.assertEqual([request[0] for request in self.database.requests], [["s1.a"], ["s1.b"], ["s1.a"]])
+
+    def test_recent_data_is_fetched_again(self):
+        """
+        Data that is younger than the settle time is not considered to be complete
+        :return:
+        """
+        now = pd.Timestamp.now(tz="UTC")
+        self.cache.get_signals(["s1.a"], "admin", now - pd.Timedelta(days=1), now)
+        self.cache.get_signals(["s1.a"], "admin", now - pd.Timedelta(days=1), now)
+        self.assertEqual(len(self.database.requests), 2)
+        self.assertLess(self.database.requests[1][1], now)
+        self.assertGreater(self.database.requests[1][1], now - pd.Timedelta(hours=2))
+
+    def test_get_signal_names(self):
+        self.assertEqual(get_signal_names(pd.DataFrame(columns=["a", "b"])), ["a", "b"])
+        self.assertEqual(get_signal_names({"a": None}, "s1"), ["s1.a"])
+        self.assertEqual(get_signal_names(None), [])
@@ -0,0 +1,37 @@
+import unittest
+from misc.signal_pattern import SignalPattern
+
+PATTERN = SignalPattern("s{source}.DLPA{dlpa}_RFGEN{gen}_PWR{{module={module}{side}}}",
+                        [("dlpa", range(0, 2)), ("gen", range(1, 3)), ("module", range(1, 3)), ("side", ["A", "B"])])
+
+
+class SignalPatternTest(unittest.TestCase):
+    """
+    Class that unittests the SignalPattern class
+    """
+
+    def test_names(self):
+        """
+        The fields are expanded in the given order, the expansion is done once per source
+        :return:
+        """
+        names = PATTERN.names(source=62442)
+        self.assertEqual(len(names), 16)
+        self.assertEqual(names[:3], ["s62442.DLPA0_RFGEN1_PWR{module=1A}", "s62442.DLPA0_RFGEN1_PWR{module=1B}",
+                                     "s62442.DLPA0_RFGEN1_PWR{module=2A}"])
+        self.assertIs(PATTERN.names(source=62442), names)
+        self.assertEqual(PATTERN.names(source=1)[-1], "s1.DLPA1_RFGEN2_PWR{module=2B}")
+
+    def test_parse(self):
+        """
+        Signal names are parsed into the values of the fields, names of other signals are left out
+        :return:
+        """
+        self.assertEqual(PATTERN.parse("s62442.DLPA1_RFGEN2_PWR{module=1B}"),
+                         {"source": "62442", "dlpa": "1", "gen": "2", "module": "1", "side": "B"})
+        self.assertIsNone(PATTERN.parse("s62442.DLPA5_RFGEN2_PWR{module=1B}"))
+        self.assertIsNone(PATTERN.parse("s62442.DLPA1_RFGEN2_PWR{module=1B}.extra"))
+        parsed = PATTERN.parse_columns(["s1.DLPA0_RFGEN1_PWR{module=2A}", "s1.DLPA0_AVERAGE"])
+        self.assertEqual(list(parsed.index), ["s1.DLPA0_RFGEN1_PWR{module=2A}"])
+        self.assertEqual(list(parsed.columns), ["source", "dlpa", "gen", "module", "side"])
+        self.assertEqual(parsed["module"].iloc[0], "2")
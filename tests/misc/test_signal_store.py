@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from misc.signal_cache import SignalCache
+from misc.signal_store import SignalStore
+
+TODAY = pd.Timestamp.now(tz="UTC").floor("D")
+START = TODAY - pd.Timedelta(days=5)
+INDEX = pd.date_range(START, pd.Timestamp.now(tz="UTC"), freq="30min")
+DATA = {"s1.a{module=1A}": pd.Series(np.arange(len(INDEX), dtype="float64"), index=INDEX),
+        "s1.b": pd.Series(np.arange(len(INDEX), dtype="float64") * 2, index=INDEX)}
+
+
+class FakeDatabase:
+    """
+    Class that mimics shared.get_signals and records the requests
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def get_signals(self, signals, user, from_time=None, to_time=None):
+        self.requests.append((list(signals), from_time, to_time))
+        columns = [DATA[s].loc[from_time:to_time].rename(s) for s in signals if s in DATA]
+        return pd.concat(columns, axis=1) if columns else pd.DataFrame()
+
+
+class SignalStoreTest(unittest.TestCase):
+    """
+    Class that unittests the SignalStore class
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.database = FakeDatabase()
+        self.store = SignalStore(self.directory, self.database.get_signals, settle_time=pd.Timedelta(0),
+                                 revalidate_time=pd.Timedelta(0))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_historical_days_are_read_from_disk(self):
+        """
+        Complete days are fetched once, after that only today is fetched from the database
+        :return:
+        """
+        signals = ["s1.a{module=1A}", "s1.b", "s1.unknown"]
+        from_time = START + pd.Timedelta(hours=6)
+        to_time = INDEX[-1]
+        expected = self.database.get_signals(signals, "admin", from_time, to_time)
+        first = self.store.get_signals(signals, "admin", from_time=from_time, to_time=to_time)
+        second = self.store.get_signals(signals, "admin", from_time=from_time, to_time=to_time)
+        pd.testing.assert_frame_equal(first, expected, check_freq=False, check_index_type=False)
+        pd.testing.assert_frame_equal(second, expected, check_freq=False, check_index_type=False)
+        self.assertEqual(self.database.requests[1:], [
+            (signals, START, TODAY), (signals, TODAY, to_time), (signals, TODAY, to_time)])
+        self.assertTrue(os.path.exists(self.store.get_file("s1.unknown", START, "{0}.times.npy")))
+
+    def test_missing_days_are_fetched_per_run(self):
+        """
+        Missing days that are not consecutive are fetched separately, days that are not final are fetched again
+        :return:
+        """
+        days = list(pd.date_range(START, periods=4, freq="D"))
+        self.store.store_missing_days(["s1.b"], "admin", days[1:2])
+        self.database.requests = []
+        self.store.store_missing_days(["s1.b"], "admin", days)
+        self.assertEqual([request[1:] for request in self.database.requests],
+                         [(days[0], days[1]), (days[2], days[3] + pd.Timedelta(days=1))])
+        self.database.requests = []
+        self.store.revalidate_time = pd.Timedelta(days=30)
+        self.store.store_missing_days(["s1.b"], "admin", days)
+        self.assertEqual([request[1:] for request in self.database.requests],
+                         [(days[0], days[3] + pd.Timedelta(days=1))])
+        self.assertTrue(self.store.is_stored("s1.b", days[0]))
+
+    def test_invalidate(self):
+        """
+        Invalidated signals are fetched again, through the SignalCache as well
+        :return:
+        """
+        cache = SignalCache(self.database.get_signals, store=self.store)
+        to_time = TODAY - pd.Timedelta(minutes=30)
+        cache.get_signals(["s1.b"], "admin", START, to_time)
+        cache.invalidate(["s1.b"])
+        self.assertFalse(self.store.is_stored("s1.b", START))
+        df = cache.get_signals(["s1.b"], "admin", START, to_time)
+        self.assertEqual(len(self.database.requests), 2)
+        pd.testing.assert_series_equal(df["s1.b"], DATA["s1.b"].loc[START:to_time].rename("s1.b"),
+                                       check_freq=False, check_index_type=False)
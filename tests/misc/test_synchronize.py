@@ -0,0 +1,90 @@
+import threading
+import unittest
+from misc.synchronize import ReadWriteLock, atomic_snapshot, freeze
+
+
+class Settings:
+    """
+    Read-mostly state that is reloaded with an atomic snapshot
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._snapshot = None
+        self.load()
+
+    @atomic_snapshot("_snapshot")
+    def load(self):
+        self.version += 1
+        return {"version": self.version, "values": [self.version] * 3}
+
+
+class SynchronizeTest(unittest.TestCase):
+    """
+    Class that unittests the read/write lock and the atomic snapshot
+    """
+
+    def test_readers_share_the_lock(self):
+        """
+        Two readers can hold the lock at the same time, a writer has to wait for them
+        :return:
+        """
+        lock = ReadWriteLock()
+        both_reading = threading.Barrier(3, timeout=5)
+        release = threading.Event()
+        writer_waiting = threading.Event()
+        events = []
+
+        def read():
+            with lock.read_locked():
+                # The barrier is only passed when both readers hold the lock at the same time
+                both_reading.wait()
+                release.wait(5)
+                events.append("read")
+
+        def write():
+            writer_waiting.set()
+            with lock.write_locked():
+                events.append("write")
+
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        for reader in readers:
+            reader.start()
+        both_reading.wait()
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer_waiting.wait(5)
+        writer.join(0.2)
+        self.assertTrue(writer.is_alive())
+        self.assertEqual(events, [])
+        release.set()
+        for thread in readers + [writer]:
+            thread.join(5)
+        self.assertEqual(events, ["read", "read", "write"])
+
+    def test_atomic_snapshot(self):
+        """
+        A reload swaps in a new, immutable snapshot and leaves the snapshot of a reader untouched
+        :return:
+        """
+        settings = Settings()
+        snapshot = settings._snapshot
+        settings.load()
+        self.assertEqual(snapshot["version"], 1)
+        self.assertEqual(settings._snapshot["version"], 2)
+        self.assertEqual(settings._snapshot["values"], (2, 2, 2))
+        with self.assertRaises(TypeError):
+            snapshot["version"] = 3
+
+    def test_freeze(self):
+        """
+        Nested dictionaries and lists are frozen
+        :return:
+        """
+        frozen = freeze({"a": [{"b": 1}]})
+        with self.assertRaises(TypeError):
+            frozen["a"][0]["b"] = 2
+
+
+if __name__ == '__main__':
+    unittest.main()
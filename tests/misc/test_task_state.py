@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from misc.task_state import TaskState
+
+
+class TaskStateTest(unittest.TestCase):
+    """
+    Class that unittests the TaskState class
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "task.state")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_and_load(self):
+        """
+        The saved state is loaded by the next run, changes to a copy only take effect when they are set
+        :return:
+        """
+        state = TaskState(self.path)
+        progress = state.get("s1.collector")
+        self.assertEqual(progress, {})
+        progress["last"] = pd.Timestamp("2018-06-01", tz="UTC")
+        progress["tail"] = pd.DataFrame({"a": [1.0, 2.0]})
+        self.assertEqual(state.get("s1.collector"), {})
+        state.set("s1.collector", progress)
+        state.save()
+        loaded = TaskState(self.path).get("s1.collector")
+        self.assertEqual(loaded["last"], pd.Timestamp("2018-06-01", tz="UTC"))
+        pd.testing.assert_frame_equal(loaded["tail"], progress["tail"])
+        state.reset()
+        state.save()
+        self.assertEqual(TaskState(self.path).get("s1.collector"), {})
+
+    def test_unreadable_state(self):
+        """
+        A corrupt state file results in an empty state
+        :return:
+        """
+        with open(self.path, "w") as f:
+            f.write("corrupt")
+        self.assertEqual(TaskState(self.path).get("s1.collector"), {})
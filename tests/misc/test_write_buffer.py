@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import MagicMock
+import pandas as pd
+from misc.write_buffer import WriteBuffer
+
+INDEX = pd.date_range("2018-06-01", periods=6, freq="60min", tz="UTC")
+
+
+class WriteBufferTest(unittest.TestCase):
+    """
+    Class that unittests the WriteBuffer class
+    """
+
+    def setUp(self):
+        self.save = MagicMock()
+        self.on_write = MagicMock()
+        self.buffer = WriteBuffer(self.save, on_write=self.on_write)
+
+    def test_coalesce(self):
+        """
+        Writes with the same prefix and options are combined into one write, when the context is exited
+        :return:
+        """
+        callback = MagicMock()
+        with self.buffer:
+            self.buffer.save_to_db({"a": pd.Series([1.0, 2.0, 3.0], index=INDEX[:3])}, "s1", job_name="job")
+            self.buffer.save_to_db({"a": pd.Series([4.0, 5.0, 6.0], index=INDEX[2:5]), "b": None}, "s1",
+                                   callback=callback, job_name="job")
+            self.buffer.save_to_db({"c": pd.Series([1.0], index=INDEX[:1])}, "s1", job_name="other")
+            self.buffer.save_to_db(pd.DataFrame({"d": [1.0]}, index=INDEX[:1]), "s1", job_name="job")
+            self.save.assert_not_called()
+            callback.assert_not_called()
+        self.assertEqual(self.save.call_count, 2)
+        data, prefix = self.save.call_args_list[0][0]
+        self.assertEqual(prefix, "s1")
+        self.assertEqual(self.save.call_args_list[0][1], {"job_name": "job"})
+        self.assertEqual(list(data.keys()), ["a", "d"])
+        self.assertEqual(list(data["a"].values), [1.0, 2.0, 4.0, 5.0, 6.0])
+        self.assertEqual(self.save.call_args_list[1][1], {"job_name": "other"})
+        callback.assert_called_once_with()
+        self.on_write.assert_any_call(data, "s1")
+        self.assertEqual(self.buffer.written_points, 8)
+
+    def test_rollup(self):
+        """
+        The written data is rolled up
+        :return:
+        """
+        self.buffer.rollup = MagicMock()
+        with self.buffer:
+            self.buffer.save_to_db({"a": pd.Series([1.0, 2.0], index=INDEX[:2])}, "s1")
+        data, prefix = self.buffer.rollup.update.call_args[0]
+        self.assertEqual(list(data.keys()), ["a"])
+        self.assertEqual(prefix, "s1")
+
+    def test_check_age(self):
+        """
+        The age of the data is checked per write, against the database of the prefix or of the signal names
+        :return:
+        """
+        self.buffer.check_age = MagicMock()
+        with self.buffer:
+            self.buffer.save_to_db({"a": pd.Series([1.0, 2.0], index=INDEX[:2])}, "s1.type", job_name="job")
+            self.buffer.save_to_db({"s2.b": pd.Series([1.0], index=INDEX[:1])})
+        self.assertEqual([call[0][:3] for call in self.buffer.check_age.call_args_list],
+                         [("s1", None, "job"), ("s2", None, None)])
+        self.assertEqual(list(self.buffer.check_age.call_args_list[0][0][3].keys()), ["a"])
+
+    def test_flush_at_threshold(self):
+        """
+        The buffer is flushed as soon as it contains max_points points
+        :return:
+        """
+        self.buffer.max_points = 5
+        self.buffer.save_to_db({"a": pd.Series([1.0, 2.0, 3.0], index=INDEX[:3])})
+        self.save.assert_not_called()
+        self.buffer.save_to_db({"a": pd.Series([4.0, 5.0, 6.0], index=INDEX[3:])})
+        self.save.assert_called_once()
+        self.assertEqual(self.buffer.points, 0)
+        self.buffer.flush()
+        self.save.assert_called_once()
@@ -1,5 +1,5 @@
 import unittest
-from plugins.channel_sensitivities import CachedSensitivityData
+from plugins.channel_sensitivities import CachedSensitivityData, get_sanity_masks
 import pandas as pd
 import numpy as np
 
@@ -177,6 +177,17 @@ class ChannelSensitivitiesTest(unittest.TestCase):
             101.0, dt_end)
         assert(np.isnan(CachedSensitivityData().calculate_variation(dt_end, MODULE)))
 
+    @staticmethod
+    def test_sanity_masks():
+
+        # module a is above 1 in all 300 rows, module b only in the last 150 rows, with a missing value
+        values_b = np.r_[np.zeros(150), np.full(150, 2.0)]
+        values_b[200] = np.nan
+        df_raw_signals = pd.DataFrame({"a": np.full(300, 2.0), "b": values_b},
+                                      index=pd.date_range("2018-06-02", periods=300, freq="1min", tz="UTC"))
+        masks = get_sanity_masks(df_raw_signals, [slice(0, 150), slice(50, 250), slice(100, 300), slice(0, 0)])
+        assert((masks == [[True, False], [True, False], [True, True], [False, False]]).all())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from tools.copyfiles import checksummed_copy
+
+CONTENT = os.urandom(10000)
+
+
+class InterruptedCopy(Exception):
+    pass
+
+
+class ChecksummedCopyTest(unittest.TestCase):
+    """
+    Class that unittests the chunked, checksummed copying of files, including the resuming of interrupted copies
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.src = os.path.join(self.root, "source.log")
+        self.destination_file = os.path.join(self.root, "destination.log")
+        with open(self.src, "wb") as f:
+            f.write(CONTENT)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def read_destination(self):
+        with open(self.destination_file, "rb") as f:
+            return f.read()
+
+    def test_copy_file(self):
+        """
+        The content is copied, the checksum is calculated and no temporary file remains
+        :return:-
+        """
+        checksum = checksummed_copy.copy_file(self.src, self.destination_file, chunk_size=1024)
+        self.assertEqual(self.read_destination(), CONTENT)
+        self.assertEqual(checksum, hashlib.sha1(CONTENT).hexdigest())
+        self.assertFalse(os.path.exists(checksummed_copy.get_partial_file(self.destination_file)))
+
+    def test_resume_interrupted_copy(self):
+        """
+        An interrupted copy leaves no destination file and is resumed from the last checkpoint
+        :return:-
+        """
+        checkpoints = []
+
+        def interrupt(offset):
+            checkpoints.append(offset)
+            raise InterruptedCopy()
+
+        with self.assertRaises(InterruptedCopy):
+            checksummed_copy.copy_file(self.src, self.destination_file, checkpoint=interrupt, chunk_size=1024,
+                                       checkpoint_size=4096)
+        self.assertFalse(os.path.exists(self.destination_file))
+        self.assertEqual(checkpoints, [4096])
+
+        # Garbage after the checkpoint (e.g. unsynced data) is truncated when resuming
+        with open(checksummed_copy.get_partial_file(self.destination_file), "ab") as f:
+            f.write(b"garbage")
+        checksum = checksummed_copy.copy_file(self.src, self.destination_file, offset=checkpoints[0],
+                                              chunk_size=1024)
+        self.assertEqual(self.read_destination(), CONTENT)
+        self.assertEqual(checksum, hashlib.sha1(CONTENT).hexdigest())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from tools.copyfiles import utils
+from tools.copyfiles.machine import Machine
+from tools.copyfiles.matcher import DirectoryMatcher
+
+PACKAGE = "tools.copyfiles.machine"
+MACHINE = "62285"
+DIRECTORY = "logs"
+
+
+class MachineTest(unittest.TestCase):
+    """
+    Class that unittests the polling of a machine, in which only changed directories of today are copied
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        today = datetime.date.today()
+        self.input_directory_path = os.path.join(self.root, "input", MACHINE, utils.get_formatted_month(today),
+                                                 utils.get_formatted_day(today), DIRECTORY)
+        os.makedirs(self.input_directory_path)
+        patches = [patch(PACKAGE + ".config.CONFIG_INPUT_PATH", os.path.join(self.root, "input")),
+                   patch(PACKAGE + ".config.CONFIG_OUTPUT_PATH", os.path.join(self.root, "output")),
+                   patch(PACKAGE + ".config.CONFIG_MANIFEST_PATH", os.path.join(self.root, "manifest")),
+                   patch(PACKAGE + ".Machine.get_matchers",
+                         return_value=[DirectoryMatcher(DIRECTORY, [r"\.log$"])])]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        os.makedirs(os.path.join(self.root, "output"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def add_file(self, name, mtime):
+        with open(os.path.join(self.input_directory_path, name), "w") as f:
+            f.write(name)
+        os.utime(self.input_directory_path, (mtime, mtime))
+
+    def test_poll_copies_changed_directories_only(self):
+        """
+        A directory is only copied again when its modification time has changed
+        :return:-
+        """
+        machine = Machine(MACHINE)
+        self.add_file("a.log", 1000)
+        with patch(PACKAGE + ".Machine.copy_directory", wraps=Machine.copy_directory) as copy_directory:
+            machine.poll(True)
+            machine.poll(True)
+            self.assertEqual(copy_directory.call_count, 1)
+            self.add_file("b.log", 2000)
+            machine.poll(True)
+            self.assertEqual(copy_directory.call_count, 2)
+        output_directory_path = self.input_directory_path.replace("input", "output")
+        self.assertEqual(sorted(os.listdir(output_directory_path)), ["a.log", "b.log"])
+
+    def test_poll_drops_removed_directories(self):
+        """
+        The modification times of directories that are no longer listed are removed
+        :return:-
+        """
+        machine = Machine(MACHINE)
+        self.add_file("a.log", 1000)
+        machine._directory_mtimes["/removed/logs"] = 1000
+        machine.poll(True)
+        self.assertEqual(list(machine._directory_mtimes), [self.input_directory_path])
+        shutil.rmtree(self.input_directory_path)
+        machine.poll(True)
+        self.assertEqual(machine._directory_mtimes, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
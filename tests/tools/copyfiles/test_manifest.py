@@ -0,0 +1,127 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from tools.copyfiles.machine import Machine
+from tools.copyfiles.manifest import Manifest, ManifestEntry, PartialEntry
+from tools.copyfiles.matcher import DirectoryMatcher
+
+DAY = "181120"
+DIRECTORY = "logs"
+FILE_REGEX = r"\.log$"
+
+
+class ManifestTest(unittest.TestCase):
+    """
+    Class that unittests the manifest and the incremental copying of a directory that is based on it
+    """
+
+    def setUp(self):
+        """
+        Creates a temporary input, output and manifest location
+        :return:-
+        """
+        self.root = tempfile.mkdtemp()
+        self.input_day_path = os.path.join(self.root, "input")
+        self.output_day_path = os.path.join(self.root, "output")
+        os.makedirs(os.path.join(self.input_day_path, DIRECTORY))
+        os.makedirs(self.output_day_path)
+        self.manifest = Manifest(os.path.join(self.root, "manifest"), "machine")
+
+    def tearDown(self):
+        self.manifest.close()
+        shutil.rmtree(self.root)
+
+    def write_source(self, name, content, mtime):
+        path = os.path.join(self.input_day_path, DIRECTORY, name)
+        with open(path, "w") as f:
+            f.write(content)
+        os.utime(path, (mtime, mtime))
+
+    def read_destination(self, name):
+        with open(os.path.join(self.output_day_path, DIRECTORY, name)) as f:
+            return f.read()
+
+    def copy_directory(self, is_checksummed=False):
+        Machine.copy_directory(DirectoryMatcher(DIRECTORY, [FILE_REGEX]), self.input_day_path, self.output_day_path,
+                               True, DAY, self.manifest, is_checksummed=is_checksummed)
+
+    def test_record_and_get_entries(self):
+        """
+        Entries are stored per day and directory
+        :return:-
+        """
+        self.manifest.record(DAY, DIRECTORY, "a.log", ManifestEntry(10, 1000.0))
+        self.manifest.commit()
+        entries = self.manifest.get_entries(DAY, DIRECTORY)
+        self.assertEqual(list(entries), ["a.log"])
+        self.assertTrue(entries["a.log"].matches(10, 1000.0))
+        self.assertFalse(entries["a.log"].matches(11, 1000.0))
+        self.assertEqual(self.manifest.get_entries("181121", DIRECTORY), {})
+
+    def test_incremental_copy_only_new_or_modified_files(self):
+        """
+        Unchanged files are skipped, files that were modified after they were copied are copied again
+        :return:-
+        """
+        self.write_source("a.log", "first", 1000)
+        self.write_source("b.txt", "ignored", 1000)
+        self.copy_directory()
+        self.assertEqual(self.read_destination("a.log"), "first")
+        self.assertFalse(os.path.exists(os.path.join(self.output_day_path, DIRECTORY, "b.txt")))
+
+        with patch("tools.copyfiles.machine.shutil.copyfile") as copyfile:
+            self.copy_directory()
+            copyfile.assert_not_called()
+
+        self.write_source("a.log", "second version", 2000)
+        self.copy_directory()
+        self.assertEqual(self.read_destination("a.log"), "second version")
+
+    def test_existing_destination_is_recorded(self):
+        """
+        A file that was copied before the manifest existed, is not copied again but recorded
+        :return:-
+        """
+        self.write_source("a.log", "first", 1000)
+        os.makedirs(os.path.join(self.output_day_path, DIRECTORY))
+        shutil.copyfile(os.path.join(self.input_day_path, DIRECTORY, "a.log"),
+                        os.path.join(self.output_day_path, DIRECTORY, "a.log"))
+        with patch("tools.copyfiles.machine.shutil.copyfile") as copyfile:
+            self.copy_directory()
+            copyfile.assert_not_called()
+        self.assertIn("a.log", self.manifest.get_entries(DAY, DIRECTORY))
+
+    def test_checksummed_copy_records_checksum(self):
+        """
+        A checksummed copy records the checksum of the content and leaves no progress behind
+        :return:-
+        """
+        self.write_source("a.log", "first", 1000)
+        self.copy_directory(is_checksummed=True)
+        self.assertEqual(self.read_destination("a.log"), "first")
+        self.assertEqual(self.manifest.get_entries(DAY, DIRECTORY)["a.log"].checksum,
+                         hashlib.sha1(b"first").hexdigest())
+        self.assertIsNone(self.manifest.get_partial(DAY, DIRECTORY, "a.log"))
+
+    def test_stale_partials_are_removed(self):
+        """
+        The progress of interrupted copies of deleted or changed source files is removed, with its temporary file
+        :return:-
+        """
+        self.write_source("a.log", "first", 1000)
+        os.makedirs(os.path.join(self.output_day_path, DIRECTORY))
+        for name, size in [("deleted.log", 5), ("a.log", 3)]:
+            with open(os.path.join(self.output_day_path, DIRECTORY, name + ".partial"), "w") as f:
+                f.write("abc")
+            self.manifest.record_partial(DAY, DIRECTORY, name, PartialEntry(size, 1000, 3))
+        self.manifest.record(DAY, DIRECTORY, "a.log", ManifestEntry(5, 1000))
+        self.copy_directory(is_checksummed=True)
+        self.assertEqual(self.manifest.get_partials(DAY, DIRECTORY), {})
+        self.assertEqual(os.listdir(os.path.join(self.output_day_path, DIRECTORY)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
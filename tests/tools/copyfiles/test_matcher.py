@@ -0,0 +1,29 @@
+import unittest
+from tools.copyfiles.matcher import DirectoryMatcher
+
+
+class DirectoryMatcherTest(unittest.TestCase):
+    """
+    Class that unittests the matching of file names by the DirectoryMatcher
+    """
+
+    def test_combined(self):
+        """
+        A file name is copied if it matches the expression of one of the handlers
+        :return:
+        """
+        matcher = DirectoryMatcher("logs", [r"\.log$", r"^(\d+)_trace\.txt$"])
+        self.assertTrue(matcher.matches("a.log"))
+        self.assertTrue(matcher.matches("12_trace.txt"))
+        self.assertFalse(matcher.matches("a.txt"))
+
+    def test_backreference(self):
+        """
+        Expressions with backreferences match the same names as they do on their own
+        :return:
+        """
+        matcher = DirectoryMatcher("logs", [r"^(a)_\.log$", r"^(\w)\1\.txt$", r"^(?P<c>\w)-(?P=c)\.dat$"])
+        self.assertTrue(matcher.matches("bb.txt"))
+        self.assertFalse(matcher.matches("bc.txt"))
+        self.assertTrue(matcher.matches("x-x.dat"))
+        self.assertFalse(matcher.matches("x-y.dat"))
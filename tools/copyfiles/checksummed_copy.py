@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+""" Module that copies (large) files in chunks to a temporary name, while calculating a checksum of the copied
+content. The temporary file is atomically renamed to the destination when the copy is complete, so an interrupted
+copy never leaves a truncated destination file behind and can be resumed where it stopped."""
+
+PARTIAL_EXTENSION = ".partial"
+CHECKSUM_ALGORITHM = "sha1"
+CHUNK_SIZE = 8 * 1024 * 1024  # 8 MB
+CHECKPOINT_SIZE = 256 * 1024 * 1024  # 256 MB
+
+
+def get_partial_file(destination_file):
+    """ get the name of the temporary file that is used while copying to the destination.
+
+    Args:
+        destination_file: the path of the destination file
+    Returns:
+        The path of the temporary file
+    """
+    return destination_file + PARTIAL_EXTENSION
+
+
+def copy_file(src, destination_file, offset=0, checkpoint=None, chunk_size=CHUNK_SIZE,
+              checkpoint_size=CHECKPOINT_SIZE):
+    """ Copies a file in chunks to the temporary file and renames it to the destination when done. When an offset
+    is passed, the copy is resumed: the temporary file is truncated to the offset, its content is read (locally)
+    to restore the checksum and only the remainder is copied from the source.
+
+    Args:
+        src: the path of the source file
+        destination_file: the path of the destination file
+        offset: the number of bytes that has been copied (and synced to disk) to the temporary file before
+        checkpoint: (optional) function that is called with the number of copied bytes, each time checkpoint_size
+          bytes have been copied and synced to disk
+        chunk_size: the number of bytes that is copied at once
+        checkpoint_size: the number of bytes after which a checkpoint is made
+    Returns:
+        The hex digest of the checksum of the copied content
+    Raises
+        Exceptions that are thrown, are not caught as they will implicate an IO-error most of the
+          times that should be investigated
+    """
+
+    partial_file = get_partial_file(destination_file)
+    checksum = hashlib.new(CHECKSUM_ALGORITHM)
+    if offset and os.path.exists(partial_file) and os.path.getsize(partial_file) >= offset:
+        with open(partial_file, "r+b") as dst:
+            dst.truncate(offset)
+            for chunk in iter(lambda: dst.read(chunk_size), b""):
+                checksum.update(chunk)
+    else:
+        offset = 0
+
+    with open(src, "rb") as source, open(partial_file, "ab" if offset else "wb") as dst:
+        source.seek(offset)
+        last_checkpoint = offset
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            dst.write(chunk)
+            checksum.update(chunk)
+            offset += len(chunk)
+            if checkpoint and offset - last_checkpoint >= checkpoint_size:
+                dst.flush()
+                os.fsync(dst.fileno())
+                checkpoint(offset)
+                last_checkpoint = offset
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(partial_file, destination_file)
+    return checksum.hexdigest()
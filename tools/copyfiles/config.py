@@ -6,6 +6,7 @@ ROOT = os.path.dirname(os.path.realpath(__file__))
 CONFIG_INPUT_PATH = "S:\\ID"
 CONFIG_OUTPUT_PATH = "T:\\etl\\SDDA_Data"
 CONFIG_DIR = "..\\..\\config"
+CONFIG_MANIFEST_PATH = os.path.join(ROOT, "..\\..\\manifest")
 TREECOPY_MACHINES_JSON = "copyfiles_machines.json"
 TREECOPY_SOURCES_HANDLERS_JSON = "copyfiles_sources_handlers.json"
 
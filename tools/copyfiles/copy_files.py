@@ -3,6 +3,7 @@ import time
 from tools.copyfiles.machinefactory import MachineFactory
 
 SLEEP_TIME = 60*60*1  # 1 hour
+POLL_TIME = 60  # 1 minute, only used in scheduled mode
 
 """ Main module of the application."""
 
@@ -24,6 +25,44 @@ def is_incremental():
     return bool(sys.argv[2])
 
 
+def is_scheduled():
+    """ Get the flag that indicates whether the scheduled mode should be applied. In scheduled mode, the
+    directories of today are polled every POLL_TIME seconds and only the directories that have changed are
+    copied. A full copy of all days is done every SLEEP_TIME seconds.
+
+    Returns: true if the scheduled mode is applied, otherwise false
+    """
+    return len(sys.argv) > 3 and bool(int(sys.argv[3]))
+
+
+def is_checksummed():
+    """ Get the flag that indicates whether files should be copied in chunks to a temporary name, with a checksum,
+    so that interrupted copies of large files are resumed instead of leaving truncated files behind.
+
+    Returns: true if checksummed copying is applied, otherwise false
+    """
+    return len(sys.argv) > 4 and bool(int(sys.argv[4]))
+
+
+def run_scheduled():
+    """ Runs the scheduled mode: cheap polls of today's directories, with a full copy at a slower cadence.
+
+    Returns:
+        -
+    """
+
+    last_full_copy = None
+    while True:
+        if last_full_copy is None or time.time() - last_full_copy >= SLEEP_TIME:
+            last_full_copy = time.time()
+            for machine in MachineFactory.instance().machines:
+                machine.copy(get_no_days(), is_incremental(), is_checksummed())
+        else:
+            for machine in MachineFactory.instance().machines:
+                machine.poll(is_incremental(), is_checksummed())
+        time.sleep(POLL_TIME)
+
+
 def check_arguments():
     """ Checks whether parameters have been provided
 
@@ -32,21 +71,26 @@ def check_arguments():
     """
 
     if len(sys.argv) < 3:
-        print("Arguments: <No. days to load> <Incremental load(0|1)>")
+        print("Arguments: <No. days to load> <Incremental load(0|1)> [<Scheduled(0|1)> [<Checksummed(0|1)>]]")
         sys.exit(1)
 
 
 # arguments:
 # 1) The number of days that should be loaded, 1 meaning only load today
 # 2) Incremental load, only load new files. 1: True, 0: False
+# 3) Optional: Scheduled, poll today's directories for changes in between full loads. 1: True, 0: False
+# 4) Optional: Checksummed, resumable copying via a temporary file that is renamed when complete. 1: True, 0: False
 
 if __name__ == '__main__':
 
     check_arguments()
 
+    if is_scheduled():
+        run_scheduled()
+
     while True:
         for machine in MachineFactory.instance().machines:
-            machine.copy(get_no_days(), is_incremental())
+            machine.copy(get_no_days(), is_incremental(), is_checksummed())
         time.sleep(SLEEP_TIME)
 
 
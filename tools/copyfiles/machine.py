@@ -1,32 +1,37 @@
 import shutil
 import os
 import datetime
-import tools.copyfiles.utils
-import tools.copyfiles.config
-import re
+from tools.copyfiles import utils
+from tools.copyfiles import config
+from tools.copyfiles import checksummed_copy
+from tools.copyfiles.manifest import Manifest, ManifestEntry, PartialEntry
 from tools.copyfiles.sourceshandlersfactory import SourcesHandlersFactory
 
 
 class Machine:
-    """ This class represents the machine for which data must be copied. It contains 1 interface
-    # method (copy) that should be used by the client."""
+    """ This class represents the machine for which data must be copied. It contains 2 interface
+    # methods (copy and poll) that should be used by the client."""
 
     def __init__(self, name):
         """ default constructor """
         self._name = name
+        self._directory_mtimes = {}
 
     @property
     def name(self):
         """ getter to retrieve the name of a machine, tagged with a decorator to be used as a property """
         return self._name
 
-    def copy(self, no_of_days, is_incremental):
+    def copy(self, no_of_days, is_incremental, is_checksummed=False):
         """ interface-method of this class that copies the machine's data.
 
         Args:
             no_of_days: The number of days that should be copied. If only 1 day (today's data) should be
               copied, then 1 should be specified
-            is_incremental: Only files that do not exist already in the destination will be copied
+            is_incremental: Only files that are new or have changed since they were recorded in the manifest
+              will be copied
+            is_checksummed: Files are copied in chunks to a temporary name, with a checksum, and renamed when
+              complete. Interrupted copies are resumed
         Returns:
             -
         Raises
@@ -34,24 +39,117 @@ class Machine:
               times that should be investigated
         """
 
-        output_machine_path = os.path.join(config.CONFIG_OUTPUT_PATH, self.name)
         print("Copying data of machine: " + self._name)
+        output_machine_path = self.prepare_output_machine_path()
+        manifest = Manifest(config.CONFIG_MANIFEST_PATH, self.name)
+        dates = [datetime.date.today() - datetime.timedelta(days=d_diff) for d_diff in range(0, no_of_days)]
+        try:
+            for the_date in dates:
+                Machine.copy_day(self.name, output_machine_path, is_incremental, the_date, manifest,
+                                 self._directory_mtimes, is_checksummed)
+        finally:
+            manifest.close()
+            self.prune_directory_mtimes([Machine.get_input_day_path(self.name, the_date) for the_date in dates])
+
+    def poll(self, is_incremental, is_checksummed=False):
+        """ interface-method of this class that copies the machine's data of today, but only of the directories
+        that have changed since they were processed the last time. A change is detected by comparing the
+        modification time of the input directory, which is cheap compared to listing the directory. Note that
+        the modification time of a directory only changes when files are added, removed or renamed, so files
+        that are modified in place are picked up by the next full copy.
+
+        Args:
+            is_incremental: Only files that are new or have changed since they were recorded in the manifest
+              will be copied
+            is_checksummed: Files are copied in chunks to a temporary name, with a checksum, and renamed when
+              complete. Interrupted copies are resumed
+        Returns:
+            -
+        Raises
+            Exceptions that are thrown, are not caught as they will implicate an IO-error most of the
+              times that should be investigated
+        """
+
+        the_date = datetime.date.today()
+        input_day_path = Machine.get_input_day_path(self.name, the_date)
+        self.prune_directory_mtimes([input_day_path])
+        if not os.path.exists(input_day_path):
+            return
+        changed_matchers = [matcher for matcher in Machine.get_matchers()
+                            if self.is_changed(os.path.join(input_day_path, matcher.path))]
+        if not changed_matchers:
+            return
+        print("Copying changed directories of machine: " + self._name)
+        output_day_path = Machine.prepare_output_day_path(self.prepare_output_machine_path(), the_date)
+        manifest = Manifest(config.CONFIG_MANIFEST_PATH, self.name)
+        try:
+            for matcher in changed_matchers:
+                Machine.copy_directory(matcher, input_day_path, output_day_path, is_incremental,
+                                       utils.get_formatted_day(the_date), manifest, self._directory_mtimes,
+                                       is_checksummed)
+        finally:
+            manifest.close()
+
+    def is_changed(self, input_directory_path):
+        """ Checks whether the input directory has changed since it was processed the last time.
+
+        Args:
+            input_directory_path: the path of the input directory
+        Returns:
+            true if the directory was not processed yet or its modification time has changed, false if it is
+            unchanged or does not exist
+        """
+
+        try:
+            mtime = os.stat(input_directory_path).st_mtime
+        except OSError:
+            return False
+        return self._directory_mtimes.get(input_directory_path) != mtime
+
+    def prune_directory_mtimes(self, input_day_paths):
+        """ Removes the registered modification times of input directories that are not in the current listing,
+        i.e. directories of days that are no longer copied, and directories that have been removed.
+
+        Args:
+            input_day_paths: the input locations of the days that are copied
+        Returns:
+            -
+        """
+
+        current = set(os.path.join(input_day_path, matcher.path) for input_day_path in input_day_paths
+                      for matcher in Machine.get_matchers())
+        for input_directory_path in list(self._directory_mtimes):
+            if input_directory_path not in current or not os.path.isdir(input_directory_path):
+                del self._directory_mtimes[input_directory_path]
+
+    def prepare_output_machine_path(self):
+        """ Constructs the output location of the machine and creates it if it doesn't exist.
+
+        Returns:
+            The constructed path of the output location of the machine
+        """
+
+        output_machine_path = os.path.join(config.CONFIG_OUTPUT_PATH, self.name)
         if not os.path.exists(output_machine_path):
             print("   Creating directory")
             os.mkdir(output_machine_path)
-        for d_diff in range(0, no_of_days):
-            Machine.copy_day(self.name, output_machine_path, is_incremental,
-                             datetime.date.today() - datetime.timedelta(days=d_diff))
+        return output_machine_path
 
     @staticmethod
-    def copy_day(machine, output_machine_path, is_incremental, the_date):
+    def copy_day(machine, output_machine_path, is_incremental, the_date, manifest, directory_mtimes,
+                 is_checksummed=False):
         """ Copy the data of the day that is specified by the parameter 'the_date'.
 
         Args:
             machine: The name of the machine
             output_machine_path: The constructed path of the output location of the machine
-            is_incremental: Only files that do not exist already in the destination will be copied
+            is_incremental: Only files that are new or have changed will be copied
             the_date: the date that will be copied
+            manifest: the manifest of the machine
+            directory_mtimes: dictionary in which the modification times of the processed input directories
+              are registered
+            is_checksummed: Files are copied in chunks to a temporary name, with a checksum, and renamed when
+              complete. Interrupted copies are resumed
         Returns:
             -
         Raises
@@ -59,30 +157,73 @@ class Machine:
               times that should be investigated
         """
 
-        formatted_day = utils.get_formatted_day(the_date)
-        formatted_month = utils.get_formatted_month(the_date)
-        print("   Copying data of day: " + formatted_day)
-        output_month_path = os.path.join(output_machine_path, formatted_month)
+        print("   Copying data of day: " + utils.get_formatted_day(the_date))
+        output_day_path = Machine.prepare_output_day_path(output_machine_path, the_date)
+        input_day_path = Machine.get_input_day_path(machine, the_date)
+        if os.path.exists(input_day_path):
+            # Only copy if data of the running date is already available on the source
+            Machine.copy_directories(input_day_path, output_day_path, is_incremental,
+                                     utils.get_formatted_day(the_date), manifest, directory_mtimes, is_checksummed)
+
+    @staticmethod
+    def prepare_output_day_path(output_machine_path, the_date):
+        """ Constructs the output location of the day and creates it (and the month) if it doesn't exist.
+
+        Args:
+            output_machine_path: The constructed path of the output location of the machine
+            the_date: the running date
+        Returns:
+            The constructed path of the output location of the day
+        """
+
+        output_month_path = os.path.join(output_machine_path, utils.get_formatted_month(the_date))
         if not os.path.exists(output_month_path):
             os.mkdir(output_month_path)
-        output_day_path = os.path.join(output_month_path, formatted_day)
+        output_day_path = os.path.join(output_month_path, utils.get_formatted_day(the_date))
         if not os.path.exists(output_day_path):
             os.mkdir(output_day_path)
-        input_day_path = os.path.join(
-            os.path.join(os.path.join(
-                config.CONFIG_INPUT_PATH, machine), formatted_month), formatted_day)
-        if os.path.exists(input_day_path):
-            # Only copy if data of the running date is already available on the source
-            Machine.copy_directories(input_day_path, output_day_path, is_incremental)
+        return output_day_path
 
     @staticmethod
-    def copy_directories(input_day_path, output_day_path, is_incremental):
+    def get_input_day_path(machine, the_date):
+        """ Constructs the input location of the day of the machine.
+
+        Args:
+            machine: The name of the machine
+            the_date: the running date
+        Returns:
+            The constructed path of the input location of the day
+        """
+
+        return os.path.join(config.CONFIG_INPUT_PATH, machine, utils.get_formatted_month(the_date),
+                            utils.get_formatted_day(the_date))
+
+    @staticmethod
+    def get_matchers():
+        """ Gets the directories that should be copied, together with the compiled regular expressions of the
+        files.
+
+        Returns:
+            List of DirectoryMatcher objects
+        """
+
+        return SourcesHandlersFactory.instance().matchers
+
+    @staticmethod
+    def copy_directories(input_day_path, output_day_path, is_incremental, formatted_day, manifest,
+                         directory_mtimes, is_checksummed=False):
         """ Copy the data of all directories for the running day that.
 
         Args:
             input_day_path: the constructed path of the input location of the day of the machine
             output_day_path: the constructed path of the output location of the day of the machine
-            is_incremental: Only files that do not exist already in the destination will be copied
+            is_incremental: Only files that are new or have changed will be copied
+            formatted_day: the formatted running day, used as key in the manifest
+            manifest: the manifest of the machine
+            directory_mtimes: dictionary in which the modification times of the processed input directories
+              are registered
+            is_checksummed: Files are copied in chunks to a temporary name, with a checksum, and renamed when
+              complete. Interrupted copies are resumed
         Returns:
             -
         Raises
@@ -90,21 +231,32 @@ class Machine:
               times that should be investigated
         """
 
-        for source_handler in SourcesHandlersFactory.instance().sources_handlers:
-            for directory in source_handler["directories"]:
-                Machine.copy_directory(directory, input_day_path,
-                                       output_day_path, is_incremental, source_handler["file_regex"])
+        for matcher in Machine.get_matchers():
+            Machine.copy_directory(matcher, input_day_path, output_day_path, is_incremental,
+                                   formatted_day, manifest, directory_mtimes, is_checksummed)
 
     @staticmethod
-    def copy_directory(directory, input_day_path, output_day_path, is_incremental, file_regex):
+    def copy_directory(matcher, input_day_path, output_day_path, is_incremental, formatted_day, manifest,
+                       directory_mtimes=None, is_checksummed=False):
         """ Copy the data of all directories for the running day that.
 
+        In incremental mode, the source directory is listed once with os.scandir and every file is compared
+        (size and modification time) against the manifest. Files that are unchanged are skipped without touching
+        the destination, files that are new or have been modified since they were copied, are (re)copied. Files
+        that are not in the manifest yet (e.g. the first run after the manifest was introduced) are compared
+        against the destination once and recorded.
+
         Args:
-            directory: the directory that should be copied
+            matcher: the DirectoryMatcher of the directory that should be copied
             input_day_path: the constructed path of the input location of the day of the machine
             output_day_path: the constructed path of the output location of the day of the machine
-            is_incremental: Only files that do not exist already in the destination will be copied
-            file_regex: the regular expression that should be applied to retrieve files that will be copied
+            is_incremental: Only files that are new or have changed will be copied
+            formatted_day: the formatted running day, used as key in the manifest
+            manifest: the manifest of the machine
+            directory_mtimes: (optional) dictionary in which the modification time of the input directory, as
+              observed before it was listed, is registered
+            is_checksummed: Files are copied in chunks to a temporary name, with a checksum, and renamed when
+              complete. Interrupted copies are resumed
         Returns:
             -
         Raises
@@ -112,19 +264,121 @@ class Machine:
               times that should be investigated
         """
 
-        print("       Directory: " + directory)
-        directory = str(directory).replace("/", "\\")
-        if not os.path.exists(os.path.join(output_day_path, directory)):
-            os.makedirs(os.path.join(output_day_path, directory))
-        for f in [f for f in os.listdir(os.path.join(input_day_path, directory)) if re.search(file_regex, f)]:
-            destination_file = os.path.join(output_day_path, directory, f)
-            if not os.path.exists(destination_file) or not is_incremental:
-                src = os.path.join(input_day_path, directory, f)
-                if not os.path.exists(destination_file):
+        print("       Directory: " + matcher.directory)
+        directory = matcher.path
+        input_directory_path = os.path.join(input_day_path, directory)
+        output_directory_path = os.path.join(output_day_path, directory)
+        if not os.path.exists(output_directory_path):
+            os.makedirs(output_directory_path)
+        # Registered before listing, so that files added while copying are detected by the next poll
+        input_directory_mtime = os.stat(input_directory_path).st_mtime
+        entries = manifest.get_entries(formatted_day, directory)
+        source_stats = {}
+        for source in os.scandir(input_directory_path):
+            if not source.is_file() or not matcher.matches(source.name):
+                continue
+            source_stat = source.stat()
+            source_stats[source.name] = source_stat
+            destination_file = os.path.join(output_directory_path, source.name)
+            entry = entries.get(source.name)
+            checksum = None
+            if is_incremental and entry is not None and entry.matches(source_stat.st_size, source_stat.st_mtime):
+                print("          Ignoring file: " + destination_file)
+                continue
+            if is_incremental and entry is None and Machine.is_copied(destination_file, source_stat):
+                print("          Ignoring file: " + destination_file)
+            else:
+                if entry is not None and is_incremental:
+                    print("          Copying modified: " + destination_file)
+                elif not os.path.exists(destination_file):
                     print("          Copying not existing: " + destination_file)
-                elif not is_incremental:
+                else:
                     print("          Overwriting existing: " + destination_file)
-                shutil.copyfile(src, destination_file)
-            else:
-                print("          Ignoring file: " + destination_file)
+                if is_checksummed:
+                    checksum = Machine.copy_file_checksummed(source.path, destination_file, source_stat,
+                                                             formatted_day, directory, manifest)
+                else:
+                    shutil.copyfile(source.path, destination_file)
+            manifest.record(formatted_day, directory, source.name,
+                            ManifestEntry(source_stat.st_size, source_stat.st_mtime, checksum))
+        if is_checksummed:
+            Machine.remove_stale_partials(output_directory_path, formatted_day, directory, manifest, source_stats)
+        manifest.commit()
+        if directory_mtimes is not None:
+            directory_mtimes[input_directory_path] = input_directory_mtime
+
+    @staticmethod
+    def copy_file_checksummed(src, destination_file, source_stat, formatted_day, directory, manifest):
+        """ Copy a file in chunks to a temporary name and rename it to the destination when complete. The progress
+        is recorded in the manifest, so that an interrupted copy of the same source file (same size and
+        modification time) is resumed instead of restarted.
+
+        Args:
+            src: the path of the source file
+            destination_file: the path of the destination file
+            source_stat: the stat result of the source file
+            formatted_day: the formatted running day, used as key in the manifest
+            directory: the directory, relative to the day
+            manifest: the manifest of the machine
+        Returns:
+            The checksum of the copied content
+        """
+
+        name = os.path.basename(destination_file)
+        partial = manifest.get_partial(formatted_day, directory, name)
+        offset = 0
+        if partial is not None and partial.matches(source_stat.st_size, source_stat.st_mtime):
+            offset = partial.offset
+            print("          Resuming at byte {0}: {1}".format(offset, destination_file))
+
+        def checkpoint(copied):
+            manifest.record_partial(formatted_day, directory, name,
+                                    PartialEntry(source_stat.st_size, source_stat.st_mtime, copied))
+            manifest.commit()
+
+        checkpoint(offset)
+        checksum = checksummed_copy.copy_file(src, destination_file, offset, checkpoint)
+        manifest.remove_partial(formatted_day, directory, name)
+        return checksum
+
+    @staticmethod
+    def remove_stale_partials(output_directory_path, formatted_day, directory, manifest, source_stats):
+        """ Removes the temporary files and the progress of interrupted copies whose source file has been deleted,
+        or has changed (size or modification time) since the copy was started, so that they can't be resumed.
+
+        Args:
+            output_directory_path: the path of the output directory
+            formatted_day: the formatted running day, used as key in the manifest
+            directory: the directory, relative to the day
+            manifest: the manifest of the machine
+            source_stats: dictionary of the names of the current source files to their stat results
+        Returns:
+            -
+        """
+
+        for name, partial in manifest.get_partials(formatted_day, directory).items():
+            source_stat = source_stats.get(name)
+            if source_stat is not None and partial.matches(source_stat.st_size, source_stat.st_mtime):
+                continue
+            partial_file = checksummed_copy.get_partial_file(os.path.join(output_directory_path, name))
+            print("          Removing stale partial copy: " + partial_file)
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+            manifest.remove_partial(formatted_day, directory, name)
+
+    @staticmethod
+    def is_copied(destination_file, source_stat):
+        """ Checks whether a file that is not recorded in the manifest has already been copied, by comparing the
+        size of the destination file with the size of the source file.
+
+        Args:
+            destination_file: the path of the destination file
+            source_stat: the stat result of the source file
+        Returns:
+            true if the destination file exists and has the same size as the source file, otherwise false
+        """
 
+        try:
+            return os.stat(destination_file).st_size == source_stat.st_size
+        except OSError:
+            return False
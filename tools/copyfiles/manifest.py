@@ -0,0 +1,177 @@
+import os
+import sqlite3
+
+""" Module that maintains a local index of files that have been copied, so that incremental runs only need to
+stat-compare the source against the index instead of checking every destination file."""
+
+MANIFEST_FILE_EXTENSION = ".db"
+
+CREATE_FILES_TABLE = """
+    CREATE TABLE IF NOT EXISTS files (
+        day TEXT NOT NULL,
+        directory TEXT NOT NULL,
+        name TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        checksum TEXT,
+        PRIMARY KEY (day, directory, name))"""
+CREATE_PARTIALS_TABLE = """
+    CREATE TABLE IF NOT EXISTS partials (
+        day TEXT NOT NULL,
+        directory TEXT NOT NULL,
+        name TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        offset INTEGER NOT NULL,
+        PRIMARY KEY (day, directory, name))"""
+SELECT_FILES = "SELECT name, size, mtime, checksum FROM files WHERE day = ? AND directory = ?"
+UPSERT_FILE = "INSERT OR REPLACE INTO files (day, directory, name, size, mtime, checksum) VALUES (?, ?, ?, ?, ?, ?)"
+SELECT_PARTIALS = "SELECT name, size, mtime, offset FROM partials WHERE day = ? AND directory = ?"
+SELECT_PARTIAL = "SELECT size, mtime, offset FROM partials WHERE day = ? AND directory = ? AND name = ?"
+UPSERT_PARTIAL = "INSERT OR REPLACE INTO partials (day, directory, name, size, mtime, offset) VALUES (?, ?, ?, ?, ?, ?)"
+DELETE_PARTIAL = "DELETE FROM partials WHERE day = ? AND directory = ? AND name = ?"
+
+
+class ManifestEntry:
+    """ Class that represents the state of a source file at the moment it was copied."""
+
+    __slots__ = ("size", "mtime", "checksum")
+
+    def __init__(self, size, mtime, checksum=None):
+        """ Default constructor.
+
+        Args:
+            size: the size of the source file in bytes
+            mtime: the modification time of the source file (seconds since the epoch)
+            checksum: the (optional) checksum of the copied content
+        """
+        self.size = size
+        self.mtime = mtime
+        self.checksum = checksum
+
+    def matches(self, size, mtime):
+        """ Checks whether the source file is still the same file that was copied.
+
+        Args:
+            size: the current size of the source file
+            mtime: the current modification time of the source file
+        Returns:
+            true if size and modification time are unchanged, otherwise false
+        """
+        return self.size == size and self.mtime == mtime
+
+
+class PartialEntry(ManifestEntry):
+    """ Class that represents a copy that is in progress: the state of the source file at the moment the copy was
+    started and the number of bytes that have been copied (and synced to disk) so far."""
+
+    __slots__ = ("offset",)
+
+    def __init__(self, size, mtime, offset):
+        """ Default constructor.
+
+        Args:
+            size: the size of the source file in bytes
+            mtime: the modification time of the source file (seconds since the epoch)
+            offset: the number of bytes that have been copied
+        """
+        ManifestEntry.__init__(self, size, mtime)
+        self.offset = offset
+
+
+class Manifest:
+    """ This class represents the manifest of a machine. It is an SQLite index of (day, directory, name, size,
+    mtime, checksum) rows, one database file per machine. Entries are read per day and directory, so that a run
+    only loads the part of the index it needs."""
+
+    def __init__(self, manifest_dir, machine):
+        """ Default constructor that opens (and if necessary creates) the manifest of the machine.
+
+        Args:
+            manifest_dir: the local directory in which the manifests are kept
+            machine: the name of the machine
+        """
+        if not os.path.exists(manifest_dir):
+            os.makedirs(manifest_dir)
+        self._connection = sqlite3.connect(os.path.join(manifest_dir, machine + MANIFEST_FILE_EXTENSION))
+        self._connection.execute(CREATE_FILES_TABLE)
+        self._connection.execute(CREATE_PARTIALS_TABLE)
+        self._connection.commit()
+
+    def get_entries(self, day, directory):
+        """ Get all entries that have been recorded for a directory of a day.
+
+        Args:
+            day: the formatted day
+            directory: the directory, relative to the day
+        Returns:
+            A dictionary of file name to ManifestEntry
+        """
+        return {name: ManifestEntry(size, mtime, checksum) for name, size, mtime, checksum in
+                self._connection.execute(SELECT_FILES, (day, directory))}
+
+    def record(self, day, directory, name, entry):
+        """ Records that a file has been copied. The change becomes persistent after calling commit().
+
+        Args:
+            day: the formatted day
+            directory: the directory, relative to the day
+            name: the name of the file
+            entry: the ManifestEntry that describes the copied source file
+        """
+        self._connection.execute(UPSERT_FILE, (day, directory, name, entry.size, entry.mtime, entry.checksum))
+
+    def get_partial(self, day, directory, name):
+        """ Get the state of a copy of a file that is in progress.
+
+        Args:
+            day: the formatted day
+            directory: the directory, relative to the day
+            name: the name of the file
+        Returns:
+            The PartialEntry of the file, or None if no copy is in progress
+        """
+        row = self._connection.execute(SELECT_PARTIAL, (day, directory, name)).fetchone()
+        return PartialEntry(*row) if row else None
+
+    def get_partials(self, day, directory):
+        """ Get all copies that are in progress in a directory of a day.
+
+        Args:
+            day: the formatted day
+            directory: the directory, relative to the day
+        Returns:
+            A dictionary of file name to PartialEntry
+        """
+        return {name: PartialEntry(size, mtime, offset) for name, size, mtime, offset in
+                self._connection.execute(SELECT_PARTIALS, (day, directory))}
+
+    def record_partial(self, day, directory, name, entry):
+        """ Records the progress of a copy of a file. The change becomes persistent after calling commit().
+
+        Args:
+            day: the formatted day
+            directory: the directory, relative to the day
+            name: the name of the file
+            entry: the PartialEntry that describes the progress
+        """
+        self._connection.execute(UPSERT_PARTIAL, (day, directory, name, entry.size, entry.mtime, entry.offset))
+
+    def remove_partial(self, day, directory, name):
+        """ Removes the progress of a copy of a file, when the copy is complete.
+
+        Args:
+            day: the formatted day
+            directory: the directory, relative to the day
+            name: the name of the file
+        """
+        self._connection.execute(DELETE_PARTIAL, (day, directory, name))
+
+    def commit(self):
+        """ Makes all recorded changes persistent."""
+        self._connection.commit()
+
+    def close(self):
+        """ Commits pending changes and closes the manifest."""
+        self._connection.commit()
+        self._connection.close()
@@ -0,0 +1,77 @@
+import re
+from collections import OrderedDict
+
+""" Module that compiles the sources and handlers configuration into matchers, grouped by directory."""
+
+# Backreferences refer to groups by number or name, which change when expressions are combined
+BACKREFERENCE_REGEX = re.compile(r"\\[1-9]|\(\?P=|\\g<")
+
+
+class DirectoryMatcher:
+    """ This class represents a directory that should be copied, together with the compiled regular expressions of
+    all handlers that apply to the directory. The expressions are also combined into one alternation, so that a
+    file name is matched with a single search, unless one of them contains a backreference."""
+
+    def __init__(self, directory, file_regexes):
+        """ Default constructor.
+
+        Args:
+            directory: the directory as configured
+            file_regexes: the regular expressions of the files of all handlers that apply to the directory
+        """
+        self._directory = directory
+        self._path = str(directory).replace("/", "\\")
+        self._regexes = [re.compile(file_regex) for file_regex in file_regexes]
+        self._combined_regex = None
+        if not any(BACKREFERENCE_REGEX.search(file_regex) for file_regex in file_regexes):
+            try:
+                self._combined_regex = re.compile(
+                    "|".join("(?:{0})".format(file_regex) for file_regex in file_regexes))
+            except re.error:
+                # e.g. global inline flags can't be combined, fall back on matching the expressions one by one
+                pass
+
+    @property
+    def directory(self):
+        """ @property-decorated method that retrieves the directory as configured."""
+        return self._directory
+
+    @property
+    def path(self):
+        """ @property-decorated method that retrieves the normalized path of the directory, relative to the day."""
+        return self._path
+
+    @property
+    def regexes(self):
+        """ @property-decorated method that retrieves the compiled regular expressions."""
+        return self._regexes
+
+    def matches(self, file_name):
+        """ Checks whether a file should be copied.
+
+        Args:
+            file_name: the name of the file
+        Returns:
+            true if the file name matches the regular expression of one of the handlers, otherwise false
+        """
+        if self._combined_regex is not None:
+            return self._combined_regex.search(file_name) is not None
+        return any(regex.search(file_name) for regex in self._regexes)
+
+
+def compile_matchers(sources_handlers):
+    """ Compiles the sources and handlers configuration into matchers. Handlers that share a directory, are
+    grouped together so that the directory is listed only once.
+
+    Args:
+        sources_handlers: the sources and handlers configuration
+    Returns:
+        List of DirectoryMatcher objects, in the order in which the directories are configured
+    """
+    grouped = OrderedDict()
+    for source_handler in sources_handlers:
+        for directory in source_handler["directories"]:
+            file_regexes = grouped.setdefault(str(directory).replace("/", "\\"), (directory, []))[1]
+            if source_handler["file_regex"] not in file_regexes:
+                file_regexes.append(source_handler["file_regex"])
+    return [DirectoryMatcher(directory, file_regexes) for directory, file_regexes in grouped.values()]
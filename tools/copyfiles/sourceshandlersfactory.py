@@ -1,5 +1,6 @@
 from misc.singleton import Singleton
 from tools.copyfiles.config import Config
+from tools.copyfiles.matcher import compile_matchers
 
 
 @Singleton
@@ -10,8 +11,15 @@ class SourcesHandlersFactory:
         """ Default constructor that gets the sources and handlers from a configuration. """
         self._config = Config.instance()
         self._sourceshandlers = self._config.sources_handlers
+        self._matchers = compile_matchers(self._sourceshandlers)
 
     @property
     def sources_handlers(self):
         """ @property-decorated method that retrieves the sources and handlers objects."""
         return self._sourceshandlers
+
+    @property
+    def matchers(self):
+        """ @property-decorated method that retrieves the directory matchers, compiled once from the sources and
+        handlers."""
+        return self._matchers